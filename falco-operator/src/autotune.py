@@ -0,0 +1,168 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Ring buffer autotune module."""
+
+import logging
+from datetime import datetime, time
+from typing import Optional
+
+from pydantic import BaseModel
+
+from metrics import MetricSample, MetricsError, fetch_metrics
+
+logger = logging.getLogger(__name__)
+
+EVENTS_METRIC = "falcosecurity_scap_n_evts_total"
+DROPS_METRIC = "falcosecurity_scap_n_drops_buffer_total"
+# Grow the ring buffers when more than 0.1% of the kernel events are dropped between two samples
+DROP_RATIO_THRESHOLD = 0.001
+# Shrink the ring buffers after a day without drops, with the default 5 minutes update-status
+QUIET_SAMPLES_BEFORE_SHRINK = 288
+
+
+class RingBufferSample(BaseModel):
+    """The kernel event counters of Falco at a point in time.
+
+    Attributes:
+        events: The number of kernel events read from the ring buffers since Falco started.
+        drops: The number of kernel events dropped because the ring buffers were full.
+    """
+
+    events: int
+    drops: int
+
+
+class AutotuneState(BaseModel):
+    """The state of the ring buffer autotuner, kept across hooks.
+
+    Attributes:
+        preset: The buffer size preset applied by the autotuner, if any.
+        pending_preset: The buffer size preset waiting for the maintenance window, if any.
+        sample: The last sample of the kernel event counters.
+        quiet_samples: The number of consecutive samples without drops.
+    """
+
+    preset: Optional[int] = None
+    pending_preset: Optional[int] = None
+    sample: Optional[RingBufferSample] = None
+    quiet_samples: int = 0
+
+    def observe(
+        self, sample: RingBufferSample, current: int, minimum: int, maximum: int
+    ) -> "AutotuneState":
+        """Record a new sample and compute the buffer size preset to apply next.
+
+        The preset is stepped up when the drop ratio since the previous sample exceeds
+        DROP_RATIO_THRESHOLD, and stepped down after QUIET_SAMPLES_BEFORE_SHRINK samples
+        without any drop. The preset never leaves the [minimum, maximum] bounds.
+
+        Args:
+            sample: The new sample of the kernel event counters.
+            current: The buffer size preset Falco currently runs with.
+            minimum: The lowest buffer size preset allowed.
+            maximum: The highest buffer size preset allowed.
+
+        Returns:
+            The updated autotune state.
+        """
+        previous = self.sample
+        if previous is None or sample.events < previous.events or sample.drops < previous.drops:
+            # First sample, or Falco restarted and reset its counters
+            return self.model_copy(update={"sample": sample, "quiet_samples": 0})
+
+        events = sample.events - previous.events
+        drops = sample.drops - previous.drops
+        quiet_samples = 0 if drops else self.quiet_samples + 1
+
+        target = current
+        if drops / max(events + drops, 1) > DROP_RATIO_THRESHOLD:
+            target = current + 1
+        elif quiet_samples >= QUIET_SAMPLES_BEFORE_SHRINK:
+            target = current - 1
+            quiet_samples = 0
+        target = min(max(target, minimum), maximum)
+
+        if target != current:
+            logger.info(
+                "%d of %d kernel events dropped, scheduling buffer size preset %d",
+                drops,
+                events + drops,
+                target,
+            )
+        return self.model_copy(
+            update={
+                "sample": sample,
+                "quiet_samples": quiet_samples,
+                "pending_preset": target if target != current else None,
+            }
+        )
+
+    def apply(self) -> "AutotuneState":
+        """Apply the pending buffer size preset.
+
+        Returns:
+            The updated autotune state.
+        """
+        # Falco restarts with the new preset and resets its counters
+        return AutotuneState(preset=self.pending_preset)
+
+
+def fetch_sample(port: int) -> RingBufferSample:
+    """Sample the kernel event counters from the Falco Prometheus endpoint.
+
+    Args:
+        port: The port of the Falco webserver.
+
+    Returns:
+        The sample of the kernel event counters.
+
+    Raises:
+        MetricsError: If the metrics cannot be fetched or do not hold the kernel event counters.
+    """
+    return ring_buffer_sample(fetch_metrics(port))
+
+
+def ring_buffer_sample(samples: list[MetricSample]) -> RingBufferSample:
+    """Extract the kernel event counters from the Falco metrics.
+
+    Falco exports the drop counters both as a total and per event type, so the largest value of
+    each metric is the total.
+
+    Args:
+        samples: The metric samples.
+
+    Returns:
+        The sample of the kernel event counters.
+
+    Raises:
+        MetricsError: If the metrics do not hold the kernel event counters.
+    """
+    values: dict[str, int] = {}
+    for sample in samples:
+        if sample.name in (EVENTS_METRIC, DROPS_METRIC):
+            values[sample.name] = max(values.get(sample.name, 0), int(sample.value))
+
+    if EVENTS_METRIC not in values or DROPS_METRIC not in values:
+        raise MetricsError("Falco metrics do not hold the kernel event counters")
+    return RingBufferSample(events=values[EVENTS_METRIC], drops=values[DROPS_METRIC])
+
+
+def in_window(window: str, now: datetime) -> bool:
+    """Check whether a time falls in a maintenance window.
+
+    Args:
+        window: The maintenance window as "HH:MM-HH:MM" in UTC, or empty for any time.
+        now: The time to check.
+
+    Returns:
+        True if the time falls in the maintenance window.
+    """
+    if not window:
+        return True
+    start, end = (time.fromisoformat(bound) for bound in window.split("-"))
+    current = now.time().replace(second=0, microsecond=0)
+    if start <= end:
+        return start <= current < end
+    # The window spans midnight
+    return current >= start or current < end
@@ -0,0 +1,257 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Falco capture module."""
+
+import json
+import logging
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import yaml
+from pydantic import BaseModel, Field
+
+from service import FalcoLayout
+
+logger = logging.getLogger(__name__)
+
+MEGABYTE = 1024 * 1024
+# The captures directory never grows above this size, the oldest captures are removed first
+CAPTURES_MAX_BYTES = 2048 * MEGABYTE
+CAPTURE_POLL_INTERVAL = 0.5
+CAPTURE_STOP_TIMEOUT = 30
+# A rule matching every event, so that Falco records from the start of the capture
+CAPTURE_RULE = {
+    "rule": "Charm Capture",
+    "desc": "Record every event while the charm capture action runs",
+    "condition": "evt.num > 0",
+    "output": "Charm capture (evt.num=%evt.num)",
+    "priority": "DEBUG",
+}
+
+
+class CaptureError(Exception):
+    """Exception raised when Falco fails to record a capture."""
+
+
+class CaptureParams(BaseModel):
+    """The pydantic model for the capture action parameters.
+
+    Attributes:
+        duration: The maximum duration of the capture, in seconds.
+        size: The maximum size of the capture, in megabytes.
+    """
+
+    duration: int = Field(default=10, ge=1, le=600)
+    size: int = Field(default=100, ge=1, le=CAPTURES_MAX_BYTES // MEGABYTE)
+
+
+class CaptureResult(BaseModel):
+    """The outcome of a capture.
+
+    Attributes:
+        path: The scap capture file.
+        seconds: The duration of the capture, in seconds.
+        size: The size of the capture file, in bytes.
+        events: The number of kernel events Falco read during the capture, if known.
+        drops: The number of kernel events Falco dropped during the capture, if known.
+    """
+
+    path: Path
+    seconds: float
+    size: int
+    events: Optional[int] = None
+    drops: Optional[int] = None
+
+
+def capture(falco_layout: FalcoLayout, duration: int, max_bytes: int) -> CaptureResult:
+    """Record a scap capture with the engine and plugins of the Falco service.
+
+    Only the syscall source is opened, since the plugin sources would compete with the Falco
+    service for their ports.
+    The oldest captures are removed beforehand, so that the captures directory stays under
+    CAPTURES_MAX_BYTES once the new capture reaches max_bytes.
+
+    Args:
+        falco_layout: The Falco file layout.
+        duration: The maximum duration of the capture, in seconds.
+        max_bytes: The maximum size of the capture, in bytes.
+
+    Returns:
+        The outcome of the capture.
+
+    Raises:
+        CaptureError: If Falco fails to record the capture.
+    """
+    captures_dir = falco_layout.captures_dir
+    captures_dir.mkdir(parents=True, exist_ok=True)
+    _rotate_captures(captures_dir, CAPTURES_MAX_BYTES - max_bytes)
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path_prefix = captures_dir / f"capture-{timestamp}"
+    with tempfile.TemporaryDirectory(prefix="falco-capture-") as staging:
+        staging_dir = Path(staging)
+        rules_file = staging_dir / "capture_rules.yaml"
+        rules_file.write_text(yaml.safe_dump([CAPTURE_RULE]), encoding="utf-8")
+        metrics_file = staging_dir / "metrics.json"
+        capture_cmd = [
+            str(falco_layout.cmd),
+            "-c",
+            str(falco_layout.config_file),
+            "-r",
+            str(rules_file),
+            # Plugin sources, such as k8saudit, would bind the ports of the Falco service
+            "--enable-source",
+            "syscall",
+            *_capture_options(path_prefix, duration, metrics_file),
+        ]
+
+        seconds = _run_capture(
+            capture_cmd,
+            staging_dir / "falco.log",
+            captures_dir / path_prefix.name,
+            max_bytes,
+            duration,
+        )
+        events, drops = _read_kernel_counters(metrics_file)
+
+    capture_files = sorted(captures_dir.glob(f"{path_prefix.name}*.scap"))
+    if not capture_files:
+        raise CaptureError("Falco did not record any event")
+    capture_file = capture_files[0]
+    # The capture may overshoot max_bytes by up to a polling interval of events
+    _rotate_captures(captures_dir, CAPTURES_MAX_BYTES, keep=capture_file)
+
+    return CaptureResult(
+        path=capture_file,
+        seconds=round(seconds, 3),
+        size=capture_file.stat().st_size,
+        events=events,
+        drops=drops,
+    )
+
+
+def _capture_options(path_prefix: Path, duration: int, metrics_file: Path) -> list[str]:
+    """Build the Falco command line options of a capture.
+
+    Command line options take precedence over the config override files, so that custom
+    settings cannot send the capture rule alerts to the outputs.
+
+    Args:
+        path_prefix: The path prefix of the capture files.
+        duration: The maximum duration of the capture, in seconds.
+        metrics_file: The file to write the kernel event counters to.
+
+    Returns:
+        The list of command line options.
+    """
+    options = {
+        "capture.enabled": "true",
+        "capture.mode": "all_rules",
+        "capture.path_prefix": str(path_prefix),
+        "capture.default_duration": str(duration * 1000),
+        "priority": "debug",
+        # The managed rule selectors, such as disabling `*`, would disable the capture rule
+        "rules": json.dumps([{"enable": {"rule": CAPTURE_RULE["rule"]}}]),
+        "stdout_output.enabled": "false",
+        "syslog_output.enabled": "false",
+        "file_output.enabled": "false",
+        "http_output.enabled": "false",
+        "program_output.enabled": "false",
+        "webserver.enabled": "false",
+        "watch_config_files": "false",
+        "metrics.enabled": "true",
+        "metrics.interval": "1s",
+        "metrics.output_rule": "false",
+        "metrics.output_file": str(metrics_file),
+        "metrics.kernel_event_counters_enabled": "true",
+    }
+    return [arg for key, value in options.items() for arg in ("-o", f"{key}={value}")]
+
+
+def _run_capture(
+    capture_cmd: list[str], log_file: Path, path_prefix: Path, max_bytes: int, duration: int
+) -> float:
+    """Run Falco until the capture reaches its duration or its size.
+
+    Args:
+        capture_cmd: The Falco capture command.
+        log_file: The file to write the Falco logs to.
+        path_prefix: The path prefix of the capture files.
+        max_bytes: The maximum size of the capture, in bytes.
+        duration: The maximum duration of the capture, in seconds.
+
+    Returns:
+        The duration of the capture, in seconds.
+
+    Raises:
+        CaptureError: If Falco exits before the end of the capture.
+    """
+    logger.debug("Falco capture command: %s", capture_cmd)
+    start = time.monotonic()
+    with (
+        log_file.open("w", encoding="utf-8") as log,
+        subprocess.Popen(capture_cmd, stdout=log, stderr=subprocess.STDOUT) as process,  # nosec B603
+    ):
+        while process.poll() is None:
+            capture_files = path_prefix.parent.glob(f"{path_prefix.name}*.scap")
+            size = sum(path.stat().st_size for path in capture_files)
+            if time.monotonic() - start >= duration or size >= max_bytes:
+                break
+            time.sleep(CAPTURE_POLL_INTERVAL)
+        seconds = time.monotonic() - start
+
+        if process.poll() is not None:
+            logs = log_file.read_text(encoding="utf-8", errors="replace")
+            raise CaptureError(f"Falco exited during the capture: {logs}")
+
+        process.terminate()
+        try:
+            process.wait(timeout=CAPTURE_STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logger.warning("Falco did not stop after the capture, killing it")
+            process.kill()
+            process.wait()
+    return seconds
+
+
+def _read_kernel_counters(metrics_file: Path) -> tuple[Optional[int], Optional[int]]:
+    """Read the last kernel event counters Falco wrote to a metrics file.
+
+    Args:
+        metrics_file: The metrics file, one JSON snapshot per line.
+
+    Returns:
+        The number of kernel events read and dropped, or None if unknown.
+    """
+    try:
+        lines = metrics_file.read_text(encoding="utf-8").splitlines()
+        output_fields = json.loads(lines[-1]).get("output_fields", {})
+    except (OSError, IndexError, json.JSONDecodeError, AttributeError):
+        logger.warning("Falco did not report the kernel event counters of the capture")
+        return None, None
+    return output_fields.get("scap.n_evts"), output_fields.get("scap.n_drops")
+
+
+def _rotate_captures(captures_dir: Path, max_bytes: int, keep: Optional[Path] = None) -> None:
+    """Remove the oldest captures until the captures directory fits in a size.
+
+    Args:
+        captures_dir: The captures directory.
+        max_bytes: The maximum size of the captures directory, in bytes.
+        keep: A capture to never remove.
+    """
+    captures = sorted(captures_dir.glob("*.scap"), key=lambda path: path.stat().st_mtime)
+    total = sum(path.stat().st_size for path in captures)
+    for oldest in captures:
+        if total <= max_bytes:
+            break
+        if oldest == keep:
+            continue
+        logger.info("Removing capture %s", oldest.name)
+        total -= oldest.stat().st_size
+        oldest.unlink(missing_ok=True)
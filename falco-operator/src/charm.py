@@ -5,23 +5,56 @@
 
 """Falco subordinate charm."""
 
+import json
 import logging
+import secrets
+import time
 import typing
+from datetime import datetime, timezone
 
 import ops
 from charms.grafana_agent.v0.cos_agent import COSAgentProvider
 from pfe.interfaces.falcosidekick_http_endpoint import HttpEndpointRequirer
 
-from config import InvalidCharmConfigError
+from autotune import AutotuneState, fetch_sample, in_window
+from capture import MEGABYTE, CaptureError, CaptureParams, capture
+from config import CONTAINER_ENGINES, PLUGINS, InvalidCharmConfigError
+from metrics import (
+    MetricsError,
+    RuleStatsParams,
+    fetch_metrics,
+    outputs_queue_drops,
+    rule_stats,
+)
+from profiling import ProfileRulesParams, ProfilingError, profile_rules
+from relay import FalcoRelay, FalcoRelayServiceFile
+from resources import ResourcesError, service_resources
 from service import (
+    CLONE_OUTPUT_DIR,
+    FALCO_CUSTOM_CONFIGS_KEY,
+    FALCO_CUSTOM_RULES_KEY,
+    FALCO_SERVICE_NAME,
+    RELAY_PORT,
     FalcoConfigFile,
     FalcoConfigurationError,
     FalcoCustomSetting,
     FalcoLayout,
+    FalcoLogrotateFile,
     FalcoService,
     FalcoServiceFile,
+    detect_container_engines,
+    detect_plugins,
 )
 from state import CharmBaseWithState, CharmState
+from syscalls import (
+    REPAIRED_BASE_SYSCALLS,
+    CompareBaseSyscallsParams,
+    SyscallsError,
+    compare,
+    repaired_config,
+    syscall_counts,
+    syscall_sets,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -36,11 +69,22 @@ class Falco(CharmBaseWithState):
     As a subordinate charm, it runs alongside a principal charm.
     """
 
+    _stored = ops.StoredState()
+
     def __init__(self, *args: typing.Any):
         """Charm the service."""
         super().__init__(*args)
 
         self._state = None
+        self._stored.set_default(
+            fingerprint="",
+            buf_size_autotune="",
+            detected_plugins="",
+            detected_container_engines="",
+            outputs_queue_drops=0,
+            restart_pending=False,
+            relay_token="",
+        )
 
         self.http_endpoint_requirer = HttpEndpointRequirer(
             self, relation_name=HTTP_ENDPOINT_RELATION_NAME
@@ -51,15 +95,28 @@ class Falco(CharmBaseWithState):
             metrics_endpoints=[
                 {"path": "/metrics", "port": METRICS_PORT},
             ],
+            scrape_configs=self._relay_scrape_configs,
+            metrics_rules_dir="./src/prometheus_alert_rules",
+            dashboard_dirs=["./src/grafana_dashboards"],
+            refresh_events=[
+                self.on.config_changed,
+                self.on.update_status,
+                self.on[HTTP_ENDPOINT_RELATION_NAME].relation_changed,
+                self.on[HTTP_ENDPOINT_RELATION_NAME].relation_broken,
+            ],
         )
 
         self.falco_layout = FalcoLayout(base_dir=self.charm_dir / "falco")
         self.falco_service_file = FalcoServiceFile(self.falco_layout, self)
-        self.managed_falco_config = FalcoConfigFile(self.falco_layout)
+        self.managed_falco_config = FalcoConfigFile(self.falco_layout, self)
         self.custom_falco_setting = FalcoCustomSetting(self.falco_layout)
         self.falco_service = FalcoService(
-            self.managed_falco_config, self.falco_service_file, self.custom_falco_setting
+            self.managed_falco_config,
+            self.falco_service_file,
+            self.custom_falco_setting,
+            FalcoLogrotateFile(),
         )
+        self.falco_relay = FalcoRelay(FalcoRelayServiceFile(self.falco_layout, self))
 
         self.framework.observe(self.on.remove, self._on_remove)
         self.framework.observe(self.on.install, self._on_install_or_upgrade)
@@ -67,6 +124,14 @@ class Falco(CharmBaseWithState):
 
         self.framework.observe(self.on.config_changed, self.reconcile)
         self.framework.observe(self.on.secret_changed, self.reconcile)
+        self.framework.observe(self.on.update_status, self._on_update_status)
+        self.framework.observe(self.on.profile_rules_action, self._on_profile_rules_action)
+        self.framework.observe(self.on.capture_action, self._on_capture_action)
+        self.framework.observe(self.on.rule_stats_action, self._on_rule_stats_action)
+        self.framework.observe(
+            self.on.compare_base_syscalls_action, self._on_compare_base_syscalls_action
+        )
+        self.framework.observe(self.on.resource_usage_action, self._on_resource_usage_action)
 
         # Observe http-endpoint relation evnents to trigger reconciliation
         self.framework.observe(
@@ -80,23 +145,332 @@ class Falco(CharmBaseWithState):
     def state(self) -> CharmState:
         """The charm state."""
         if self._state is None:
-            self._state = CharmState.from_charm(self, self.http_endpoint_requirer)
+            if not str(self._stored.relay_token):
+                self._stored.relay_token = secrets.token_urlsafe(32)
+            detected_plugins = str(self._stored.detected_plugins)
+            detected_container_engines = str(self._stored.detected_container_engines)
+            self._state = CharmState.from_charm(
+                self,
+                self.http_endpoint_requirer,
+                self.autotune_state.preset,
+                json.loads(detected_plugins) if detected_plugins else None,
+                json.loads(detected_container_engines) if detected_container_engines else None,
+                str(self._stored.relay_token),
+            )
         return self._state
 
+    @property
+    def autotune_state(self) -> AutotuneState:
+        """The state of the ring buffer autotuner."""
+        stored = str(self._stored.buf_size_autotune)
+        if not stored:
+            return AutotuneState()
+        return AutotuneState.model_validate_json(stored)
+
+    def _on_update_status(self, event: ops.UpdateStatusEvent) -> None:
+        """Handle update status event by autotuning the ring buffer size and reporting drops."""
+        try:
+            charm_state = self.state
+        except InvalidCharmConfigError:
+            return
+
+        self._autotune_buf_size(event, charm_state)
+        self._update_outputs_queue_status(charm_state)
+
+    def _update_outputs_queue_status(self, charm_state: CharmState) -> None:
+        """Report the alerts dropped by the outputs queue since the previous update.
+
+        Args:
+            charm_state: The charm state.
+        """
+        if not isinstance(self.unit.status, ops.ActiveStatus):
+            return
+
+        try:
+            drops = outputs_queue_drops(fetch_metrics(METRICS_PORT))
+        except MetricsError as e:
+            logger.warning("Skipping outputs queue status: %s", e)
+            return
+
+        previous = int(str(self._stored.outputs_queue_drops))
+        self._stored.outputs_queue_drops = drops
+        # The counter restarts from zero when Falco restarts
+        dropped = drops - previous if drops >= previous else drops
+        if not dropped:
+            self.unit.status = ops.ActiveStatus()
+            return
+
+        capacity = charm_state.outputs_queue_capacity or "unbounded"
+        logger.warning("Falco outputs queue dropped %d alerts, capacity %s", dropped, capacity)
+        self.unit.status = ops.ActiveStatus(
+            f"Outputs queue dropped {dropped} alerts (capacity {capacity})"
+        )
+
+    def _autotune_buf_size(self, event: ops.UpdateStatusEvent, charm_state: CharmState) -> None:
+        """Autotune the ring buffer size from the kernel event drops.
+
+        Args:
+            event: The update status event.
+            charm_state: The charm state.
+        """
+        if not charm_state.engine_buf_size_autotune:
+            self._stored.buf_size_autotune = ""
+            return
+
+        try:
+            sample = fetch_sample(METRICS_PORT)
+        except MetricsError as e:
+            logger.warning("Skipping ring buffer autotune: %s", e)
+            return
+
+        autotune = self.autotune_state.observe(
+            sample,
+            current=charm_state.engine_buf_size_preset,
+            minimum=charm_state.engine_buf_size_preset_min,
+            maximum=charm_state.engine_buf_size_preset_max,
+        )
+        now = datetime.now(timezone.utc)
+        if autotune.pending_preset is None or not in_window(
+            charm_state.engine_buf_size_autotune_window, now
+        ):
+            self._stored.buf_size_autotune = autotune.model_dump_json()
+            return
+
+        logger.info("Applying ring buffer size preset %d", autotune.pending_preset)
+        self._stored.buf_size_autotune = autotune.apply().model_dump_json()
+        self._state = None
+        self.reconcile(event)
+
+    def _relay_scrape_configs(self) -> list[dict]:
+        """Scrape the relay metrics only while the relay runs.
+
+        Returns:
+            The scrape config of the relay, if the charm state needs the relay.
+        """
+        try:
+            if not FalcoRelay.needed(self.state):
+                return []
+        except InvalidCharmConfigError:
+            return []
+        return [
+            {
+                "metrics_path": "/metrics",
+                "static_configs": [{"targets": [f"localhost:{RELAY_PORT}"]}],
+            }
+        ]
+
     def _on_remove(self, _: ops.RemoveEvent) -> None:
         """Handle remove event."""
         self.unit.status = ops.MaintenanceStatus("Removing Falco service")
         self.falco_service.remove()
+        self.falco_relay.remove()
 
-    def _on_install_or_upgrade(self, _: ops.InstallEvent | ops.UpgradeCharmEvent) -> None:
+    def _on_install_or_upgrade(self, event: ops.InstallEvent | ops.UpgradeCharmEvent) -> None:
         """Handle install or upgrade charm event."""
         self.unit.status = ops.MaintenanceStatus("Installing Falco service")
+        detected_plugins = detect_plugins()
+        detected_container_engines = detect_container_engines()
+        if isinstance(event, ops.UpgradeCharmEvent):
+            # Never drop a plugin the running Falco loads on upgrade, the deployments predating
+            # the detection load all of them
+            stored = str(self._stored.detected_plugins)
+            loaded_plugins = json.loads(stored) if stored else list(PLUGINS)
+            detected_plugins = [
+                plugin
+                for plugin in PLUGINS
+                if plugin in loaded_plugins or plugin in detected_plugins
+            ]
+            # Never drop a container engine whose socket is briefly missing either
+            stored = str(self._stored.detected_container_engines)
+            enabled_engines = json.loads(stored) if stored else CONTAINER_ENGINES
+            detected_container_engines = {
+                engine: list(
+                    dict.fromkeys(
+                        [
+                            *enabled_engines.get(engine, []),
+                            *detected_container_engines.get(engine, []),
+                        ]
+                    )
+                )
+                for engine in CONTAINER_ENGINES
+                if engine in enabled_engines or engine in detected_container_engines
+            }
+        self._stored.detected_plugins = json.dumps(detected_plugins)
+        self._stored.detected_container_engines = json.dumps(detected_container_engines)
         self.falco_service.install()
+        # Pick up the new Falco bundle and relay script once configured by the reconcile
+        self._stored.restart_pending = True
+
+    def _on_profile_rules_action(self, event: ops.ActionEvent) -> None:
+        """Handle profile-rules action by replaying a capture file with the rules."""
+        params = event.load_params(ProfileRulesParams, errors="fail")
+        capture_file = params.capture_file
+        if not capture_file.is_absolute() or not capture_file.is_file():
+            event.fail(f"Capture file {capture_file} does not exist")
+            return
+
+        rules_dir = self.falco_layout.rules_dir
+        configs_dir = self.falco_layout.configs_dir
+        if params.rules_source == "repository":
+            rules_dir = CLONE_OUTPUT_DIR / FALCO_CUSTOM_RULES_KEY
+            configs_dir = CLONE_OUTPUT_DIR / FALCO_CUSTOM_CONFIGS_KEY
+            if not rules_dir.is_dir():
+                event.fail("No rules synced from the custom configuration repository")
+                return
+
+        event.log(f"Profiling the rules in {rules_dir}")
+        try:
+            profile = profile_rules(self.falco_layout, capture_file, rules_dir, configs_dir)
+        except ProfilingError as e:
+            logger.error("Failed to profile rules: %s", e)
+            event.fail(str(e))
+            return
+
+        results: dict[str, typing.Any] = {
+            "seconds": profile.seconds,
+            "rules": json.dumps([cost.model_dump() for cost in profile.rules[: params.top]]),
+        }
+        if profile.events is not None:
+            results["events"] = profile.events
+        if profile.events_per_second is not None:
+            results["events-per-second"] = profile.events_per_second
+        event.set_results(results)
+
+    def _on_capture_action(self, event: ops.ActionEvent) -> None:
+        """Handle capture action by recording a bounded scap capture."""
+        params = event.load_params(CaptureParams, errors="fail")
+        event.log(f"Recording up to {params.duration} seconds or {params.size} MB of events")
+        try:
+            result = capture(self.falco_layout, params.duration, params.size * MEGABYTE)
+        except CaptureError as e:
+            logger.error("Failed to record capture: %s", e)
+            event.fail(str(e))
+            return
+
+        results: dict[str, typing.Any] = {
+            "path": str(result.path),
+            "seconds": result.seconds,
+            "size-bytes": result.size,
+        }
+        if result.events is not None:
+            results["events"] = result.events
+        if result.drops is not None:
+            results["drops"] = result.drops
+        event.set_results(results)
+
+    def _on_rule_stats_action(self, event: ops.ActionEvent) -> None:
+        """Handle rule-stats action by sampling the rule match counters."""
+        params = event.load_params(RuleStatsParams, errors="fail")
+        event.log(f"Sampling the rule match counters for {params.window} seconds")
+        try:
+            before = fetch_metrics(METRICS_PORT)
+            start = time.monotonic()
+            time.sleep(params.window)
+            after = fetch_metrics(METRICS_PORT)
+            seconds = time.monotonic() - start
+        except MetricsError as e:
+            logger.error("Failed to sample rule stats: %s", e)
+            event.fail(str(e))
+            return
+
+        stats = rule_stats(before, after, seconds)
+        event.set_results(
+            {
+                "seconds": round(stats.seconds, 3),
+                "matches": stats.matches,
+                "rate": stats.rate,
+                "priorities": json.dumps(stats.priorities),
+                "rules": json.dumps(
+                    [rule_rate.model_dump() for rule_rate in stats.rules[: params.top]]
+                ),
+            }
+        )
+
+    def _on_compare_base_syscalls_action(self, event: ops.ActionEvent) -> None:
+        """Handle compare-base-syscalls action by comparing the traced syscall sets."""
+        params = event.load_params(CompareBaseSyscallsParams, errors="fail")
+        event.log("Listing the syscalls traced by Falco")
+        try:
+            current = syscall_sets(self.falco_layout)
+            repaired = syscall_sets(self.falco_layout, REPAIRED_BASE_SYSCALLS)
+        except SyscallsError as e:
+            logger.error("Failed to list the syscalls traced by Falco: %s", e)
+            event.fail(str(e))
+            return
+
+        before, after, seconds = self._sample_syscall_counts(event, params.window)
+        comparison = compare(current, repaired, before, after, seconds)
+        results: dict[str, typing.Any] = {
+            "rules-syscalls": json.dumps(comparison.rules),
+            "current-syscalls": json.dumps(comparison.current),
+            "repaired-syscalls": json.dumps(comparison.repaired),
+            "repaired-config": repaired_config(),
+        }
+        if comparison.removed_rate is not None:
+            results["removed-events-per-second"] = comparison.removed_rate
+            results["unobserved-rules-syscalls"] = json.dumps(comparison.unobserved)
+        event.set_results(results)
+
+    def _sample_syscall_counts(
+        self, event: ops.ActionEvent, window: int
+    ) -> tuple[dict[str, int] | None, dict[str, int] | None, float]:
+        """Sample the syscall counters of the Falco metrics endpoint over a window.
+
+        Args:
+            event: The action event to log the progress to.
+            window: The sampling window, in seconds, or 0 to skip the sampling.
+
+        Returns:
+            The syscall counters at the start and at the end of the window, or None if not
+            sampled, and the measured window in seconds.
+        """
+        if not window:
+            return None, None, 0.0
+        event.log(f"Sampling the syscall rates for {window} seconds")
+        try:
+            before = syscall_counts(fetch_metrics(METRICS_PORT))
+            start = time.monotonic()
+            time.sleep(window)
+            after = syscall_counts(fetch_metrics(METRICS_PORT))
+        except MetricsError as e:
+            logger.warning("Failed to sample the syscall rates: %s", e)
+            event.log(f"Syscall rates not sampled: {e}")
+            return None, None, 0.0
+        if not after:
+            event.log("Syscall rates not sampled, libbpf_stats is missing from metrics-counters")
+        return before, after, time.monotonic() - start
+
+    def _on_resource_usage_action(self, event: ops.ActionEvent) -> None:
+        """Handle resource-usage action by reporting the Falco service limits and usage."""
+        try:
+            resources = service_resources(FALCO_SERVICE_NAME)
+        except ResourcesError as e:
+            logger.error("Failed to read the Falco service resources: %s", e)
+            event.fail(str(e))
+            return
+
+        event.set_results(
+            {"limits": json.dumps(resources.limits), "usage": json.dumps(resources.usage)}
+        )
 
     def reconcile(self, _: ops.EventBase) -> None:
         """Reconcile the charm state."""
+        restart = bool(self._stored.restart_pending)
         try:
-            self.falco_service.configure(self.state)
+            fingerprint = self.falco_service.fingerprint(self.state)
+            if (
+                not restart
+                and fingerprint == self._stored.fingerprint
+                and self.falco_service.check_active()
+                and self.falco_relay.check_active(self.state)
+            ):
+                logger.info("Charm state and Falco files unchanged, skipping reconcile")
+                self.unit.status = ops.ActiveStatus()
+                return
+
+            # Start the relay first, so that Falco never posts alerts to a closed port
+            self.falco_relay.configure(self.state, restart=restart)
+            self.falco_service.configure(self.state, restart=restart)
         except InvalidCharmConfigError:
             self.unit.status = ops.BlockedStatus("Invalid charm config")
             return
@@ -107,6 +481,8 @@ class Falco(CharmBaseWithState):
         if not self.falco_service.check_active():
             raise RuntimeError("Falco service is not running")
 
+        self._stored.fingerprint = self.falco_service.fingerprint(self.state) or ""
+        self._stored.restart_pending = False
         self.unit.status = ops.ActiveStatus()
 
 
@@ -4,12 +4,77 @@
 """Charm config option module."""
 
 import logging
-from typing import Optional
+import re
+from datetime import time
+from typing import Literal, Optional, Union
 
 from ops import Secret
-from pydantic import AnyUrl, BaseModel, ConfigDict, field_validator
+from pydantic import AnyUrl, BaseModel, ConfigDict, Field, field_validator, model_validator
 
 SUPPORTED_SCHEMES = "git+ssh"
+METRICS_COUNTERS = (
+    "rules_counters",
+    "resource_utilization",
+    "state_counters",
+    "kernel_event_counters",
+    "kernel_event_counters_per_cpu",
+    "libbpf_stats",
+    "plugins_metrics",
+    "jemalloc_stats",
+)
+DEFAULT_METRICS_COUNTERS = tuple(
+    counter
+    for counter in METRICS_COUNTERS
+    if counter not in ("kernel_event_counters_per_cpu", "jemalloc_stats")
+)
+PLUGINS = ("json", "k8saudit", "container")
+# The container engines of the container plugin, with their default sockets
+CONTAINER_ENGINES = {
+    "docker": ("/var/run/docker.sock",),
+    "podman": ("/run/podman/podman.sock",),
+    "containerd": (
+        "/run/containerd/containerd.sock",
+        "/run/k3s/containerd/containerd.sock",
+        "/var/snap/microk8s/common/run/containerd.sock",
+    ),
+    "cri": ("/run/crio/crio.sock",),
+    "lxc": (),
+    "libvirt_lxc": (),
+    "bpm": (),
+}
+CONTAINER_HOOKS = ("create", "start")
+OUTPUTS = ("http", "syslog", "stdout", "file")
+# The default rulesets shipped with the bundled Falco, with their rules file
+RULESETS = {
+    "stable": "falco_rules.yaml",
+    "incubating": "falco-incubating_rules.yaml",
+    "sandbox": "falco-sandbox_rules.yaml",
+    "k8saudit": "k8s_audit_rules.yaml",
+}
+# The rule priorities by decreasing severity, Falco exports them by their numeric level
+PRIORITIES = (
+    "emergency",
+    "alert",
+    "critical",
+    "error",
+    "warning",
+    "notice",
+    "informational",
+    "debug",
+)
+# The plugins whose fields the default rulesets use, loaded along with them
+RULESET_PLUGINS = {
+    "stable": ("container",),
+    "incubating": ("container",),
+    "sandbox": ("container",),
+    "k8saudit": ("json", "k8saudit"),
+}
+RULE_TAG_PREFIX = "tag:"
+# A syscall name, negated with "!" to never trace it
+BASE_SYSCALL_PATTERN = re.compile(r"!?[a-z0-9_]+")
+# A CPU index or an inclusive range of CPU indexes, as accepted by systemd CPUAffinity
+CPU_AFFINITY_PATTERN = re.compile(r"[0-9]+(-[0-9]+)?")
+METRICS_INTERVAL_PATTERN = re.compile(r"([0-9]+(ms|s|m|h|d|w|y))+")
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +90,45 @@ class CharmConfig(BaseModel):
     Attributes:
         custom_config_ssh_key (Secret): Optional SSH key for custom configuration repository.
         custom_config_repository (AnyUrl): Optional URL to a custom configuration repository.
+        engine_buf_size_preset (int): Size preset of the modern eBPF ring buffers.
+        engine_cpus_for_each_buffer (int): Number of CPUs sharing a modern eBPF ring buffer.
+        engine_drop_failed_exit (bool): Whether to drop failed syscall exit events in the kernel.
+        engine_buf_size_autotune (bool): Whether to tune the ring buffer size from the drops.
+        engine_buf_size_preset_min (int): Lowest size preset the autotuner may apply.
+        engine_buf_size_preset_max (int): Highest size preset the autotuner may apply.
+        engine_buf_size_autotune_window (str): Maintenance window of the autotuner, in UTC.
+        metrics_interval (str): Interval of the Falco metrics snapshots sent to the outputs.
+        metrics_output_rule (bool): Whether to send the Falco metrics snapshots to the outputs.
+        metrics_counters (list[str]): The enabled Falco metrics counters.
+        plugins (Union[Literal["auto"], list[str]]): The Falco plugins to load, or auto.
+        container_engines (Union[Literal["auto"], list[str]]): The container engines, or auto.
+        container_sockets (dict[str, list[str]]): The container engine sockets overrides.
+        container_label_max_len (int): Maximum length of the container labels to collect.
+        container_with_size (bool): Whether to collect the container size.
+        container_hooks (list[str]): The container lifecycle hooks collecting metadata.
+        outputs_queue_capacity (int): Maximum number of alerts queued for the outputs.
+        buffered_outputs (bool): Whether to buffer the output streams of the alerts.
+        output_timeout (int): Time an output may block before Falco reports it, in milliseconds.
+        http_output_keep_alive (bool): Whether to reuse the connection to the HTTP endpoint.
+        http_output_compress_uploads (bool): Whether to compress the alerts sent to the HTTP
+            endpoint, if it accepts compressed bodies.
+        relay (bool): Whether to send the alerts through the local spool-and-forward relay.
+        relay_spool_max_size (int): Maximum size of the relay spool, in megabytes.
+        outputs (list[str]): The Falco output channels alerts are sent to.
+        file_output_max_size (int): Size at which the alerts file is rotated, in megabytes.
+        file_output_rotate (int): Number of rotated alerts files to keep.
+        rulesets (list[str]): The default rulesets to load before the custom rules.
+        rules_disable (list[str]): The rules to disable, by name or by "tag:" prefixed tag.
+        rules_enable (list[str]): The rules to enable again, by name or by "tag:" prefixed tag.
+        priority (str): The minimum priority of the loaded rules.
+        base_syscalls_custom_set (list[str]): The syscalls traced on top of the rules ones.
+        base_syscalls_repair (bool): Whether to only trace the state syscalls the rules need.
+        cpu_quota (int): CPU time the Falco service may use, in percent of a CPU, 0 for no limit.
+        memory_max (int): Memory the Falco service may use, in megabytes, 0 for no limit.
+        cpu_affinity (list[str]): The CPUs or CPU ranges the Falco service runs on.
+        nice (int): Scheduling priority of the Falco service.
+        cpu_weight (int): CPU weight of the Falco service, 0 for the systemd default.
+        io_weight (int): IO weight of the Falco service, 0 for the systemd default.
     """
 
     # Pydantic model config
@@ -33,6 +137,44 @@ class CharmConfig(BaseModel):
     # Charm Configs
     custom_config_repository: Optional[AnyUrl] = None
     custom_config_repo_ssh_key: Optional[Secret] = None
+    engine_buf_size_preset: int = Field(default=4, ge=0, le=10)
+    engine_cpus_for_each_buffer: int = Field(default=2, ge=0)
+    engine_drop_failed_exit: bool = False
+    engine_buf_size_autotune: bool = False
+    engine_buf_size_preset_min: int = Field(default=1, ge=0, le=10)
+    engine_buf_size_preset_max: int = Field(default=8, ge=0, le=10)
+    engine_buf_size_autotune_window: str = ""
+    metrics_interval: str = "1h"
+    metrics_output_rule: bool = True
+    metrics_counters: list[str] = list(DEFAULT_METRICS_COUNTERS)
+    plugins: Union[Literal["auto"], list[str]] = "auto"
+    container_engines: Union[Literal["auto"], list[str]] = "auto"
+    container_sockets: dict[str, list[str]] = {}
+    container_label_max_len: int = Field(default=100, ge=0)
+    container_with_size: bool = False
+    container_hooks: list[str] = ["create"]
+    outputs_queue_capacity: int = Field(default=0, ge=0)
+    buffered_outputs: bool = False
+    output_timeout: int = Field(default=2000, ge=1)
+    http_output_keep_alive: bool = True
+    http_output_compress_uploads: bool = True
+    relay: bool = True
+    relay_spool_max_size: int = Field(default=256, ge=1)
+    outputs: list[str] = ["http"]
+    file_output_max_size: int = Field(default=100, ge=1)
+    file_output_rotate: int = Field(default=5, ge=0)
+    rulesets: list[str] = []
+    rules_disable: list[str] = []
+    rules_enable: list[str] = []
+    priority: str = "debug"
+    base_syscalls_custom_set: list[str] = []
+    base_syscalls_repair: bool = False
+    cpu_quota: int = Field(default=0, ge=0)
+    memory_max: int = Field(default=0, ge=0)
+    cpu_affinity: list[str] = []
+    nice: int = Field(default=0, ge=-20, le=19)
+    cpu_weight: int = Field(default=0, ge=0, le=10000)
+    io_weight: int = Field(default=0, ge=0, le=10000)
 
     @field_validator("custom_config_repository")
     @classmethod
@@ -62,3 +204,353 @@ class CharmConfig(BaseModel):
             raise InvalidCharmConfigError(err_msg)
 
         return repo
+
+    @field_validator("engine_buf_size_autotune_window")
+    @classmethod
+    def validate_engine_buf_size_autotune_window(cls, window: str) -> str:
+        """Validate the maintenance window of the ring buffer autotuner.
+
+        Args:
+            window: The maintenance window as "HH:MM-HH:MM", or empty for any time.
+
+        Returns:
+            The validated maintenance window.
+
+        Raises:
+            InvalidCharmConfigError: If the maintenance window is malformed.
+        """
+        if not window:
+            return window
+
+        bounds = window.split("-")
+        try:
+            if len(bounds) != 2 or any(len(bound) != 5 for bound in bounds):
+                raise ValueError(window)
+            for bound in bounds:
+                time.fromisoformat(bound)
+        except ValueError as e:
+            err_msg = f"Invalid engine_buf_size_autotune_window '{window}', expected HH:MM-HH:MM"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg) from e
+
+        return window
+
+    @field_validator("metrics_interval")
+    @classmethod
+    def validate_metrics_interval(cls, interval: str) -> str:
+        """Validate the interval of the Falco metrics snapshots.
+
+        Args:
+            interval: The interval as a Prometheus duration, for example "15m" or "1h30m".
+
+        Returns:
+            The validated interval.
+
+        Raises:
+            InvalidCharmConfigError: If the interval is not a duration.
+        """
+        if not METRICS_INTERVAL_PATTERN.fullmatch(interval):
+            err_msg = f"Invalid metrics_interval '{interval}', expected a duration such as 1h"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return interval
+
+    @field_validator("metrics_counters", mode="before")
+    @classmethod
+    def validate_metrics_counters(cls, counters: str | list[str]) -> list[str]:
+        """Validate the list of the enabled Falco metrics counters.
+
+        Args:
+            counters: The comma separated list of metrics counters.
+
+        Returns:
+            The validated list of metrics counters.
+
+        Raises:
+            InvalidCharmConfigError: If a metrics counter is unknown.
+        """
+        if isinstance(counters, str):
+            counters = [counter.strip() for counter in counters.split(",") if counter.strip()]
+        unknown = set(counters) - set(METRICS_COUNTERS)
+        if unknown:
+            err_msg = f"Unknown metrics_counters {', '.join(sorted(unknown))}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return counters
+
+    @field_validator("plugins", mode="before")
+    @classmethod
+    def validate_plugins(cls, plugins: str | list[str]) -> Union[Literal["auto"], list[str]]:
+        """Validate the Falco plugins to load.
+
+        Args:
+            plugins: "auto", or the comma separated list of plugins.
+
+        Returns:
+            "auto", or the validated list of plugins.
+
+        Raises:
+            InvalidCharmConfigError: If a plugin is unknown.
+        """
+        if plugins == "auto":
+            return "auto"
+        if isinstance(plugins, str):
+            plugins = [plugin.strip() for plugin in plugins.split(",") if plugin.strip()]
+        unknown = set(plugins) - set(PLUGINS)
+        if unknown:
+            err_msg = f"Unknown plugins {', '.join(sorted(unknown))}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return plugins
+
+    @field_validator("container_engines", mode="before")
+    @classmethod
+    def validate_container_engines(
+        cls, engines: str | list[str]
+    ) -> Union[Literal["auto"], list[str]]:
+        """Validate the container engines of the container plugin.
+
+        Args:
+            engines: "auto", or the comma separated list of container engines.
+
+        Returns:
+            "auto", or the validated list of container engines.
+
+        Raises:
+            InvalidCharmConfigError: If a container engine is unknown.
+        """
+        if engines == "auto":
+            return "auto"
+        if isinstance(engines, str):
+            engines = [engine.strip() for engine in engines.split(",") if engine.strip()]
+        unknown = set(engines) - set(CONTAINER_ENGINES)
+        if unknown:
+            err_msg = f"Unknown container_engines {', '.join(sorted(unknown))}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return engines
+
+    @field_validator("container_sockets", mode="before")
+    @classmethod
+    def validate_container_sockets(
+        cls, sockets: str | dict[str, list[str]]
+    ) -> dict[str, list[str]]:
+        """Validate the container engine sockets overrides.
+
+        Args:
+            sockets: The comma separated list of "engine=path" sockets.
+
+        Returns:
+            The validated sockets, by container engine.
+
+        Raises:
+            InvalidCharmConfigError: If a socket is malformed or its container engine is unknown.
+        """
+        if not isinstance(sockets, str):
+            return sockets
+
+        engine_sockets: dict[str, list[str]] = {}
+        for item in (item.strip() for item in sockets.split(",") if item.strip()):
+            engine, _, path = (part.strip() for part in item.partition("="))
+            if not CONTAINER_ENGINES.get(engine) or not path.startswith("/"):
+                err_msg = (
+                    f"Invalid container_sockets '{item}', expected engine=/path/to/socket "
+                    f"with engine among {', '.join(e for e, s in CONTAINER_ENGINES.items() if s)}"
+                )
+                logger.error(err_msg)
+                raise InvalidCharmConfigError(err_msg)
+            engine_sockets.setdefault(engine, []).append(path)
+
+        return engine_sockets
+
+    @field_validator("container_hooks", mode="before")
+    @classmethod
+    def validate_container_hooks(cls, hooks: str | list[str]) -> list[str]:
+        """Validate the container lifecycle hooks collecting metadata.
+
+        Args:
+            hooks: The comma separated list of hooks.
+
+        Returns:
+            The validated list of hooks.
+
+        Raises:
+            InvalidCharmConfigError: If a hook is unknown.
+        """
+        if isinstance(hooks, str):
+            hooks = [hook.strip() for hook in hooks.split(",") if hook.strip()]
+        unknown = set(hooks) - set(CONTAINER_HOOKS)
+        if unknown:
+            err_msg = f"Unknown container_hooks {', '.join(sorted(unknown))}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return hooks
+
+    @field_validator("outputs", mode="before")
+    @classmethod
+    def validate_outputs(cls, outputs: str | list[str]) -> list[str]:
+        """Validate the Falco output channels.
+
+        Args:
+            outputs: The comma separated list of output channels.
+
+        Returns:
+            The validated list of output channels.
+
+        Raises:
+            InvalidCharmConfigError: If no output channel is selected or one is unknown.
+        """
+        if isinstance(outputs, str):
+            outputs = [output.strip() for output in outputs.split(",") if output.strip()]
+        if not outputs:
+            err_msg = f"No outputs selected, expected some of {', '.join(OUTPUTS)}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+        unknown = set(outputs) - set(OUTPUTS)
+        if unknown:
+            err_msg = f"Unknown outputs {', '.join(sorted(unknown))}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return outputs
+
+    @field_validator("rulesets", mode="before")
+    @classmethod
+    def validate_rulesets(cls, rulesets: str | list[str]) -> list[str]:
+        """Validate the default rulesets to load.
+
+        Args:
+            rulesets: The comma separated list of rulesets.
+
+        Returns:
+            The validated list of rulesets.
+
+        Raises:
+            InvalidCharmConfigError: If a ruleset is unknown.
+        """
+        if isinstance(rulesets, str):
+            rulesets = [ruleset.strip() for ruleset in rulesets.split(",") if ruleset.strip()]
+        unknown = set(rulesets) - set(RULESETS)
+        if unknown:
+            err_msg = f"Unknown rulesets {', '.join(sorted(unknown))}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return rulesets
+
+    @field_validator("rules_disable", "rules_enable", mode="before")
+    @classmethod
+    def validate_rule_selectors(cls, selectors: str | list[str]) -> list[str]:
+        """Validate the rule selectors.
+
+        Args:
+            selectors: The comma separated list of rule names, or "tag:" prefixed rule tags.
+
+        Returns:
+            The validated list of rule selectors.
+
+        Raises:
+            InvalidCharmConfigError: If a tag selector has no tag.
+        """
+        if isinstance(selectors, str):
+            selectors = [selector.strip() for selector in selectors.split(",") if selector.strip()]
+        empty = [selector for selector in selectors if selector.strip() == RULE_TAG_PREFIX]
+        if empty:
+            err_msg = f"Rule selector '{RULE_TAG_PREFIX}' misses a tag"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return selectors
+
+    @field_validator("priority")
+    @classmethod
+    def validate_priority(cls, priority: str) -> str:
+        """Validate the minimum priority of the loaded rules.
+
+        Args:
+            priority: The rule priority.
+
+        Returns:
+            The validated rule priority.
+
+        Raises:
+            InvalidCharmConfigError: If the priority is unknown.
+        """
+        if priority not in PRIORITIES:
+            err_msg = f"Invalid priority '{priority}', expected one of {', '.join(PRIORITIES)}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return priority
+
+    @field_validator("base_syscalls_custom_set", mode="before")
+    @classmethod
+    def validate_base_syscalls_custom_set(cls, syscalls: str | list[str]) -> list[str]:
+        """Validate the base syscalls custom set.
+
+        Args:
+            syscalls: The comma separated list of syscalls, "!" prefixed to never trace them.
+
+        Returns:
+            The validated list of syscalls.
+
+        Raises:
+            InvalidCharmConfigError: If a syscall name is malformed.
+        """
+        if isinstance(syscalls, str):
+            syscalls = [syscall.strip() for syscall in syscalls.split(",") if syscall.strip()]
+        malformed = [
+            syscall for syscall in syscalls if not BASE_SYSCALL_PATTERN.fullmatch(syscall)
+        ]
+        if malformed:
+            err_msg = f"Malformed base_syscalls_custom_set {', '.join(malformed)}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return syscalls
+
+    @field_validator("cpu_affinity", mode="before")
+    @classmethod
+    def validate_cpu_affinity(cls, cpus: str | list[str]) -> list[str]:
+        """Validate the CPUs the Falco service runs on.
+
+        Args:
+            cpus: The comma separated list of CPU indexes or ranges, for example "0-3,8".
+
+        Returns:
+            The validated list of CPU indexes or ranges.
+
+        Raises:
+            InvalidCharmConfigError: If a CPU index or range is malformed.
+        """
+        if isinstance(cpus, str):
+            cpus = [cpu.strip() for cpu in cpus.split(",") if cpu.strip()]
+        malformed = [cpu for cpu in cpus if not CPU_AFFINITY_PATTERN.fullmatch(cpu)]
+        if malformed:
+            err_msg = f"Malformed cpu_affinity {', '.join(malformed)}"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return cpus
+
+    @model_validator(mode="after")
+    def validate_engine_buf_size_preset_bounds(self) -> "CharmConfig":
+        """Validate the bounds of the ring buffer autotuner.
+
+        Returns:
+            The validated charm config.
+
+        Raises:
+            InvalidCharmConfigError: If the lower bound is above the upper bound.
+        """
+        if self.engine_buf_size_preset_min > self.engine_buf_size_preset_max:
+            err_msg = "engine_buf_size_preset_min is above engine_buf_size_preset_max"
+            logger.error(err_msg)
+            raise InvalidCharmConfigError(err_msg)
+
+        return self
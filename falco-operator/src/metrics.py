@@ -0,0 +1,218 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Falco metrics module."""
+
+import logging
+import re
+import urllib.error
+import urllib.request
+
+from pydantic import BaseModel, Field
+
+from config import PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+METRICS_TIMEOUT = 5
+METRIC_LINE_PATTERN = re.compile(r"([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)")
+LABEL_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+RULE_MATCHES_METRIC = "falcosecurity_falco_rules_matches_total"
+OUTPUTS_QUEUE_DROPS_METRIC = "falcosecurity_falco_outputs_queue_num_drops_total"
+
+
+class MetricsError(Exception):
+    """Exception raised when the Falco metrics cannot be sampled."""
+
+
+class MetricSample(BaseModel):
+    """A sample of the Falco Prometheus metrics.
+
+    Attributes:
+        name: The metric name.
+        labels: The metric labels.
+        value: The metric value.
+    """
+
+    name: str
+    labels: dict[str, str]
+    value: float
+
+
+class RuleStatsParams(BaseModel):
+    """The pydantic model for the rule-stats action parameters.
+
+    Attributes:
+        window: The sampling window, in seconds.
+        top: The number of rules to report.
+    """
+
+    window: int = Field(default=60, ge=1, le=3600)
+    top: int = Field(default=20, ge=1)
+
+
+class RuleRate(BaseModel):
+    """The match rate of a rule over a sampling window.
+
+    Attributes:
+        rule: The rule name.
+        priority: The rule priority.
+        matches: The number of matches in the sampling window.
+        rate: The number of matches per second.
+    """
+
+    rule: str
+    priority: str
+    matches: int
+    rate: float
+
+
+class RuleStats(BaseModel):
+    """The rule match rates over a sampling window.
+
+    Attributes:
+        seconds: The sampling window, in seconds.
+        matches: The number of matches of all the rules.
+        rate: The number of matches per second of all the rules.
+        rules: The match rates per rule, the noisiest first.
+        priorities: The match rates per priority, the noisiest first.
+    """
+
+    seconds: float
+    matches: int
+    rate: float
+    rules: list[RuleRate]
+    priorities: dict[str, float]
+
+
+def fetch_metrics(port: int) -> list[MetricSample]:
+    """Fetch the Falco Prometheus metrics from the local webserver.
+
+    Args:
+        port: The port of the Falco webserver.
+
+    Returns:
+        The metric samples.
+
+    Raises:
+        MetricsError: If the metrics cannot be fetched.
+    """
+    url = f"http://127.0.0.1:{port}/metrics"
+    try:
+        with urllib.request.urlopen(url, timeout=METRICS_TIMEOUT) as response:  # nosec B310
+            text = response.read().decode()
+    except (urllib.error.URLError, OSError) as e:
+        raise MetricsError(f"Failed to fetch Falco metrics from {url}: {e}") from e
+    return parse_metrics(text)
+
+
+def parse_metrics(text: str) -> list[MetricSample]:
+    """Parse metrics in the Prometheus text exposition format.
+
+    Args:
+        text: The Prometheus metrics.
+
+    Returns:
+        The metric samples, skipping comments and malformed lines.
+    """
+    samples = []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        match = METRIC_LINE_PATTERN.match(line.strip())
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        try:
+            samples.append(
+                MetricSample(
+                    name=name,
+                    labels=dict(LABEL_PATTERN.findall(labels or "")),
+                    value=float(value),
+                )
+            )
+        except ValueError:
+            continue
+    return samples
+
+
+def outputs_queue_drops(samples: list[MetricSample]) -> int:
+    """Extract the number of alerts dropped by the full outputs queue.
+
+    Args:
+        samples: The metric samples.
+
+    Returns:
+        The number of alerts dropped since Falco started.
+
+    Raises:
+        MetricsError: If the metrics do not hold the outputs queue drops counter.
+    """
+    for sample in samples:
+        if sample.name == OUTPUTS_QUEUE_DROPS_METRIC:
+            return int(sample.value)
+    raise MetricsError("Falco metrics do not hold the outputs queue drops counter")
+
+
+def rule_stats(before: list[MetricSample], after: list[MetricSample], seconds: float) -> RuleStats:
+    """Compute the rule match rates between two metrics samplings.
+
+    Args:
+        before: The metric samples at the start of the sampling window.
+        after: The metric samples at the end of the sampling window.
+        seconds: The sampling window, in seconds.
+
+    Returns:
+        The rule match rates.
+    """
+    start = _rule_matches(before)
+    end = _rule_matches(after)
+    if not end:
+        logger.info("No rule matches reported by Falco, rules_counters may be disabled")
+
+    rules = []
+    priorities: dict[str, float] = {}
+    for (rule, priority), count in end.items():
+        # Counters restart from zero when Falco restarts in the window
+        matches = count - start.get((rule, priority), 0)
+        if matches < 0:
+            matches = count
+        if matches == 0:
+            continue
+        rate = matches / seconds
+        rules.append(RuleRate(rule=rule, priority=priority, matches=matches, rate=round(rate, 3)))
+        priorities[priority] = priorities.get(priority, 0.0) + rate
+
+    rules.sort(key=lambda rule_rate: rule_rate.matches, reverse=True)
+    total = sum(rule_rate.matches for rule_rate in rules)
+    return RuleStats(
+        seconds=seconds,
+        matches=total,
+        rate=round(total / seconds, 3),
+        rules=rules,
+        priorities={
+            priority: round(rate, 3)
+            for priority, rate in sorted(priorities.items(), key=lambda item: -item[1])
+        },
+    )
+
+
+def _rule_matches(samples: list[MetricSample]) -> dict[tuple[str, str], int]:
+    """Collect the match counters per rule.
+
+    Args:
+        samples: The metric samples.
+
+    Returns:
+        The number of matches, by rule name and priority.
+    """
+    matches: dict[tuple[str, str], int] = {}
+    for sample in samples:
+        if sample.name != RULE_MATCHES_METRIC or "rule_name" not in sample.labels:
+            continue
+        priority = sample.labels.get("priority", "")
+        if priority.isdigit() and int(priority) < len(PRIORITIES):
+            priority = PRIORITIES[int(priority)]
+        key = (sample.labels["rule_name"], priority)
+        matches[key] = matches.get(key, 0) + int(sample.value)
+    return matches
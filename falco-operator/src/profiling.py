@@ -0,0 +1,282 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Falco rules profiling module."""
+
+import json
+import logging
+import re
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Literal, Optional
+
+import yaml
+from pydantic import BaseModel, Field
+
+from service import FalcoLayout
+
+logger = logging.getLogger(__name__)
+
+REPLAY_TIMEOUT = 600
+CAPTURED_EVENTS_PATTERN = re.compile(r"Captured Events:\s*(\d+)")
+
+
+class ProfilingError(Exception):
+    """Exception raised when Falco fails to replay a capture file."""
+
+
+class ProfileRulesParams(BaseModel):
+    """The pydantic model for the profile-rules action parameters.
+
+    Attributes:
+        capture_file: The scap capture file to replay.
+        rules_source: Whether to profile the active rules or the synced repository rules.
+        top: The number of rules to report.
+    """
+
+    capture_file: Path
+    rules_source: Literal["active", "repository"] = "active"
+    top: int = Field(default=10, ge=1)
+
+
+class RuleCost(BaseModel):
+    """The evaluation cost of a rule over a capture file.
+
+    Attributes:
+        rule: The rule name.
+        matches: The number of events matching the rule.
+        seconds: The replay time added by the rule, in seconds.
+    """
+
+    rule: str
+    matches: int
+    seconds: float
+
+
+class RulesProfile(BaseModel):
+    """The profile of a set of rules over a capture file.
+
+    Attributes:
+        events: The number of events in the capture file, if Falco reported it.
+        seconds: The replay time with all the rules enabled, in seconds.
+        events_per_second: The replay throughput with all the rules enabled, if known.
+        rules: The rules, the most expensive first.
+    """
+
+    events: Optional[int]
+    seconds: float
+    events_per_second: Optional[float]
+    rules: list[RuleCost]
+
+
+class _Replay(BaseModel):
+    """The outcome of a single Falco replay.
+
+    Attributes:
+        seconds: The wall time of the replay, in seconds.
+        events: The number of events replayed, if Falco reported it.
+        matches: The number of events matching each rule.
+    """
+
+    seconds: float
+    events: Optional[int]
+    matches: dict[str, int]
+
+
+def profile_rules(
+    falco_layout: FalcoLayout, capture_file: Path, rules_dir: Path, configs_dir: Path
+) -> RulesProfile:
+    """Replay a capture file with Falco and rank the rules by evaluation cost.
+
+    The rules are loaded like the managed config file loads them, with the selected default
+    rulesets and rule selectors, the custom rules being read from `rules_dir`. The capture file
+    is replayed once with the deployed rules, once without any rule, and once per rule with only
+    that rule enabled. The cost of a rule is the replay time it adds over the run without any
+    rule.
+
+    Args:
+        falco_layout: The Falco file layout.
+        capture_file: The scap capture file to replay.
+        rules_dir: The directory of the custom rules files to profile.
+        configs_dir: The directory of the config override files to load.
+
+    Returns:
+        The profile of the rules.
+
+    Raises:
+        ProfilingError: If the rules cannot be read or Falco fails to replay the capture file.
+    """
+    try:
+        falco_config = yaml.safe_load(falco_layout.config_file.read_bytes()) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise ProfilingError(f"Failed to load the Falco config file: {e}") from e
+    # Keep the selected default rulesets, replacing the deployed custom rules
+    rules_files = [
+        rules_file
+        for rules_file in falco_config.get("rules_files", [])
+        if rules_file != str(falco_layout.rules_dir)
+    ] + [str(rules_dir)]
+    falco_config.update({"config_files": [str(configs_dir)], "rules_files": rules_files})
+
+    rules = _list_rules([Path(rules_file) for rules_file in rules_files])
+    with tempfile.TemporaryDirectory(prefix="falco-profile-") as staging:
+        staging_dir = Path(staging)
+
+        def replay(enabled_rules: Optional[list[str]]) -> _Replay:
+            return _replay(falco_layout, staging_dir, falco_config, capture_file, enabled_rules)
+
+        full = replay(None)
+        baseline = replay([])
+        costs = [
+            RuleCost(
+                rule=rule,
+                matches=full.matches.get(rule, 0),
+                seconds=round(max(replay([rule]).seconds - baseline.seconds, 0.0), 3),
+            )
+            for rule in rules
+        ]
+
+    costs.sort(key=lambda cost: cost.seconds, reverse=True)
+    events_per_second = None
+    if full.events is not None and full.seconds > 0:
+        events_per_second = round(full.events / full.seconds, 1)
+    return RulesProfile(
+        events=full.events,
+        seconds=round(full.seconds, 3),
+        events_per_second=events_per_second,
+        rules=costs,
+    )
+
+
+def _list_rules(rules_paths: list[Path]) -> list[str]:
+    """List the rules defined in rules files and in the top-level rules files of directories.
+
+    Args:
+        rules_paths: The rules files and directories of rules files, in loading order.
+
+    Returns:
+        The rule names, in definition order.
+
+    Raises:
+        ProfilingError: If a rules file cannot be read.
+    """
+    rules: list[str] = []
+    rules_files = [
+        rules_file
+        for rules_path in rules_paths
+        for rules_file in (
+            sorted(rules_path.glob("*.yaml")) if rules_path.is_dir() else [rules_path]
+        )
+    ]
+    for rules_file in rules_files:
+        try:
+            items = yaml.safe_load(rules_file.read_bytes()) or []
+        except (OSError, yaml.YAMLError) as e:
+            raise ProfilingError(f"Failed to read rules file {rules_file.name}: {e}") from e
+        for item in items if isinstance(items, list) else []:
+            # Only rule definitions have a condition, overrides and appends do not
+            if (
+                isinstance(item, dict)
+                and "condition" in item
+                and item.get("rule")
+                and item["rule"] not in rules
+            ):
+                rules.append(item["rule"])
+    return rules
+
+
+def _replay_options(capture_file: Path) -> list[str]:
+    """Build the Falco command line options of a replay.
+
+    Command line options take precedence over the config override files, so that custom
+    settings cannot replace the replay engine nor send the replayed alerts to the outputs.
+
+    Args:
+        capture_file: The scap capture file to replay.
+
+    Returns:
+        The list of command line options.
+    """
+    options = {
+        "engine.kind": "replay",
+        "engine.replay.capture_file": str(capture_file),
+        "json_output": "true",
+        "stdout_output.enabled": "true",
+        "syslog_output.enabled": "false",
+        "file_output.enabled": "false",
+        "http_output.enabled": "false",
+        "program_output.enabled": "false",
+        "metrics.enabled": "false",
+        "webserver.enabled": "false",
+        "watch_config_files": "false",
+    }
+    return [arg for key, value in options.items() for arg in ("-o", f"{key}={value}")]
+
+
+def _replay(
+    falco_layout: FalcoLayout,
+    staging_dir: Path,
+    falco_config: dict,
+    capture_file: Path,
+    enabled_rules: Optional[list[str]],
+) -> _Replay:
+    """Replay a capture file with Falco.
+
+    Args:
+        falco_layout: The Falco file layout.
+        staging_dir: The directory to write the replay config file to.
+        falco_config: The Falco config loading the rules and config overrides.
+        capture_file: The scap capture file to replay.
+        enabled_rules: The only rules to enable, or None for the rules selected by the config.
+
+    Returns:
+        The outcome of the replay.
+
+    Raises:
+        ProfilingError: If Falco fails to replay the capture file.
+    """
+    falco_config = dict(falco_config)
+    if enabled_rules is not None:
+        falco_config["rules"] = [{"disable": {"rule": "*"}}] + [
+            {"enable": {"rule": rule}} for rule in enabled_rules
+        ]
+    replay_config_file = staging_dir / falco_layout.config_file.name
+    replay_config_file.write_text(yaml.safe_dump(falco_config), encoding="utf-8")
+
+    replay_cmd = [
+        str(falco_layout.cmd),
+        "-c",
+        str(replay_config_file),
+        *_replay_options(capture_file),
+    ]
+    start = time.monotonic()
+    try:
+        logger.debug("Falco replay command: %s", replay_cmd)
+        process = subprocess.run(
+            replay_cmd, check=True, capture_output=True, text=True, timeout=REPLAY_TIMEOUT
+        )
+    except subprocess.CalledProcessError as e:
+        raise ProfilingError(f"Falco failed to replay the capture: {e.stderr or e.stdout}") from e
+    except subprocess.TimeoutExpired as e:
+        raise ProfilingError(f"Falco replay timed out after {REPLAY_TIMEOUT} seconds") from e
+    seconds = time.monotonic() - start
+
+    matches: dict[str, int] = {}
+    for line in process.stdout.splitlines():
+        if not line.startswith("{"):
+            continue
+        try:
+            rule = json.loads(line).get("rule")
+        except json.JSONDecodeError:
+            continue
+        if rule:
+            matches[rule] = matches.get(rule, 0) + 1
+
+    events_match = CAPTURED_EVENTS_PATTERN.search(process.stdout + process.stderr)
+    return _Replay(
+        seconds=seconds,
+        events=int(events_match.group(1)) if events_match else None,
+        matches=matches,
+    )
@@ -0,0 +1,150 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Falco alert relay module."""
+
+import logging
+import os
+import sys
+from pathlib import Path
+
+from charmlibs import systemd
+from ops.charm import CharmBase
+
+import state
+from service import RELAY_PORT, SYSTEMD_SERVICE_DIR, FalcoLayout, Template
+
+logger = logging.getLogger(__name__)
+
+RELAY_SERVICE_NAME = "falco-relay"
+MEGABYTE = 1024 * 1024
+
+
+class FalcoRelayServiceFile(Template):
+    """Falco alert relay service file manager."""
+
+    service_name = RELAY_SERVICE_NAME
+    template: str = "falco-relay.service.j2"
+    service_file: Path = SYSTEMD_SERVICE_DIR / f"{RELAY_SERVICE_NAME}.service"
+
+    def __init__(self, falco_layout: FalcoLayout, charm: CharmBase) -> None:
+        """Initialize the Falco alert relay service file manager.
+
+        Args:
+            falco_layout: The Falco file layout.
+            charm: The charm instance.
+        """
+        context = {
+            # The relay only needs the standard library of the charm interpreter
+            "python": sys.executable,
+            "script": str(charm.charm_dir / "src/relay_server.py"),
+            "listen_port": RELAY_PORT,
+            "spool_dir": str(falco_layout.relay_spool_dir),
+            "ca_cert": str(falco_layout.http_output_ca_cert),
+            "token_file": str(falco_layout.relay_token_file),
+        }
+        super().__init__(self.template, self.service_file, context=context)
+        self.token_file = falco_layout.relay_token_file
+
+
+class FalcoRelay:
+    """Falco alert relay manager.
+
+    The relay is a spool-and-forward service between Falco and the Falcosidekick endpoint, so
+    that alerts survive an unavailable endpoint. See relay_server.py.
+    """
+
+    def __init__(self, service_file: FalcoRelayServiceFile) -> None:
+        """Initialize the Falco alert relay manager.
+
+        Args:
+            service_file: The relay service file manager.
+        """
+        self.service_file = service_file
+
+    def configure(self, charm_state: state.CharmState, restart: bool = False) -> None:
+        """Run the relay towards the HTTP endpoint, or remove it if not needed.
+
+        Args:
+            charm_state: The charm state.
+            restart: Whether to restart the relay even without changes, to pick up a new
+                relay script
+        """
+        if not self.needed(charm_state):
+            self.remove()
+            return
+
+        self.service_file.context.update(
+            {
+                "upstream": (charm_state.http_output or {})["url"],
+                "spool_max_bytes": charm_state.relay_spool_max_size * MEGABYTE,
+                "with_ca_cert": bool(charm_state.http_output_ca_cert),
+                "compress": charm_state.http_output_compress_uploads,
+            }
+        )
+        token_changed = _write_token(self.service_file.token_file, charm_state.relay_token)
+        if self.service_file.install():
+            systemd.daemon_reload()
+            systemd.service_enable(self.service_file.service_name)
+            systemd.service_restart(self.service_file.service_name)
+            logger.info("Falco alert relay configured and restarted")
+        elif (
+            restart or token_changed or not systemd.service_running(self.service_file.service_name)
+        ):
+            systemd.service_restart(self.service_file.service_name)
+            logger.info("Falco alert relay restarted")
+
+    def remove(self) -> None:
+        """Stop the relay and remove its service file, keeping the spooled alerts."""
+        if not self.service_file.destination.exists():
+            return
+        logger.info("Removing Falco alert relay")
+        systemd.service_stop(self.service_file.service_name)
+        systemd.service_disable(self.service_file.service_name)
+        self.service_file.remove()
+        systemd.daemon_reload()
+
+    def check_active(self, charm_state: state.CharmState) -> bool:
+        """Check if the relay runs whenever the charm state needs it.
+
+        Args:
+            charm_state: The charm state.
+
+        Returns:
+            True if the relay is running or not needed.
+        """
+        if not self.needed(charm_state):
+            return True
+        return systemd.service_running(self.service_file.service_name)
+
+    @staticmethod
+    def needed(charm_state: state.CharmState) -> bool:
+        """Check if the charm state needs the relay.
+
+        Args:
+            charm_state: The charm state.
+
+        Returns:
+            True if the relay is enabled and there is an HTTP endpoint to forward to.
+        """
+        return charm_state.relay and bool(charm_state.http_output)
+
+
+def _write_token(token_file: Path, token: str) -> bool:
+    """Write the secret URL path of the relay, readable by root only.
+
+    Args:
+        token_file: The token file.
+        token: The secret URL path.
+
+    Returns:
+        True if the token file changed, False otherwise.
+    """
+    if token_file.exists() and token_file.read_text(encoding="utf-8") == token:
+        return False
+    token_file.parent.mkdir(parents=True, exist_ok=True)
+    token_file.unlink(missing_ok=True)
+    fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        file.write(token)
+    return True
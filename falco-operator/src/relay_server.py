@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Falco alert relay.
+
+A spool-and-forward relay between Falco and the Falcosidekick endpoint, run by the charm as the
+falco-relay systemd service. Falco posts its alerts to the relay on the loopback interface. The
+relay writes them to a size-capped spool directory, and forwards them to the endpoint over a
+persistent connection, retrying with an exponential backoff while the endpoint is unavailable.
+
+Falco posts to a secret URL path generated by the charm, so that other local processes cannot
+inject forged alerts nor flood the spool to push out genuine ones.
+
+The relay runs outside of the charm hooks, so it only depends on the standard library.
+"""
+
+import argparse
+import collections
+import gzip
+import hmac
+import http.client
+import http.server
+import itertools
+import logging
+import os
+import signal
+import ssl
+import threading
+import time
+import typing
+import urllib.parse
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# The spooled alerts forwarded before checking for new ones, one request each
+FORWARD_CHUNK = 100
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 60.0
+UPSTREAM_TIMEOUT = 10
+MAX_PAYLOAD_BYTES = 1024 * 1024
+# Upstream statuses worth retrying, other client errors reject the alert for good
+RETRY_STATUSES = (408, 429)
+METRICS = {
+    "received": ("falco_relay_alerts_received_total", "counter", "Alerts received from Falco."),
+    "forwarded": ("falco_relay_alerts_forwarded_total", "counter", "Alerts forwarded upstream."),
+    "rejected": ("falco_relay_alerts_rejected_total", "counter", "Alerts rejected upstream."),
+    "dropped": ("falco_relay_alerts_dropped_total", "counter", "Alerts dropped by the spool."),
+    "retries": ("falco_relay_forward_retries_total", "counter", "Failed forward attempts."),
+}
+
+
+class UpstreamError(Exception):
+    """Exception raised when the upstream endpoint fails to accept an alert."""
+
+
+class Metrics:
+    """The counters of the relay, shared between threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(METRICS, 0)
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """Increment a counter.
+
+        Args:
+            name: The counter name.
+            value: The increment.
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name: str) -> int:
+        """Get the value of a counter.
+
+        Args:
+            name: The counter name.
+
+        Returns:
+            The counter value.
+        """
+        with self._lock:
+            return self._counters[name]
+
+    def render(self, spool: "Spool") -> str:
+        """Render the counters and the spool gauges in the Prometheus text format.
+
+        Args:
+            spool: The spool of the relay.
+
+        Returns:
+            The Prometheus metrics.
+        """
+        samples = [(*METRICS[name], self.get(name)) for name in METRICS]
+        samples.append(("falco_relay_spool_alerts", "gauge", "Alerts in the spool.", spool.depth))
+        samples.append(("falco_relay_spool_bytes", "gauge", "Size of the spool.", spool.size))
+        lines = []
+        for metric, kind, description, value in samples:
+            lines.extend(
+                [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}", f"{metric} {value}"]
+            )
+        return "\n".join(lines) + "\n"
+
+
+class Spool:
+    """A size-capped on-disk queue of alerts, one file per alert.
+
+    Alerts are written atomically and synced to disk, so that the spool survives relay restarts
+    and host crashes. Once the spool exceeds its size, the oldest alerts are dropped.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, metrics: Metrics) -> None:
+        """Initialize the spool, loading the alerts left by a previous run.
+
+        Args:
+            directory: The spool directory.
+            max_bytes: The maximum size of the spool, in bytes.
+            metrics: The relay metrics.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._metrics = metrics
+        self._condition = threading.Condition()
+        self._sequence = 0
+        directory.mkdir(parents=True, exist_ok=True)
+        for leftover in directory.glob("*.tmp"):
+            leftover.unlink(missing_ok=True)
+        self._alerts = collections.deque(
+            (path, path.stat().st_size) for path in sorted(directory.glob("*.json"))
+        )
+        self._bytes = sum(size for _, size in self._alerts)
+
+    @property
+    def depth(self) -> int:
+        """The number of alerts in the spool."""
+        with self._condition:
+            return len(self._alerts)
+
+    @property
+    def size(self) -> int:
+        """The size of the spool, in bytes."""
+        with self._condition:
+            return self._bytes
+
+    def put(self, payload: bytes) -> None:
+        """Append an alert to the spool, dropping the oldest alerts if the spool is full.
+
+        Args:
+            payload: The alert.
+
+        Raises:
+            OSError: If the alert cannot be written.
+        """
+        with self._condition:
+            self._sequence += 1
+            path = self.directory / f"{time.time_ns():020d}-{self._sequence:09d}.json"
+            staging = path.with_suffix(".tmp")
+            with staging.open("wb") as staging_file:
+                staging_file.write(payload)
+                staging_file.flush()
+                os.fsync(staging_file.fileno())
+            staging.replace(path)
+            _fsync_dir(self.directory)
+            self._alerts.append((path, len(payload)))
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes and len(self._alerts) > 1:
+                oldest, size = self._alerts.popleft()
+                oldest.unlink(missing_ok=True)
+                self._bytes -= size
+                self._metrics.inc("dropped")
+            self._condition.notify()
+
+    def peek(self, count: int, timeout: float) -> list[Path]:
+        """Get the oldest alerts of the spool, waiting for one if the spool is empty.
+
+        Args:
+            count: The maximum number of alerts.
+            timeout: The maximum time to wait for an alert, in seconds.
+
+        Returns:
+            The paths of the oldest alerts, oldest first.
+        """
+        with self._condition:
+            if not self._alerts:
+                self._condition.wait(timeout)
+            return [path for path, _ in itertools.islice(self._alerts, count)]
+
+    def remove(self, path: Path) -> None:
+        """Remove a forwarded alert from the spool.
+
+        Args:
+            path: The path of the alert, unless the spool already dropped it.
+        """
+        with self._condition:
+            if not self._alerts or self._alerts[0][0] != path:
+                return
+            _, size = self._alerts.popleft()
+            path.unlink(missing_ok=True)
+            self._bytes -= size
+
+
+class Forwarder:
+    """Forward the spooled alerts to the upstream endpoint."""
+
+    def __init__(
+        self,
+        spool: Spool,
+        metrics: Metrics,
+        upstream: str,
+        ca_cert: Optional[Path] = None,
+        compress: bool = False,
+    ) -> None:
+        """Initialize the forwarder.
+
+        Args:
+            spool: The spool of the relay.
+            metrics: The relay metrics.
+            upstream: The URL of the upstream endpoint.
+            ca_cert: The CA certificate of the upstream endpoint, if not publicly trusted.
+            compress: Whether to gzip the alerts sent upstream.
+        """
+        self.spool = spool
+        self.metrics = metrics
+        self.upstream = urllib.parse.urlsplit(upstream)
+        self.ca_cert = ca_cert
+        self.compress = compress
+        self._connection: Optional[http.client.HTTPConnection] = None
+
+    def run(self, stop: threading.Event) -> None:
+        """Forward the alerts until stopped, backing off while the upstream endpoint fails.
+
+        Args:
+            stop: The event stopping the forwarder.
+        """
+        failures = 0
+        while not stop.is_set():
+            try:
+                self.forward_spooled()
+                failures = 0
+            except (OSError, http.client.HTTPException, UpstreamError) as e:
+                self._close()
+                failures += 1
+                self.metrics.inc("retries")
+                delay = min(BACKOFF_MAX, BACKOFF_MIN * 2 ** (failures - 1))
+                logger.warning("Failed to forward alerts, retrying in %.0fs: %s", delay, e)
+                stop.wait(delay)
+
+    def forward_spooled(self) -> None:
+        """Forward the oldest alerts of the spool, one request each, over a keep-alive connection.
+
+        Raises:
+            UpstreamError: If the upstream endpoint fails to accept an alert.
+        """
+        for path in self.spool.peek(FORWARD_CHUNK, timeout=1.0):
+            try:
+                payload = path.read_bytes()
+            except FileNotFoundError:
+                # Dropped by the spool meanwhile
+                continue
+            status = self._send(payload)
+            if status in RETRY_STATUSES or status >= 500:
+                raise UpstreamError(f"Upstream endpoint answered {status}")
+            if status >= 300:
+                logger.error("Upstream endpoint rejected alert %s: %s", path.name, status)
+                self.metrics.inc("rejected")
+            else:
+                self.metrics.inc("forwarded")
+            self.spool.remove(path)
+
+    def _send(self, payload: bytes) -> int:
+        """Send an alert to the upstream endpoint.
+
+        Args:
+            payload: The alert.
+
+        Returns:
+            The HTTP status of the upstream answer.
+        """
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            payload = gzip.compress(payload)
+            headers["Content-Encoding"] = "gzip"
+        path = self.upstream.path or "/"
+        if self.upstream.query:
+            path = f"{path}?{self.upstream.query}"
+
+        connection = self._connect()
+        connection.request("POST", path, body=payload, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.will_close:
+            self._close()
+        return response.status
+
+    def _connect(self) -> http.client.HTTPConnection:
+        """Open the connection to the upstream endpoint, unless it is already open.
+
+        The CA certificate is read on each new connection, so that rotations are picked up.
+
+        Returns:
+            The connection to the upstream endpoint.
+        """
+        if self._connection is not None:
+            return self._connection
+        host = self.upstream.hostname or "localhost"
+        if self.upstream.scheme == "https":
+            cafile = str(self.ca_cert) if self.ca_cert and self.ca_cert.exists() else None
+            context = ssl.create_default_context(cafile=cafile)
+            self._connection = http.client.HTTPSConnection(
+                host, self.upstream.port, timeout=UPSTREAM_TIMEOUT, context=context
+            )
+        else:
+            self._connection = http.client.HTTPConnection(
+                host, self.upstream.port, timeout=UPSTREAM_TIMEOUT
+            )
+        return self._connection
+
+    def _close(self) -> None:
+        """Close the connection to the upstream endpoint."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class RelayServer(http.server.ThreadingHTTPServer):
+    """The HTTP server receiving the alerts from Falco."""
+
+    daemon_threads = True
+
+    def __init__(
+        self, address: tuple[str, int], spool: Spool, metrics: Metrics, token: str
+    ) -> None:
+        """Initialize the relay server.
+
+        Args:
+            address: The listen address and port.
+            spool: The spool of the relay.
+            metrics: The relay metrics.
+            token: The secret URL path Falco posts the alerts to, without the leading slash.
+        """
+        super().__init__(address, RelayRequestHandler)
+        self.spool = spool
+        self.metrics = metrics
+        self.token = token
+
+
+class RelayRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Spool the alerts posted by Falco and serve the relay metrics."""
+
+    # Let Falco keep its connection open across alerts
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        """Spool an alert."""
+        server = typing.cast(RelayServer, self.server)
+        if not hmac.compare_digest(self.path.encode(), f"/{server.token}".encode()):
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self._reply(403)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if not 0 < length <= MAX_PAYLOAD_BYTES:
+            self._reply(413 if length else 411)
+            return
+        payload = self.rfile.read(length)
+        try:
+            server.spool.put(payload)
+        except OSError:
+            logger.exception("Failed to spool alert")
+            self._reply(503)
+            return
+        server.metrics.inc("received")
+        self._reply(200)
+
+    def do_GET(self) -> None:
+        """Serve the relay metrics."""
+        server = typing.cast(RelayServer, self.server)
+        if self.path != "/metrics":
+            self._reply(404)
+            return
+        self._reply(200, server.metrics.render(server.spool).encode(), "text/plain; version=0.0.4")
+
+    def log_message(self, format: str, *args: typing.Any) -> None:  # noqa: A002
+        """Log the requests at debug level, Falco posts every alert."""
+        logger.debug(format, *args)
+
+    def _reply(self, status: int, body: bytes = b"", content_type: str = "text/plain") -> None:
+        """Send an answer.
+
+        Args:
+            status: The HTTP status.
+            body: The answer body.
+            content_type: The content type of the body.
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _fsync_dir(directory: Path) -> None:
+    """Sync a directory to disk, so that the files renamed into it persist.
+
+    Args:
+        directory: The directory.
+    """
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run the relay until terminated.
+
+    Args:
+        argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listen-port", type=int, required=True)
+    parser.add_argument("--upstream", required=True)
+    parser.add_argument("--spool-dir", type=Path, required=True)
+    parser.add_argument("--spool-max-bytes", type=int, required=True)
+    parser.add_argument("--token-file", type=Path, required=True)
+    parser.add_argument("--ca-cert", type=Path)
+    parser.add_argument("--compress", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    metrics = Metrics()
+    spool = Spool(args.spool_dir, args.spool_max_bytes, metrics)
+    forwarder = Forwarder(spool, metrics, args.upstream, args.ca_cert, args.compress)
+    stop = threading.Event()
+    forwarder_thread = threading.Thread(target=forwarder.run, args=(stop,), daemon=True)
+    forwarder_thread.start()
+
+    token = args.token_file.read_text(encoding="utf-8").strip()
+    if not token:
+        parser.error(f"{args.token_file} is empty")
+    server = RelayServer(("127.0.0.1", args.listen_port), spool, metrics, token)
+    # shutdown blocks until serve_forever returns, so it cannot run in the main thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info("Relaying alerts from port %d to %s", args.listen_port, args.upstream)
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+        forwarder_thread.join(timeout=UPSTREAM_TIMEOUT)
+
+
+if __name__ == "__main__":  # pragma: nocover
+    main()
@@ -0,0 +1,128 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Falco service resource controls module."""
+
+import logging
+import subprocess
+from pathlib import Path
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+SYSTEMCTL = "/usr/bin/systemctl"
+SYSTEMCTL_TIMEOUT = 30
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+# The resource controls applied to the service, by action result key
+LIMIT_PROPERTIES = {
+    "CPUQuotaPerSecUSec": "cpu-quota-per-sec",
+    "MemoryMax": "memory-max",
+    "CPUAffinity": "cpu-affinity",
+    "Nice": "nice",
+    "CPUWeight": "cpu-weight",
+    "IOWeight": "io-weight",
+}
+# The resource accounting of the service cgroup, by action result key
+USAGE_PROPERTIES = {
+    "CPUUsageNSec": "cpu-usage-ns",
+    "MemoryCurrent": "memory-current-bytes",
+    "MemoryPeak": "memory-peak-bytes",
+    "TasksCurrent": "tasks",
+    "IOReadBytes": "io-read-bytes",
+    "IOWriteBytes": "io-write-bytes",
+}
+# The cgroup v2 counters revealing whether the service hits its limits, by action result key
+CGROUP_COUNTERS = {
+    "cpu.stat": {"nr_throttled": "cpu-throttled-periods", "throttled_usec": "cpu-throttled-us"},
+    "memory.events": {
+        "high": "memory-high-events",
+        "max": "memory-max-events",
+        "oom_kill": "memory-oom-kills",
+    },
+}
+# systemd reports the unset controls and the missing accounting with these values
+UNSET_VALUES = ("", "[not set]", "[no data]", str(2**64 - 1))
+
+
+class ResourcesError(Exception):
+    """Exception raised when the service resource controls cannot be read."""
+
+
+class ServiceResources(BaseModel):
+    """The resource controls and usage of a systemd service.
+
+    Attributes:
+        limits: The applied resource controls, "default" when unset.
+        usage: The resource usage and limit counters of the service cgroup.
+    """
+
+    limits: dict[str, str]
+    usage: dict[str, int]
+
+
+def service_resources(service_name: str) -> ServiceResources:
+    """Get the resource controls applied to a systemd service and its cgroup usage.
+
+    Args:
+        service_name: The systemd service name.
+
+    Returns:
+        The applied resource controls and the usage of the service.
+
+    Raises:
+        ResourcesError: If systemd fails to report the service properties.
+    """
+    properties = [*LIMIT_PROPERTIES, *USAGE_PROPERTIES, "ControlGroup"]
+    show_cmd = [
+        SYSTEMCTL,
+        "show",
+        f"{service_name}.service",
+        f"--property={','.join(properties)}",
+    ]
+    try:
+        logger.debug("Systemd show command: %s", show_cmd)
+        process = subprocess.run(
+            show_cmd, check=True, capture_output=True, text=True, timeout=SYSTEMCTL_TIMEOUT
+        )
+    except subprocess.CalledProcessError as e:
+        raise ResourcesError(f"Failed to show {service_name}: {e.stderr or e.stdout}") from e
+    except subprocess.TimeoutExpired as e:
+        raise ResourcesError(f"Showing {service_name} timed out") from e
+
+    values = dict(line.split("=", 1) for line in process.stdout.splitlines() if "=" in line)
+    limits = {
+        key: "default" if values.get(name, "") in UNSET_VALUES else values[name]
+        for name, key in LIMIT_PROPERTIES.items()
+    }
+    usage = {
+        key: int(values[name])
+        for name, key in USAGE_PROPERTIES.items()
+        if values.get(name, "") not in UNSET_VALUES and values[name].isdigit()
+    }
+    if values.get("ControlGroup"):
+        usage.update(_cgroup_counters(CGROUP_ROOT / values["ControlGroup"].lstrip("/")))
+    return ServiceResources(limits=limits, usage=usage)
+
+
+def _cgroup_counters(cgroup_dir: Path) -> dict[str, int]:
+    """Read the throttling and memory pressure counters of a cgroup v2 directory.
+
+    Args:
+        cgroup_dir: The cgroup directory.
+
+    Returns:
+        The counters by action result key, empty on cgroup v1 hosts.
+    """
+    counters: dict[str, int] = {}
+    for file_name, keys in CGROUP_COUNTERS.items():
+        try:
+            lines = (cgroup_dir / file_name).read_text(encoding="utf-8").splitlines()
+        except OSError as e:
+            logger.debug("Failed to read the cgroup counters %s: %s", file_name, e)
+            continue
+        for line in lines:
+            name, _, value = line.partition(" ")
+            if name in keys and value.isdigit():
+                counters[keys[name]] = int(value)
+    return counters
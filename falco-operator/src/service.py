@@ -3,25 +3,36 @@
 
 """Falco workload management module."""
 
+import enum
+import functools
+import hashlib
+import json
 import logging
 import os
+import re
 import shutil
+import stat
 import subprocess
+import tempfile
+import time
 from pathlib import Path
 from typing import Optional
 
+import yaml
 from charmlibs import systemd
 from cosl import JujuTopology
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import Markup
 from ops.charm import CharmBase
+from pydantic import BaseModel, ValidationError
 
+import config
 import state
 
 logger = logging.getLogger(__name__)
 
 # Executable paths
 GIT = "/usr/bin/git"
-RSYNC = "/usr/bin/rsync"
 SSH_KEYSCAN = "/usr/bin/ssh-keyscan"
 
 # Ssh related paths
@@ -34,22 +45,53 @@ KNOWN_HOSTS_FILE = SSH_DIR / "known_hosts"
 FALCO_CUSTOM_RULES_KEY = "rules.d"
 FALCO_CUSTOM_CONFIGS_KEY = "config.override.d"
 
-# Clone output directory
+# Top-level keys in the falco config overrides that cannot be applied with a hot reload.
+FALCO_RESTART_CONFIG_KEYS = frozenset({"engine", "base_syscalls", "plugins", "load_plugins"})
+
+# Clone output directory, kept across hooks as a persistent local object store
 CLONE_OUTPUT_DIR = Path.home() / "custom-falco-config-repository"
 
+# State of the last successful sync of the custom config repository
+SYNC_MANIFEST_FILE = Path.home() / "custom-falco-config-sync.json"
+
+# Results of the validation of the custom rules and config files, keyed by their content hash
+VALIDATION_CACHE_FILE = Path.home() / "custom-falco-config-validation.json"
+VALIDATION_CACHE_SIZE = 32
+VALIDATION_TIMEOUT = 300
+
+# A full commit SHA, which cannot move unlike branches
+COMMIT_SHA_PATTERN = re.compile(r"[0-9a-f]{40}")
+
 
 FALCO_SERVICE_NAME = "falco"
+# The loopback port of the alert relay, see relay.py
+RELAY_PORT = 8766
 
 TEMPLATE_DIR = "src/templates"
 SYSTEMD_SERVICE_DIR = Path("/etc/systemd/system")
-
-
-class RsyncError(Exception):
-    """Exception raised when rsync fails."""
+LOGROTATE_DIR = Path("/etc/logrotate.d")
+# The alerts file of the file output channel, outside of the charm directory so that it is
+# rotated and kept like the other system logs
+FALCO_EVENTS_FILE = Path("/var/log/falco/events.log")
+# The paths revealing the container engines that have no socket
+CONTAINER_ENGINE_PATHS = {
+    "lxc": (Path("/var/lib/lxc"),),
+    "libvirt_lxc": (Path("/run/libvirt/lxc"),),
+}
+K8S_APISERVER_PATHS = (
+    Path("/etc/kubernetes/manifests/kube-apiserver.yaml"),
+    Path("/var/snap/k8s/common/args/kube-apiserver"),
+    Path("/var/snap/microk8s/current/args/kube-apiserver"),
+)
+K8S_APISERVER_COMMAND = "kube-apiserver"
+
+
+class FileSyncError(Exception):
+    """Exception raised when syncing files from the custom config repository fails."""
 
 
 class GitCloneError(Exception):
-    """Exception raised when git clone fails."""
+    """Exception raised when git clone or fetch fails."""
 
 
 class SshKeyScanError(Exception):
@@ -60,6 +102,10 @@ class SshKeyWriteError(Exception):
     """Exception raised when writing Ssh key fails."""
 
 
+class FalcoValidationError(Exception):
+    """Exception raised when the custom rules or config files fail Falco validation."""
+
+
 class TemplateRenderError(Exception):
     """Exception raised when template rendering fails."""
 
@@ -68,6 +114,60 @@ class FalcoConfigurationError(Exception):
     """Exception raised when Falco configuration fails."""
 
 
+class FalcoChange(enum.IntEnum):
+    """Action required to apply a change to the Falco service, ordered by impact."""
+
+    NONE = 0
+    RELOAD = 1
+    RESTART = 2
+
+
+class SyncManifest(BaseModel):
+    """The state of the last successful sync of the custom config repository.
+
+    Attributes:
+        url: The repository URL.
+        ref: The requested branch or tag, empty for the remote HEAD.
+        commit: The commit SHA the ref resolved to.
+        immutable: Whether the ref is a tag or a commit SHA, which are not expected to move.
+        files: The manifest of the custom rules and config files deployed from the commit.
+        synced_at: The UNIX timestamp of the sync.
+        config: The hash of the managed config file the deployed files were validated against.
+    """
+
+    url: str
+    ref: str
+    commit: str
+    immutable: bool
+    files: dict[str, str]
+    synced_at: float
+    config: str = ""
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["SyncManifest"]:
+        """Load the sync manifest from a file.
+
+        Args:
+            path: The sync manifest file.
+
+        Returns:
+            The sync manifest, or None if it does not exist or cannot be read.
+        """
+        try:
+            return cls.model_validate_json(path.read_bytes())
+        except (OSError, ValidationError) as e:
+            logger.debug("No valid sync manifest at %s: %s", path, e)
+            return None
+
+    def save(self, path: Path) -> None:
+        """Save the sync manifest to a file.
+
+        Args:
+            path: The sync manifest file.
+        """
+        path.write_text(self.model_dump_json(), encoding="utf-8")
+
+
 class FalcoLayout:
     """Falco file layout.
 
@@ -114,17 +214,88 @@ class FalcoLayout:
     @property
     def configs_dir(self) -> Path:
         """Get the full path to the Falco configuration directory."""
-        return self.home / "etc/falco/config.overrides.d"
+        return self.home / "etc/falco/config.override.d"
 
     @property
     def config_file(self) -> Path:
         """Get the full path to the Falco configuration file."""
         return self.home / "etc/falco/falco.yaml"
 
+    @property
+    def http_output_ca_cert(self) -> Path:
+        """Get the full path to the CA certificate of the HTTP output endpoint."""
+        return self.home / "etc/falco/certs/http_output_ca.crt"
+
+    @property
+    def relay_token_file(self) -> Path:
+        """Get the full path to the secret URL path of the alert relay."""
+        return self.home / "etc/falco/certs/relay.token"
+
+    @property
+    def relay_spool_dir(self) -> Path:
+        """Get the full path to the alert relay spool directory."""
+        return self.home / "var/lib/falco/relay-spool"
+
+    @property
+    def captures_dir(self) -> Path:
+        """Get the full path to the Falco captures directory."""
+        return self.home / "var/lib/falco/captures"
+
+    @property
+    def tmp_dir(self) -> Path:
+        """Get the full path to the directory of the files being written, unwatched by Falco."""
+        return self.home / "var/lib/falco/tmp"
+
+
+def _systemd_quote(value: object) -> Markup:
+    """Quote a value as a single argument of a systemd command line.
+
+    Args:
+        value: The value to quote.
+
+    Returns:
+        The quoted argument, not to be HTML escaped.
+    """
+    escaped = (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("%", "%%")
+        .replace("$", "$$")
+    )
+    # The value is quoted for systemd, HTML escaping would corrupt it
+    return Markup(f'"{escaped}"')  # noqa: S704
+
+
+@functools.cache
+def _get_template_environment() -> Environment:
+    """Get the Jinja environment shared by all templates.
+
+    Compiled templates are cached on disk, so that templates are not parsed and compiled again
+    on every hook.
+
+    Returns:
+        The Jinja environment.
+    """
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=True,
+        auto_reload=False,
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+    environment.filters["systemd_quote"] = _systemd_quote
+    return environment
+
 
 class Template:
     """Template file manager."""
 
+    # The directory of the files being written, next to the destination if unset
+    tmp_dir: Optional[Path] = None
+    # The mode of the rendered file, the mode of the replaced file or 0644 if unset
+    mode: Optional[int] = None
+
     def __init__(self, name: str, destination: Path, context: Optional[dict]) -> None:
         """Initialize the template file manager.
 
@@ -137,37 +308,50 @@ class Template:
         self.destination = destination
         self.context = context or {}
 
-        self._env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True)
-        self._template = self._env.get_template(self.name)
+        self._template = _get_template_environment().get_template(self.name)
 
-    def install(self) -> None:
-        """Install template file."""
-        self._render(self.context)
+    def install(self) -> bool:
+        """Install template file.
+
+        Returns:
+            True if the file on disk changed, False otherwise.
+        """
+        return self._render(self.context)
 
     def remove(self) -> None:
         """Remove template file."""
         if self.destination.exists():
             self.destination.unlink()
 
-    def _render(self, context: dict) -> None:
+    def _render(self, context: dict) -> bool:
         """Render template file from a template.
 
+        The file is only written when the hash of the rendered content differs from the hash of
+        the file on disk.
+
         Args:
             context (dict): Context for rendering the template
 
+        Returns:
+            True if the file on disk changed, False otherwise.
+
         Raises:
             TemplateRenderError: If rendering or writing the template fails
         """
         try:
             logger.debug("Generating template file at %s", self.destination)
             content = self._template.render(context)
+            if _hash_file(self.destination) == _hash_content(content.encode("utf-8")):
+                logger.debug("No changes detected in template file at %s", self.destination)
+                return False
             if not self.destination.parent.exists():
                 self.destination.parent.mkdir(parents=True, exist_ok=True)
-            self.destination.write_text(content, encoding="utf-8")
+            _write_file_atomic(self.destination, content.encode("utf-8"), self.tmp_dir, self.mode)
             logger.debug("Template file generated at %s", self.destination)
         except OSError as e:
             logger.exception("Failed to write template to %s", self.destination)
             raise TemplateRenderError(f"Failed to write template to {self.destination}") from e
+        return True
 
 
 class FalcoServiceFile(Template):
@@ -186,37 +370,150 @@ class FalcoServiceFile(Template):
         """
         context = {
             "command": str(falco_layout.cmd),
-            "rules_dir": str(falco_layout.rules_dir),
             "config_file": str(falco_layout.config_file),
-            "falco_home": str(falco_layout.home),
-            "juju_topology": JujuTopology.from_charm(charm).as_dict(),
+            **_service_file_context(state.CharmState()),
         }
         super().__init__(self.template, self.service_file, context=context)
 
-    def update(self, context: dict) -> None:
-        """Update the Falco service file with new context.
+
+class FalcoConfigFile(Template):
+    """Falco config file manager."""
+
+    template: str = "falco.yaml.j2"
+    # The config file holds the secret URL path of the alert relay
+    mode = 0o600
+
+    def __init__(self, falco_layout: FalcoLayout, charm: CharmBase) -> None:
+        """Initialize the Falco config file manager.
+
+        Args:
+            falco_layout: The Falco file layout.
+            charm: The charm instance.
+        """
+        context = {
+            "rules_dir": str(falco_layout.rules_dir),
+            "default_rules_dir": str(falco_layout.default_rules_dir),
+            "configs_dir": str(falco_layout.configs_dir),
+            "plugins_dir": str(falco_layout.plugins_dir),
+            "http_output_ca_cert": str(falco_layout.http_output_ca_cert),
+            "events_file": str(FALCO_EVENTS_FILE),
+            "juju_topology": JujuTopology.from_charm(charm).as_dict(),
+            **_config_file_context(state.CharmState()),
+        }
+        super().__init__(self.template, falco_layout.config_file, context=context)
+        self.ca_cert_file = falco_layout.http_output_ca_cert
+        self.tmp_dir = falco_layout.tmp_dir
+
+    def render(self, context: dict) -> bytes:
+        """Render the Falco config file with new context, without installing it.
+
+        Args:
+            context: A dictionary containing new context values.
+
+        Returns:
+            The rendered config file.
+        """
+        return self._template.render({**self.context, **context}).encode("utf-8")
+
+    def update(self, context: dict) -> FalcoChange:
+        """Update the Falco config file with new context.
 
         Args:
             context: A dictionary containing new context values.
+
+        Returns:
+            The action required to apply the changes to the config file.
         """
+        old_manifest = self.manifest()
         self.context.update(context)
-        self.install()
+        if not self.install():
+            return FalcoChange.NONE
+        return _classify_changes(old_manifest, self.manifest())
 
+    def remove(self) -> None:
+        """Remove the config file and the CA certificate of the HTTP output endpoint."""
+        super().remove()
+        self.ca_cert_file.unlink(missing_ok=True)
 
-class FalcoConfigFile(Template):
-    """Falco config file manager."""
+    def update_ca_cert(self, ca_cert: Optional[str]) -> FalcoChange:
+        """Install or remove the CA certificate of the HTTP output endpoint.
 
-    template: str = "falco.yaml.j2"
+        Args:
+            ca_cert: The PEM encoded CA certificate, or None to remove it.
 
-    def __init__(self, falco_layout: FalcoLayout) -> None:
-        """Initialize the Falco config file manager."""
-        super().__init__(
-            self.template,
-            falco_layout.config_file,
-            context={
-                "falco_home": str(falco_layout.home),
-            },
+        Returns:
+            The action required to apply the changes to the CA certificate.
+
+        Raises:
+            TemplateRenderError: If writing the CA certificate fails.
+        """
+        if not ca_cert:
+            if not self.ca_cert_file.exists():
+                return FalcoChange.NONE
+            self.ca_cert_file.unlink()
+            return FalcoChange.RELOAD
+
+        content = ca_cert.encode("utf-8")
+        if _hash_file(self.ca_cert_file) == _hash_content(content):
+            return FalcoChange.NONE
+        try:
+            self.ca_cert_file.parent.mkdir(parents=True, exist_ok=True)
+            _write_file_atomic(self.ca_cert_file, content, self.tmp_dir)
+        except OSError as e:
+            raise TemplateRenderError(f"Failed to write {self.ca_cert_file}") from e
+        logger.info("HTTP output CA certificate written to %s", self.ca_cert_file)
+        return FalcoChange.RELOAD
+
+    def manifest(self) -> dict[str, str]:
+        """Build a manifest of the installed config file, one entry per top-level key.
+
+        Returns:
+            A mapping of manifest entries to the sha256 hex digest of their content.
+        """
+        if not self.destination.is_file():
+            return {}
+        return _config_file_manifest(self.destination.name, self.destination)
+
+
+class FalcoLogrotateFile(Template):
+    """Falco alerts file rotation manager."""
+
+    template: str = "falco.logrotate.j2"
+    logrotate_file: Path = LOGROTATE_DIR / FALCO_SERVICE_NAME
+    events_file: Path = FALCO_EVENTS_FILE
+
+    def __init__(self) -> None:
+        """Initialize the Falco alerts file rotation manager."""
+        context = {"events_file": str(self.events_file), "service_name": FALCO_SERVICE_NAME}
+        super().__init__(self.template, self.logrotate_file, context=context)
+        self.events_dir = self.events_file.parent
+
+    def configure(self, charm_state: state.CharmState) -> None:
+        """Rotate the alerts file when the file output channel is selected.
+
+        Args:
+            charm_state: The charm state.
+
+        Raises:
+            TemplateRenderError: If the alerts directory or the rotation config cannot be written.
+        """
+        if "file" not in charm_state.outputs:
+            self.remove()
+            return
+
+        try:
+            # Falco does not create the directory of the alerts file
+            self.events_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        except OSError as e:
+            raise TemplateRenderError(f"Failed to create {self.events_dir}") from e
+        self.context.update(
+            {
+                "max_size": charm_state.file_output_max_size,
+                "rotate": charm_state.file_output_rotate,
+            }
         )
+        if self.install():
+            logger.info("Falco alerts file rotation configured")
 
 
 class FalcoCustomSetting:
@@ -260,33 +557,137 @@ class FalcoCustomSetting:
 
         logger.info("Falco custom settings removed")
 
-    def configure(self, charm_state: state.CharmState) -> None:
+    def configure(
+        self, charm_state: state.CharmState, managed_config: Optional[bytes] = None
+    ) -> FalcoChange:
         """Configure the Falco custom settings.
 
+        The custom rules and config files are validated against the managed config file Falco
+        is about to load, so that changes on either side are checked before reaching Falco.
+
         Args:
             charm_state (CharmState): The charm state
+            managed_config (Optional[bytes]): The managed config file about to be installed,
+                the installed one if not set
+
+        Returns:
+            The action required to apply the changes to the custom rules and config files.
         """
+        old_manifest = self.manifest()
+
         if not charm_state.custom_config_repo:
             logger.info("No custom config repository set")
             logger.debug("Removing Falco custom settings")
             self.remove()
-            return
+            SYNC_MANIFEST_FILE.unlink(missing_ok=True)
+            return _classify_changes(old_manifest, self.manifest())
 
         logger.info("Configuring Falco custom settings")
 
+        if managed_config is None:
+            config_file = self.falco_layout.config_file
+            managed_config = config_file.read_bytes() if config_file.is_file() else b""
+
+        repo = str(charm_state.custom_config_repo)
+        hostname = str(charm_state.custom_config_repo.host)
+        ref = charm_state.custom_config_repo_ref or ""
+        ssh_private_key = charm_state.custom_config_repo_ssh_key or ""
+
+        sync_manifest = SyncManifest.load(SYNC_MANIFEST_FILE)
+        if (
+            sync_manifest is not None
+            and (sync_manifest.url, sync_manifest.ref, sync_manifest.files)
+            == (repo, ref, old_manifest)
+            and _git_is_synced(sync_manifest, hostname, ssh_private_key)
+        ):
+            logger.info("Custom config repository already synced at %s", sync_manifest.commit)
+            config_hash = _hash_content(managed_config)
+            if sync_manifest.config != config_hash:
+                logger.info("Managed config changed, validating the custom settings again")
+                self._validate_installed(managed_config)
+                sync_manifest.config = config_hash
+                sync_manifest.save(SYNC_MANIFEST_FILE)
+            return FalcoChange.NONE
+
         # Sync custom configuration repository
-        _git_sync(
-            str(charm_state.custom_config_repo),
-            str(charm_state.custom_config_repo.host),
-            ref=charm_state.custom_config_repo_ref,
-            ssh_private_key=charm_state.custom_config_repo_ssh_key,
-        )
+        commit = _git_sync(repo, hostname, ref=ref, ssh_private_key=ssh_private_key)
+
+        # Stage and validate the configuration files before swapping them in, so that invalid
+        # files never reach the running Falco service
+        changeset: set[str] = set()
+        with tempfile.TemporaryDirectory(prefix="falco-staging-") as staging:
+            staging_dir = Path(staging)
+            _stage_custom_setting(
+                {
+                    key: CLONE_OUTPUT_DIR / key
+                    for key in (FALCO_CUSTOM_RULES_KEY, FALCO_CUSTOM_CONFIGS_KEY)
+                },
+                staging_dir,
+            )
+            _validate_custom_setting(self.falco_layout, staging_dir, managed_config)
+
+            # Pull configuration files from the staging directory to falco config directories
+            for key, directory in (
+                (FALCO_CUSTOM_RULES_KEY, self.falco_layout.rules_dir),
+                (FALCO_CUSTOM_CONFIGS_KEY, self.falco_layout.configs_dir),
+            ):
+                changed = _sync_files(staging_dir / key, directory, self.falco_layout.tmp_dir)
+                changeset.update(f"{key}/{name}" for name in changed)
+        logger.debug("Changed custom setting files: %s", sorted(changeset))
+
+        new_manifest = self.manifest() if changeset else old_manifest
+        SyncManifest(
+            url=repo,
+            ref=ref,
+            commit=commit,
+            immutable=_git_fetched_tag() or bool(COMMIT_SHA_PATTERN.fullmatch(ref)),
+            files=new_manifest,
+            synced_at=time.time(),
+            config=_hash_content(managed_config),
+        ).save(SYNC_MANIFEST_FILE)
+
+        logger.info("Falco custom settings configured from commit %s", commit)
+        return _classify_changes(old_manifest, new_manifest)
+
+    def _validate_installed(self, managed_config: bytes) -> None:
+        """Validate the installed custom rules and config files against a managed config file.
 
-        # Pull configuration files from the custom repository to falco config directories
-        _pull_falco_rule_files(f"{self.falco_layout.rules_dir}/")
-        _pull_falco_config_files(f"{self.falco_layout.configs_dir}/")
+        Args:
+            managed_config (bytes): The managed config file about to be installed
 
-        logger.info("Falco custom settings configured")
+        Raises:
+            FalcoValidationError: If the installed files are invalid with the managed config
+        """
+        with tempfile.TemporaryDirectory(prefix="falco-staging-") as staging:
+            staging_dir = Path(staging)
+            _stage_custom_setting(
+                {
+                    FALCO_CUSTOM_RULES_KEY: self.falco_layout.rules_dir,
+                    FALCO_CUSTOM_CONFIGS_KEY: self.falco_layout.configs_dir,
+                },
+                staging_dir,
+            )
+            _validate_custom_setting(self.falco_layout, staging_dir, managed_config)
+
+    def manifest(self) -> dict[str, str]:
+        """Build a manifest of the installed custom rules and config files.
+
+        Rules files are tracked as a whole. Config files are tracked per top-level key so that
+        changes can be classified by the part of the configuration they touch.
+
+        Returns:
+            A mapping of manifest entries to the sha256 hex digest of their content.
+        """
+        manifest = {}
+        for rule_file in _list_files(self.falco_layout.rules_dir):
+            entry = (
+                f"{FALCO_CUSTOM_RULES_KEY}/{rule_file.relative_to(self.falco_layout.rules_dir)}"
+            )
+            manifest[entry] = _hash_file(rule_file)
+        for config_file in _list_files(self.falco_layout.configs_dir):
+            entry = f"{FALCO_CUSTOM_CONFIGS_KEY}/{config_file.relative_to(self.falco_layout.configs_dir)}"
+            manifest.update(_config_file_manifest(entry, config_file))
+        return manifest
 
 
 class FalcoService:
@@ -297,19 +698,27 @@ class FalcoService:
         config_file: FalcoConfigFile,
         service_file: FalcoServiceFile,
         custom_setting: FalcoCustomSetting,
+        logrotate_file: FalcoLogrotateFile,
     ) -> None:
         self.config_file = config_file
         self.service_file = service_file
         self.custom_setting = custom_setting
+        self.logrotate_file = logrotate_file
 
     def install(self) -> None:
-        """Install and configure the Falco service."""
+        """Install the Falco service.
+
+        The config and service files are rendered from the charm state by `configure`, which
+        also restarts a running service. Only the files missing on a fresh install are rendered
+        here, so that an upgrade never runs Falco with the default settings.
+        """
         logger.info("Installing Falco service")
 
-        self.config_file.install()
-        self.service_file.install()
+        if not self.config_file.destination.exists():
+            self.config_file.install()
+        if not self.service_file.destination.exists() and self.service_file.install():
+            systemd.daemon_reload()
         self.custom_setting.install()
-
         systemd.service_enable(self.service_file.service_name)
 
         logger.info("Falco service installed")
@@ -325,87 +734,551 @@ class FalcoService:
         self.config_file.remove()
         self.service_file.remove()
         self.custom_setting.remove()
+        self.logrotate_file.remove()
 
         logger.info("Falco service removed")
 
-    def configure(self, charm_state: state.CharmState) -> None:
+    def configure(self, charm_state: state.CharmState, restart: bool = False) -> None:
         """Configure the Falco service.
 
         Args:
             charm_state (CharmState): The charm state
+            restart (bool): Whether to restart the service even without changes, to pick up a
+                new Falco bundle
         Raises:
             FalcoConfigurationError: If configuration validation fails
         """
         logger.info("Configuring Falco service")
 
+        config_context = _config_file_context(charm_state)
         try:
-            self.custom_setting.configure(charm_state)
-            self.service_file.update(context={"http_output": charm_state.http_output})
-        except (GitCloneError, SshKeyScanError, RsyncError) as e:
+            # Validate the custom settings against the new managed config before installing it
+            change = max(
+                self.custom_setting.configure(
+                    charm_state, self.config_file.render(config_context)
+                ),
+                self.config_file.update_ca_cert(charm_state.http_output_ca_cert),
+                self.config_file.update(context=config_context),
+            )
+            self.service_file.context.update(_service_file_context(charm_state))
+            service_file_changed = self.service_file.install()
+            self.logrotate_file.configure(charm_state)
+        except (GitCloneError, SshKeyScanError, FileSyncError, FalcoValidationError) as e:
             logger.error("Failed to configure Falco custom settings: %s", e)
             raise FalcoConfigurationError("Failed to configure Falco service") from e
 
-        systemd.daemon_reload()
-        systemd.service_restart(self.service_file.service_name)
+        if service_file_changed:
+            systemd.daemon_reload()
+            change = FalcoChange.RESTART
+
+        if restart or not self.check_active():
+            change = FalcoChange.RESTART
 
-        logger.info("Falco service configured and started")
+        if change == FalcoChange.RESTART:
+            systemd.service_restart(self.service_file.service_name)
+            logger.info("Falco service configured and restarted")
+        elif change == FalcoChange.RELOAD:
+            systemd.service_reload(self.service_file.service_name)
+            logger.info("Falco service configured and reloaded")
+        else:
+            logger.info("No changes detected, Falco service left running")
+
+    def fingerprint(self, charm_state: state.CharmState) -> Optional[str]:
+        """Compute a fingerprint of the inputs and installed files of the Falco service.
+
+        Args:
+            charm_state (CharmState): The charm state
+
+        Returns:
+            The hex digest covering the charm state, the synced commit of the custom config
+            repository and the installed files, or None if the custom config repository tracks
+            a branch, whose commit can only be resolved by checking the remote.
+        """
+        digest = hashlib.sha256(charm_state.model_dump_json().encode())
+        if charm_state.custom_config_repo:
+            sync_manifest = SyncManifest.load(SYNC_MANIFEST_FILE)
+            if sync_manifest is None or not sync_manifest.immutable:
+                return None
+            digest.update(sync_manifest.commit.encode())
+        for file in (self.config_file.destination, self.service_file.destination):
+            digest.update(_hash_file(file).encode())
+        digest.update(json.dumps(self.custom_setting.manifest(), sort_keys=True).encode())
+        return digest.hexdigest()
 
     def check_active(self) -> bool:
         """Check if the Falco service is active."""
         return systemd.service_running(self.service_file.service_name)
 
 
-def _pull_falco_rule_files(destination: str) -> None:
-    """Pull falco config files from custom config repository.
+def detect_plugins() -> list[str]:
+    """Detect the Falco plugins the host needs.
+
+    The container plugin is needed when a container runtime socket exists, and the k8saudit
+    plugin, with the json plugin its rules rely on, when the host runs a Kubernetes API server.
+
+    Returns:
+        The Falco plugins to load.
+    """
+    plugins = []
+    if _is_k8s_apiserver():
+        plugins.extend(["json", "k8saudit"])
+    if detect_container_engines():
+        plugins.append("container")
+    logger.info("Detected Falco plugins: %s", plugins)
+    return plugins
+
+
+def detect_container_engines() -> dict[str, list[str]]:
+    """Detect the container engines running on the host.
+
+    Engines with sockets are detected from their sockets, so that the container plugin only
+    queries the sockets that exist, and lxc engines from their state directories.
+
+    Returns:
+        The detected container engines, with their existing sockets.
+    """
+    engines = {}
+    for engine, sockets in config.CONTAINER_ENGINES.items():
+        if sockets:
+            existing = [socket for socket in sockets if Path(socket).is_socket()]
+            if existing:
+                engines[engine] = existing
+        elif any(path.exists() for path in CONTAINER_ENGINE_PATHS.get(engine, ())):
+            engines[engine] = []
+    logger.info("Detected container engines: %s", list(engines))
+    return engines
+
+
+def _is_k8s_apiserver() -> bool:
+    """Check whether the host runs a Kubernetes API server.
+
+    Returns:
+        True if a Kubernetes API server is configured or running on the host.
+    """
+    if any(path.exists() for path in K8S_APISERVER_PATHS):
+        return True
+    for comm in Path("/proc").glob("[0-9]*/comm"):
+        try:
+            if comm.read_text(encoding="utf-8").strip() == K8S_APISERVER_COMMAND:
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def _config_file_context(charm_state: state.CharmState) -> dict:
+    """Build the context of the Falco config file from the charm state.
 
     Args:
-        destination (str): The destination directory for the pulled files
+        charm_state (CharmState): The charm state
 
-    Raises:
-        RsyncError: If rsync fails
+    Returns:
+        The context for rendering the Falco config file.
     """
-    source = f"{CLONE_OUTPUT_DIR}/{FALCO_CUSTOM_RULES_KEY}/"
-    rsync_cmd = [
-        RSYNC,
-        "-av",
-        "--delete",
-        "--include=*.yaml",
-        "--",
-        source,
-        destination,
+    container_engines: dict[str, dict] = {}
+    for engine, sockets in config.CONTAINER_ENGINES.items():
+        # Disabled engines are listed too, the container plugin enables them by default
+        container_engines[engine] = {"enabled": engine in charm_state.container_engines}
+        if sockets:
+            container_engines[engine]["sockets"] = charm_state.container_engines.get(
+                engine
+            ) or list(sockets)
+
+    outputs = {output: output in charm_state.outputs for output in ("stdout", "syslog", "file")}
+    if not charm_state.http_output and not any(outputs.values()):
+        # Falco refuses to start without an output, keep the alerts in the journal until the
+        # http-endpoint relation is established
+        outputs["syslog"] = True
+
+    http_output = None
+    if charm_state.http_output and charm_state.relay:
+        # The relay reuses its connection, compresses and verifies the endpoint itself
+        http_output = {
+            "url": f"http://127.0.0.1:{RELAY_PORT}/{charm_state.relay_token}",
+            "keep_alive": True,
+            "compress_uploads": False,
+            "ca_cert": False,
+        }
+    elif charm_state.http_output:
+        http_output = {
+            **charm_state.http_output,
+            "keep_alive": charm_state.http_output_keep_alive,
+            "compress_uploads": charm_state.http_output_compress_uploads,
+            "ca_cert": bool(charm_state.http_output_ca_cert),
+        }
+
+    # Falco applies the selectors in order, so enabled rules win over disabled ones
+    rules = [
+        {action: _rule_selector(selector)}
+        for action, selectors in (
+            ("disable", charm_state.rules_disable),
+            ("enable", charm_state.rules_enable),
+        )
+        for selector in selectors
     ]
+
+    return {
+        "rulesets": [config.RULESETS[ruleset] for ruleset in charm_state.rulesets],
+        "rules": rules,
+        "priority": charm_state.priority,
+        "outputs": outputs,
+        "http_output": http_output,
+        "buffered_outputs": charm_state.buffered_outputs,
+        "output_timeout": charm_state.output_timeout,
+        "outputs_queue": {"capacity": charm_state.outputs_queue_capacity},
+        "plugins": charm_state.plugins,
+        "base_syscalls": {
+            "custom_set": charm_state.base_syscalls_custom_set,
+            "repair": charm_state.base_syscalls_repair,
+        },
+        "engine": {
+            "buf_size_preset": charm_state.engine_buf_size_preset,
+            "cpus_for_each_buffer": charm_state.engine_cpus_for_each_buffer,
+            "drop_failed_exit": charm_state.engine_drop_failed_exit,
+        },
+        "metrics": {
+            "interval": charm_state.metrics_interval,
+            "output_rule": charm_state.metrics_output_rule,
+            "counters": {
+                counter: counter in charm_state.metrics_counters
+                for counter in config.METRICS_COUNTERS
+            },
+        },
+        "container": {
+            "label_max_len": charm_state.container_label_max_len,
+            "with_size": charm_state.container_with_size,
+            "hooks": charm_state.container_hooks,
+            "engines": container_engines,
+        },
+    }
+
+
+def _rule_selector(selector: str) -> dict[str, str]:
+    """Build a Falco rule selector.
+
+    Args:
+        selector: A rule name, or a "tag:" prefixed rule tag.
+
+    Returns:
+        The Falco rule selector, matching rules by name or by tag.
+    """
+    if selector.startswith(config.RULE_TAG_PREFIX):
+        return {"tag": selector.removeprefix(config.RULE_TAG_PREFIX).strip()}
+    return {"rule": selector}
+
+
+def _service_file_context(charm_state: state.CharmState) -> dict:
+    """Build the context of the Falco service file from the charm state.
+
+    Args:
+        charm_state (CharmState): The charm state
+
+    Returns:
+        The context for rendering the Falco service file.
+    """
+    return {
+        "stdout_output": "stdout" in charm_state.outputs,
+        "cpu_quota": charm_state.cpu_quota,
+        "memory_max": charm_state.memory_max,
+        "cpu_affinity": " ".join(charm_state.cpu_affinity),
+        "nice": charm_state.nice,
+        "cpu_weight": charm_state.cpu_weight,
+        "io_weight": charm_state.io_weight,
+    }
+
+
+def _hash_content(content: bytes) -> str:
+    """Compute the sha256 hex digest of some content.
+
+    Args:
+        content (bytes): The content to hash
+
+    Returns:
+        The hex digest of the content.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def _hash_file(path: Path) -> str:
+    """Compute the sha256 hex digest of a file.
+
+    Args:
+        path (Path): The file to hash
+
+    Returns:
+        The hex digest of the file content or empty string if the file does not exist.
+    """
+    if not path.is_file():
+        return ""
+    return _hash_content(path.read_bytes())
+
+
+def _list_files(path: Path) -> list[Path]:
+    """List all files in a directory tree.
+
+    Args:
+        path (Path): The directory to list
+
+    Returns:
+        The sorted list of files in the directory, or an empty list if it does not exist.
+    """
+    if not path.is_dir():
+        return []
+    return sorted(p for p in path.rglob("*") if p.is_file())
+
+
+def _config_file_manifest(entry: str, path: Path) -> dict[str, str]:
+    """Build the manifest entries of a falco config file, one per top-level key.
+
+    Args:
+        entry (str): The manifest entry of the config file
+        path (Path): The config file
+
+    Returns:
+        A mapping of `<entry>:<key>` to the sha256 hex digest of the value of each top-level
+        key, or a single mapping of `<entry>` to the file digest if the file is not a YAML mapping.
+    """
     try:
-        logger.debug("Rsync command: %s", rsync_cmd)
-        subprocess.run(rsync_cmd, check=True)
-    except subprocess.CalledProcessError as e:
-        logging.error("Rsync failed from %s to %s", source, destination)
-        raise RsyncError(f"Rsync failed: {e.stderr}") from e
+        content = yaml.safe_load(path.read_bytes())
+    except yaml.YAMLError as e:
+        logger.debug("Failed to parse %s: %s", path, e)
+        content = None
+
+    if not isinstance(content, dict):
+        return {entry: _hash_file(path)}
+
+    return {
+        f"{entry}:{key}": _hash_content(yaml.safe_dump(value, sort_keys=True).encode())
+        for key, value in content.items()
+    }
+
+
+def _classify_changes(old: dict[str, str], new: dict[str, str]) -> FalcoChange:
+    """Classify the changes between two custom setting manifests.
+
+    Rules changes and config changes can be hot reloaded by Falco, except for config changes
+    touching the engine or the plugins, and config files that cannot be parsed. Entries other
+    than rules files are config file entries named `<file>:<key>`.
+
+    Args:
+        old (dict[str, str]): The manifest before the change
+        new (dict[str, str]): The manifest after the change
+
+    Returns:
+        The action required to apply the changes.
+    """
+    changed = {entry for entry in old.keys() | new.keys() if old.get(entry) != new.get(entry)}
+    if not changed:
+        return FalcoChange.NONE
+
+    for entry in changed:
+        if entry.startswith(f"{FALCO_CUSTOM_RULES_KEY}/"):
+            continue
+        _, _, key = entry.partition(":")
+        if not key or key in FALCO_RESTART_CONFIG_KEYS:
+            logger.debug("Change in %s requires a restart", entry)
+            return FalcoChange.RESTART
+
+    return FalcoChange.RELOAD
+
+
+def _write_file_atomic(
+    path: Path, content: bytes, tmp_dir: Optional[Path] = None, mode: Optional[int] = None
+) -> None:
+    """Write a file atomically, so that readers never see a partially written file.
+
+    Unless a mode is given, the file keeps its mode, 0644 for a new file. The content is written
+    to a temporary file in `tmp_dir`, so that Falco does not pick it up from the directories it
+    watches.
+
+    Args:
+        path (Path): The file to write
+        content (bytes): The content to write
+        tmp_dir (Optional[Path]): The directory of the temporary file, on the filesystem of the
+            file, next to the file if unset
+        mode (Optional[int]): The mode of the file
+
+    Raises:
+        OSError: If writing the file fails
+    """
+    if mode is None:
+        try:
+            mode = stat.S_IMODE(path.stat().st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+    if tmp_dir is not None:
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=tmp_dir or path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            os.fchmod(tmp_file.fileno(), mode)
+            tmp_file.write(content)
+        os.replace(tmp_path, path)
+    except OSError:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def _sync_files(source: Path, destination: Path, tmp_dir: Optional[Path] = None) -> set[str]:
+    """Sync the YAML files of a directory of the custom config repository.
+
+    Only the files whose content hash differs are written, atomically. YAML files in the
+    destination that are not in the source are deleted. A missing source directory is treated
+    as an empty one.
+
+    Args:
+        source (Path): The source directory in the custom config repository
+        destination (Path): The destination directory
+        tmp_dir (Optional[Path]): The directory of the files being written
+
+    Returns:
+        The names of the files written or deleted in the destination.
+
+    Raises:
+        FileSyncError: If reading or writing the files fails
+    """
+    changeset: set[str] = set()
+    try:
+        source_files = {f.name: f for f in source.glob("*.yaml") if f.is_file()}
+        for name, source_file in source_files.items():
+            content = source_file.read_bytes()
+            destination_file = destination / name
+            if _hash_file(destination_file) == _hash_content(content):
+                continue
+            logger.debug("Syncing %s to %s", source_file, destination_file)
+            _write_file_atomic(destination_file, content, tmp_dir)
+            changeset.add(name)
+
+        for stale_file in destination.glob("*.yaml"):
+            if stale_file.name not in source_files:
+                logger.debug("Removing stale file %s", stale_file)
+                stale_file.unlink()
+                changeset.add(stale_file.name)
+    except OSError as e:
+        logging.error("Failed to sync files from %s to %s", source, destination)
+        raise FileSyncError(f"Failed to sync files from {source} to {destination}") from e
+
+    return changeset
+
+
+def _stage_custom_setting(sources: dict[str, Path], staging_dir: Path) -> None:
+    """Stage custom rules and config files for validation.
+
+    Args:
+        sources (dict[str, Path]): The source directories, by custom setting key
+        staging_dir (Path): The staging directory
+
+    Raises:
+        FileSyncError: If reading or writing the files fails
+    """
+    for key, source in sources.items():
+        (staging_dir / key).mkdir()
+        _sync_files(source, staging_dir / key)
+
+
+def _validate_custom_setting(
+    falco_layout: FalcoLayout, staging_dir: Path, managed_config: bytes
+) -> None:
+    """Validate staged custom rules and config files with the bundled Falco binary.
+
+    Falco loads the managed config file with the staged config overrides and rules files in a
+    dry run, which checks them exactly as the service would load them without opening the
+    engine. The result is cached by the content hash of the bundle, which covers the staged
+    files, the managed config file and the Falco binary. Only the verdicts of Falco are cached,
+    a dry run that could not complete is tried again on the next hook.
+
+    Args:
+        falco_layout (FalcoLayout): The Falco file layout
+        staging_dir (Path): The directory containing the staged rules and config directories
+        managed_config (bytes): The managed config file the staged files are loaded with
+
+    Raises:
+        FalcoValidationError: If the staged files are invalid or could not be validated
+    """
+    digest = hashlib.sha256(_hash_file(falco_layout.cmd).encode())
+    digest.update(_hash_content(managed_config).encode())
+    for key in (FALCO_CUSTOM_RULES_KEY, FALCO_CUSTOM_CONFIGS_KEY):
+        for file in _list_files(staging_dir / key):
+            digest.update(str(file.relative_to(staging_dir)).encode())
+            digest.update(_hash_file(file).encode())
+    bundle_hash = digest.hexdigest()
+
+    try:
+        cache = json.loads(VALIDATION_CACHE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cache = {}
+
+    if bundle_hash in cache:
+        logger.info("Custom settings bundle %s already validated", bundle_hash)
+        valid = cache[bundle_hash]
+    else:
+        valid = _falco_dry_run(falco_layout, staging_dir, managed_config)
+        cache[bundle_hash] = valid
+        cache = dict(list(cache.items())[-VALIDATION_CACHE_SIZE:])
+        try:
+            VALIDATION_CACHE_FILE.write_text(json.dumps(cache), encoding="utf-8")
+        except OSError as e:
+            logger.warning("Failed to write validation cache %s: %s", VALIDATION_CACHE_FILE, e)
+
+    if not valid:
+        raise FalcoValidationError(f"Custom settings bundle {bundle_hash} failed validation")
 
 
-def _pull_falco_config_files(destination: str) -> None:
-    """Pull falco config files from custom config repository.
+def _falco_dry_run(falco_layout: FalcoLayout, staging_dir: Path, managed_config: bytes) -> bool:
+    """Run Falco in dry run mode against staged custom rules and config files.
 
     Args:
-        destination (str): The destination directory for the pulled files
+        falco_layout (FalcoLayout): The Falco file layout
+        staging_dir (Path): The directory containing the staged rules and config directories
+        managed_config (bytes): The managed config file the staged files are loaded with
+
+    Returns:
+        True if Falco loaded the staged files successfully, False if Falco rejected them.
 
     Raises:
-        RsyncError: If rsync fails
+        FalcoValidationError: If the dry run could not complete
     """
-    source = f"{CLONE_OUTPUT_DIR}/{FALCO_CUSTOM_CONFIGS_KEY}/"
-    rsync_cmd = [
-        RSYNC,
-        "-av",
-        "--delete",
-        "--include=*.yaml",
-        "--",
-        source,
-        destination,
+    try:
+        falco_config = yaml.safe_load(managed_config) or {}
+    except yaml.YAMLError as e:
+        logger.error("Failed to load the managed Falco config file: %s", e)
+        raise FalcoValidationError("Failed to load the managed Falco config file") from e
+    falco_config["config_files"] = [str(staging_dir / FALCO_CUSTOM_CONFIGS_KEY)]
+    # Keep the default rulesets, which the custom rules may override or build upon
+    falco_config["rules_files"] = [
+        rules_file
+        for rules_file in falco_config.get("rules_files", [])
+        if rules_file != str(falco_layout.rules_dir)
+    ] + [str(staging_dir / FALCO_CUSTOM_RULES_KEY)]
+    staged_config_file = staging_dir / falco_layout.config_file.name
+    staged_config_file.write_text(yaml.safe_dump(falco_config), encoding="utf-8")
+
+    dry_run_cmd = [
+        str(falco_layout.cmd),
+        "-c",
+        str(staged_config_file),
+        "--dry-run",
+        "-o",
+        "webserver.enabled=false",
     ]
     try:
-        subprocess.run(rsync_cmd, check=True)
+        logger.debug("Falco validation command: %s", dry_run_cmd)
+        subprocess.run(
+            dry_run_cmd, check=True, capture_output=True, text=True, timeout=VALIDATION_TIMEOUT
+        )
     except subprocess.CalledProcessError as e:
-        logging.error("Rsync failed from %s to %s", source, destination)
-        raise RsyncError(f"Rsync failed: {e.stderr}") from e
+        logger.error("Falco validation failed: %s", e.stderr or e.stdout)
+        return False
+    except subprocess.TimeoutExpired as e:
+        logger.error("Falco validation timed out after %s seconds", VALIDATION_TIMEOUT)
+        raise FalcoValidationError(
+            f"Falco validation timed out after {VALIDATION_TIMEOUT} seconds"
+        ) from e
+
+    logger.info("Falco validation passed")
+    return True
 
 
 def _git_sync(
@@ -413,7 +1286,7 @@ def _git_sync(
     hostname: str,
     ref: str = "",
     ssh_private_key: str = "",
-) -> None:
+) -> str:
     """Sync the repository to the specified destination.
 
     Args:
@@ -422,22 +1295,47 @@ def _git_sync(
         ref (str): The branch or tag to checkout
         ssh_private_key (str): The SSH private key content
 
+    Returns:
+        The commit SHA checked out in the clone output directory.
+
     Raises:
-        GitCloneError: If git clone fails
+        GitCloneError: If git fetch fails
         SshKeyScanError: If ssh-keyscan fails
         SshKeyWriteError: If writing the Ssh key fails
     """
-    repo_cloned = repo == _get_cloned_repo_url()
-    repo_tag_matched = ref == _get_cloned_repo_tag()
-    if repo_cloned and repo_tag_matched:
-        logger.info("Custom config repository already synced")
-        return
+    if ssh_private_key:
+        _setup_ssh_key(ssh_private_key)
+
+    _add_known_hosts(hostname)
+    return _git_fetch(repo, ref=ref)
+
+
+def _git_is_synced(sync_manifest: SyncManifest, hostname: str, ssh_private_key: str = "") -> bool:
+    """Check whether the last synced commit is still the one the ref points to.
+
+    Tags and commit SHAs are not expected to move, so no git command is run for them. Branches
+    are checked against the remote with a single `git ls-remote`.
+
+    Args:
+        sync_manifest (SyncManifest): The state of the last successful sync
+        hostname (str): The host to scan for Ssh key
+        ssh_private_key (str): The SSH private key content
+
+    Returns:
+        True if the repository is already synced, False otherwise.
+
+    Raises:
+        SshKeyScanError: If ssh-keyscan fails
+        SshKeyWriteError: If writing the Ssh key fails
+    """
+    if sync_manifest.immutable:
+        return True
 
     if ssh_private_key:
         _setup_ssh_key(ssh_private_key)
 
     _add_known_hosts(hostname)
-    _git_clone(repo, ref=ref)
+    return _git_ls_remote(sync_manifest.url, sync_manifest.ref) == sync_manifest.commit
 
 
 def _setup_ssh_key(ssh_private_key: str) -> None:
@@ -467,6 +1365,13 @@ def _add_known_hosts(hostname: str) -> None:
     Raises:
         SshKeyScanError: If ssh-keyscan fails
     """
+    if KNOWN_HOSTS_FILE.is_file() and any(
+        line.split(" ", 1)[0] == hostname
+        for line in KNOWN_HOSTS_FILE.read_text(encoding="utf-8").splitlines()
+    ):
+        logger.debug("Host %s already in known hosts", hostname)
+        return
+
     add_known_hosts_cmd = [SSH_KEYSCAN, "-t", "rsa", hostname]
     try:
         out = subprocess.check_output(add_known_hosts_cmd).decode()
@@ -480,52 +1385,100 @@ def _add_known_hosts(hostname: str) -> None:
         raise SshKeyScanError(f"Error writing to known hosts at {KNOWN_HOSTS_FILE}") from e
 
 
-def _git_clone(repo: str, ref: str = "") -> None:
-    """Clone a git repository using with depth 1.
+def _git(*args: str) -> str:
+    """Run a git command in the clone output directory.
 
     Args:
-        repo (str): The repository URL
-        ref (str): The branch or tag to checkout
+        args (str): The git command arguments
+
+    Returns:
+        The stripped standard output of the command.
 
     Raises:
-        GitCloneError: If git clone fails
+        CalledProcessError: If the git command fails
     """
-    git_clone_cmd = [GIT, "clone", "--depth", "1", repo, str(CLONE_OUTPUT_DIR)]
-    git_clone_cmd += ["-b", ref] if ref else []
+    cmd = [GIT, "-C", str(CLONE_OUTPUT_DIR), *args]
+    logger.debug("Git command: %s", cmd)
+    return subprocess.check_output(cmd).decode().strip()
+
+
+def _git_fetch(repo: str, ref: str = "") -> str:
+    """Fetch a git reference into the persistent clone and check it out.
 
+    The clone output directory is kept across hooks, so only the objects missing from the local
+    object store are fetched. The worktree is only switched when the resolved commit changed.
+
+    Args:
+        repo (str): The repository URL
+        ref (str): The branch or tag to checkout, defaults to the remote HEAD
+
+    Returns:
+        The commit SHA checked out in the clone output directory.
+
+    Raises:
+        GitCloneError: If git fetch fails
+    """
     try:
-        shutil.rmtree(CLONE_OUTPUT_DIR, ignore_errors=True)
-        subprocess.run(git_clone_cmd, check=True)
-    except subprocess.CalledProcessError as e:
-        logging.error("Error cloning repository %s", repo)
-        raise GitCloneError(f"Error cloning repository {repo}") from e
+        if not (CLONE_OUTPUT_DIR / ".git").is_dir():
+            shutil.rmtree(CLONE_OUTPUT_DIR, ignore_errors=True)
+            CLONE_OUTPUT_DIR.mkdir(parents=True)
+            _git("init", "--quiet")
+            _git("remote", "add", "origin", repo)
+        else:
+            _git("remote", "set-url", "origin", repo)
+
+        _git("fetch", "--quiet", "--depth", "1", "--no-tags", "origin", ref or "HEAD")
+        sha = _git("rev-parse", "FETCH_HEAD^{commit}")
+        try:
+            head = _git("rev-parse", "--verify", "--quiet", "HEAD^{commit}")
+        except subprocess.CalledProcessError:
+            head = ""  # Nothing checked out yet
 
+        if sha == head:
+            logger.info("Custom config repository already at %s", sha)
+            return sha
 
-def _get_cloned_repo_url() -> str:
-    """Get the cloned repository URL.
+        _git("checkout", "--quiet", "--force", "--detach", sha)
+    except (subprocess.CalledProcessError, OSError) as e:
+        logging.error("Error fetching repository %s", repo)
+        raise GitCloneError(f"Error fetching repository {repo}") from e
+
+    logger.info("Custom config repository checked out at %s", sha)
+    return sha
+
+
+def _git_fetched_tag() -> bool:
+    """Check whether the last git fetch resolved a tag.
 
     Returns:
-        The repository URL as a string or empty string if the repository is not cloned.
+        True if the last fetched ref is a tag, False otherwise.
     """
-    cmd = [GIT, "-C", str(CLONE_OUTPUT_DIR), "config", "--get", "remote.origin.url"]
     try:
-        url = subprocess.check_output(cmd).decode()
-    except subprocess.CalledProcessError as e:
-        logger.debug(e)
-        return ""
-    return url.strip()
+        fetch_head = (CLONE_OUTPUT_DIR / ".git" / "FETCH_HEAD").read_text(encoding="utf-8")
+    except OSError:
+        return False
+    # Each line is formatted as "<sha>\t<not-for-merge>\t<kind> '<ref>' of <url>"
+    return fetch_head.split("\t", 2)[-1].startswith("tag ")
+
 
+def _git_ls_remote(repo: str, ref: str = "") -> str:
+    """Resolve a branch of a remote repository to a commit SHA.
 
-def _get_cloned_repo_tag() -> str:
-    """Get the cloned repository tag.
+    Args:
+        repo (str): The repository URL
+        ref (str): The branch to resolve, defaults to the remote HEAD
 
     Returns:
-        The repository tag as a string or empty string if the repository is not cloned.
+        The commit SHA the branch points to, or empty string if it cannot be resolved.
     """
-    cmd = [GIT, "-C", str(CLONE_OUTPUT_DIR), "describe", "--tags", "--exact-match"]
+    names = {ref, f"refs/heads/{ref}"} if ref else {"HEAD"}
     try:
-        tag = subprocess.check_output(cmd).decode()
+        out = _git("ls-remote", repo, ref or "HEAD")
     except subprocess.CalledProcessError as e:
         logger.debug(e)
         return ""
-    return tag.strip()
+    for line in out.splitlines():
+        sha, _, name = line.partition("\t")
+        if name in names:
+            return sha
+    return ""
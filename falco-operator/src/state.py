@@ -10,9 +10,16 @@ from typing import Optional
 
 import ops
 from pfe.interfaces.falcosidekick_http_endpoint import HttpEndpointRequirer
-from pydantic import AnyUrl, BaseModel, ValidationError
+from pydantic import AnyUrl, BaseModel, Field, ValidationError
 
-from config import CharmConfig, InvalidCharmConfigError
+from config import (
+    CONTAINER_ENGINES,
+    DEFAULT_METRICS_COUNTERS,
+    PLUGINS,
+    RULESET_PLUGINS,
+    CharmConfig,
+    InvalidCharmConfigError,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -25,22 +32,113 @@ class CharmState(BaseModel):
         custom_config_repo_ref: Optional branch or tag to a custom configuration repository.
         custom_config_repo_ssh_key: Optional SSH key for custom configuration repository.
         http_output: Optional HTTP output data from http-output relation.
+        http_output_keep_alive: Whether to reuse the connection to the HTTP endpoint.
+        http_output_compress_uploads: Whether to compress the alerts sent to the HTTP endpoint.
+        http_output_ca_cert: The CA certificate of the HTTP endpoint, if not publicly trusted.
+        relay: Whether to send the alerts through the local spool-and-forward relay.
+        relay_spool_max_size: Maximum size of the relay spool, in megabytes.
+        relay_token: The secret URL path Falco posts the alerts to the relay to.
+        outputs: The Falco output channels alerts are sent to.
+        file_output_max_size: Size at which the alerts file is rotated, in megabytes.
+        file_output_rotate: Number of rotated alerts files to keep.
+        rulesets: The default rulesets to load before the custom rules.
+        rules_disable: The rules to disable, by name or by "tag:" prefixed tag.
+        rules_enable: The rules to enable again, by name or by "tag:" prefixed tag.
+        priority: The minimum priority of the loaded rules.
+        base_syscalls_custom_set: The syscalls traced on top of the rules ones.
+        base_syscalls_repair: Whether to only trace the state syscalls the rules need.
+        cpu_quota: CPU time the Falco service may use, in percent of a CPU, 0 for no limit.
+        memory_max: Memory the Falco service may use, in megabytes, 0 for no limit.
+        cpu_affinity: The CPUs or CPU ranges the Falco service runs on.
+        nice: Scheduling priority of the Falco service.
+        cpu_weight: CPU weight of the Falco service, 0 for the systemd default.
+        io_weight: IO weight of the Falco service, 0 for the systemd default.
+        engine_buf_size_preset: Size preset of the modern eBPF ring buffers.
+        engine_cpus_for_each_buffer: Number of CPUs sharing a modern eBPF ring buffer.
+        engine_drop_failed_exit: Whether to drop failed syscall exit events in the kernel.
+        engine_buf_size_autotune: Whether to tune the ring buffer size from the drops.
+        engine_buf_size_preset_min: Lowest size preset the autotuner may apply.
+        engine_buf_size_preset_max: Highest size preset the autotuner may apply.
+        engine_buf_size_autotune_window: Maintenance window of the autotuner, in UTC.
+        metrics_interval: Interval of the Falco metrics snapshots sent to the outputs.
+        metrics_output_rule: Whether to send the Falco metrics snapshots to the outputs.
+        metrics_counters: The enabled Falco metrics counters.
+        plugins: The Falco plugins to load.
+        container_engines: The enabled container engines, with their sockets.
+        container_label_max_len: Maximum length of the container labels to collect.
+        container_with_size: Whether to collect the container size.
+        container_hooks: The container lifecycle hooks collecting metadata.
+        outputs_queue_capacity: Maximum number of alerts queued for the outputs, 0 for no limit.
+        buffered_outputs: Whether to buffer the output streams of the alerts.
+        output_timeout: Time an output may block before Falco reports it, in milliseconds.
     """
 
     custom_config_repo: Optional[AnyUrl] = None
     custom_config_repo_ref: Optional[str] = None
     custom_config_repo_ssh_key: Optional[str] = None
     http_output: Optional[dict[str, str]] = None
+    http_output_keep_alive: bool = True
+    http_output_compress_uploads: bool = False
+    http_output_ca_cert: Optional[str] = None
+    relay: bool = True
+    relay_spool_max_size: int = 256
+    relay_token: str = Field(default="", repr=False)
+    outputs: list[str] = ["http"]
+    file_output_max_size: int = 100
+    file_output_rotate: int = 5
+    rulesets: list[str] = []
+    rules_disable: list[str] = []
+    rules_enable: list[str] = []
+    priority: str = "debug"
+    base_syscalls_custom_set: list[str] = []
+    base_syscalls_repair: bool = False
+    cpu_quota: int = 0
+    memory_max: int = 0
+    cpu_affinity: list[str] = []
+    nice: int = 0
+    cpu_weight: int = 0
+    io_weight: int = 0
+    engine_buf_size_preset: int = 4
+    engine_cpus_for_each_buffer: int = 2
+    engine_drop_failed_exit: bool = False
+    engine_buf_size_autotune: bool = False
+    engine_buf_size_preset_min: int = 1
+    engine_buf_size_preset_max: int = 8
+    engine_buf_size_autotune_window: str = ""
+    metrics_interval: str = "1h"
+    metrics_output_rule: bool = True
+    metrics_counters: list[str] = list(DEFAULT_METRICS_COUNTERS)
+    plugins: list[str] = list(PLUGINS)
+    container_engines: dict[str, list[str]] = {
+        engine: list(sockets) for engine, sockets in CONTAINER_ENGINES.items()
+    }
+    container_label_max_len: int = 100
+    container_with_size: bool = False
+    container_hooks: list[str] = ["create"]
+    outputs_queue_capacity: int = 0
+    buffered_outputs: bool = False
+    output_timeout: int = 2000
 
     @classmethod
     def from_charm(
-        cls, charm: ops.CharmBase, http_endpoint_requirer: HttpEndpointRequirer
+        cls,
+        charm: ops.CharmBase,
+        http_endpoint_requirer: HttpEndpointRequirer,
+        autotuned_buf_size_preset: Optional[int] = None,
+        detected_plugins: Optional[list[str]] = None,
+        detected_container_engines: Optional[dict[str, list[str]]] = None,
+        relay_token: str = "",
     ) -> "CharmState":
         """Create a CharmState from a charm instance.
 
         Args:
             charm: The charm instance.
             http_endpoint_requirer: The HttpEndpointRequirer instance to get http output URL.
+            autotuned_buf_size_preset: The ring buffer size preset applied by the autotuner.
+            detected_plugins: The Falco plugins the host needs, used when plugins is auto.
+            detected_container_engines: The container engines running on the host, with their
+                sockets, used when container_engines is auto.
+            relay_token: The secret URL path Falco posts the alerts to the relay to.
 
         Returns:
             A CharmState instance.
@@ -68,18 +166,85 @@ class CharmState(BaseModel):
         custom_config_repo_ssh_key = _fetch_custom_ssh_key(charm.model, charm_config)
 
         http_output = {}
-        app_urls = http_endpoint_requirer.get_app_urls()
+        # The http output channel ignores the http-endpoint relation when not selected
+        app_urls = http_endpoint_requirer.get_app_urls() if "http" in charm_config.outputs else {}
         for url in app_urls.values():
             # There should only be one URL since this relation is limited to 1, but if there are
             # multiple, just take the last one.
             http_output.update({"url": url})
             logger.info("Retrieved url info from relation: %s", url)
 
+        # Only compress the alerts when the endpoint advertises it accepts compressed bodies
+        compression = http_endpoint_requirer.get_app_compression()
+        http_output_compress_uploads = (
+            charm_config.http_output_compress_uploads
+            and bool(compression)
+            and all(compression.values())
+        )
+        http_output_ca_cert = None
+        for ca_cert in http_endpoint_requirer.get_app_ca_certs().values():
+            http_output_ca_cert = ca_cert
+
+        engine_buf_size_preset = charm_config.engine_buf_size_preset
+        if charm_config.engine_buf_size_autotune and autotuned_buf_size_preset is not None:
+            engine_buf_size_preset = min(
+                max(autotuned_buf_size_preset, charm_config.engine_buf_size_preset_min),
+                charm_config.engine_buf_size_preset_max,
+            )
+
+        plugins = charm_config.plugins
+        if plugins == "auto":
+            plugins = list(PLUGINS) if detected_plugins is None else detected_plugins
+        # Falco refuses to load rules using the fields of a plugin that is not loaded
+        ruleset_plugins = [
+            plugin for ruleset in charm_config.rulesets for plugin in RULESET_PLUGINS[ruleset]
+        ]
+        plugins = list(dict.fromkeys([*plugins, *ruleset_plugins]))
+
         return cls(
             custom_config_repo=custom_config_repo,
             custom_config_repo_ref=custom_config_repo_ref,
             custom_config_repo_ssh_key=custom_config_repo_ssh_key,
             http_output=http_output,
+            http_output_keep_alive=charm_config.http_output_keep_alive,
+            http_output_compress_uploads=http_output_compress_uploads,
+            http_output_ca_cert=http_output_ca_cert,
+            relay=charm_config.relay,
+            relay_spool_max_size=charm_config.relay_spool_max_size,
+            relay_token=relay_token,
+            outputs=charm_config.outputs,
+            file_output_max_size=charm_config.file_output_max_size,
+            file_output_rotate=charm_config.file_output_rotate,
+            rulesets=charm_config.rulesets,
+            rules_disable=charm_config.rules_disable,
+            rules_enable=charm_config.rules_enable,
+            priority=charm_config.priority,
+            base_syscalls_custom_set=charm_config.base_syscalls_custom_set,
+            base_syscalls_repair=charm_config.base_syscalls_repair,
+            cpu_quota=charm_config.cpu_quota,
+            memory_max=charm_config.memory_max,
+            cpu_affinity=charm_config.cpu_affinity,
+            nice=charm_config.nice,
+            cpu_weight=charm_config.cpu_weight,
+            io_weight=charm_config.io_weight,
+            engine_buf_size_preset=engine_buf_size_preset,
+            engine_cpus_for_each_buffer=charm_config.engine_cpus_for_each_buffer,
+            engine_drop_failed_exit=charm_config.engine_drop_failed_exit,
+            engine_buf_size_autotune=charm_config.engine_buf_size_autotune,
+            engine_buf_size_preset_min=charm_config.engine_buf_size_preset_min,
+            engine_buf_size_preset_max=charm_config.engine_buf_size_preset_max,
+            engine_buf_size_autotune_window=charm_config.engine_buf_size_autotune_window,
+            metrics_interval=charm_config.metrics_interval,
+            metrics_output_rule=charm_config.metrics_output_rule,
+            metrics_counters=charm_config.metrics_counters,
+            plugins=plugins,
+            container_engines=_container_engines(charm_config, detected_container_engines),
+            container_label_max_len=charm_config.container_label_max_len,
+            container_with_size=charm_config.container_with_size,
+            container_hooks=charm_config.container_hooks,
+            outputs_queue_capacity=charm_config.outputs_queue_capacity,
+            buffered_outputs=charm_config.buffered_outputs,
+            output_timeout=charm_config.output_timeout,
         )
 
 
@@ -96,6 +261,32 @@ class CharmBaseWithState(ops.CharmBase, ABC):
         """Reconcile configuration."""
 
 
+def _container_engines(
+    config: CharmConfig, detected_container_engines: Optional[dict[str, list[str]]]
+) -> dict[str, list[str]]:
+    """Resolve the container engines enabled in the container plugin.
+
+    Args:
+        config: The charm config.
+        detected_container_engines: The container engines running on the host, with their
+            sockets, if detected.
+
+    Returns:
+        The enabled container engines, with their sockets.
+    """
+    container_engines = {engine: list(sockets) for engine, sockets in CONTAINER_ENGINES.items()}
+    if config.container_engines != "auto":
+        container_engines = {
+            engine: container_engines[engine] for engine in config.container_engines
+        }
+    elif detected_container_engines is not None:
+        container_engines = dict(detected_container_engines)
+    for engine, sockets in config.container_sockets.items():
+        if engine in container_engines:
+            container_engines[engine] = sockets
+    return container_engines
+
+
 def _fetch_custom_ssh_key(model: ops.Model, config: CharmConfig) -> Optional[str]:
     """Fetch the custom SSH key from the charm config.
 
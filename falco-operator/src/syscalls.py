@@ -0,0 +1,215 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Falco base syscalls comparison module."""
+
+import json
+import logging
+import re
+import subprocess
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from metrics import MetricSample
+from service import FalcoLayout
+
+logger = logging.getLogger(__name__)
+
+DRY_RUN_TIMEOUT = 300
+# The base_syscalls settings of the smallest set of syscalls keeping every rule working
+REPAIRED_CUSTOM_SET: list[str] = []
+REPAIRED_REPAIR = True
+REPAIRED_BASE_SYSCALLS = {"custom_set": REPAIRED_CUSTOM_SET, "repair": REPAIRED_REPAIR}
+# Falco logs the syscalls it selects at debug level when it loads the rules
+RULES_SYSCALLS_PATTERN = re.compile(r"syscalls in rules:\s*(.*)")
+FINAL_SYSCALLS_PATTERN = re.compile(r"syscalls selected in total \(final set\):\s*(.*)")
+# The libbpf stats of the modern eBPF programs, one enter (_e) and exit (_x) program per syscall
+PROGRAM_RUN_COUNT_PATTERN = re.compile(
+    r"falcosecurity_scap_(?:libbpf_)?(\w+)_([ex])_run_cnt_total"
+)
+
+
+class SyscallsError(Exception):
+    """Exception raised when Falco fails to report its syscalls."""
+
+
+class CompareBaseSyscallsParams(BaseModel):
+    """The pydantic model for the compare-base-syscalls action parameters.
+
+    Attributes:
+        window: The sampling window of the syscall rates, in seconds.
+    """
+
+    window: int = Field(default=60, ge=0, le=3600)
+
+
+class SyscallSets(BaseModel):
+    """The syscalls Falco traces for a config file.
+
+    Attributes:
+        rules: The syscalls the rules need.
+        final: The syscalls Falco traces, including the ones its state engine needs.
+    """
+
+    rules: list[str]
+    final: list[str]
+
+
+class BaseSyscallsComparison(BaseModel):
+    """The comparison of the traced syscalls with the repaired empty custom set.
+
+    Attributes:
+        rules: The syscalls the rules need.
+        current: The syscalls Falco currently traces.
+        repaired: The syscalls Falco traces with an empty, repaired custom set.
+        removed_rate: The rate of the observed syscalls no longer traced, per second, if sampled.
+        unobserved: The syscalls the rules need which did not occur while sampling.
+    """
+
+    rules: list[str]
+    current: list[str]
+    repaired: list[str]
+    removed_rate: Optional[float]
+    unobserved: list[str]
+
+
+def syscall_sets(falco_layout: FalcoLayout, base_syscalls: Optional[dict] = None) -> SyscallSets:
+    """Get the syscalls Falco selects for its config file, without opening the engine.
+
+    Args:
+        falco_layout: The Falco file layout.
+        base_syscalls: The base_syscalls settings replacing the configured ones, if any.
+
+    Returns:
+        The syscalls the rules need and the syscalls Falco traces.
+
+    Raises:
+        SyscallsError: If Falco fails to load its config or does not report its syscalls.
+    """
+    if not falco_layout.config_file.is_file():
+        raise SyscallsError(f"Failed to load the Falco config file {falco_layout.config_file}")
+
+    # Command line options take precedence over the config override files, so that custom
+    # settings cannot change the compared base syscalls nor hide the reported syscalls
+    options: dict[str, object] = {
+        "watch_config_files": False,
+        "log_level": "debug",
+        "log_stderr": True,
+        "log_syslog": False,
+        "webserver.enabled": False,
+    }
+    if base_syscalls is not None:
+        options.update({f"base_syscalls.{key}": value for key, value in base_syscalls.items()})
+    dry_run_cmd = [
+        str(falco_layout.cmd),
+        "-c",
+        str(falco_layout.config_file),
+        "--dry-run",
+        *[
+            arg
+            for key, value in options.items()
+            for arg in ("-o", f"{key}={value if isinstance(value, str) else json.dumps(value)}")
+        ],
+    ]
+    try:
+        logger.debug("Falco dry run command: %s", dry_run_cmd)
+        process = subprocess.run(
+            dry_run_cmd, check=True, capture_output=True, text=True, timeout=DRY_RUN_TIMEOUT
+        )
+    except subprocess.CalledProcessError as e:
+        raise SyscallsError(f"Falco failed to load its config: {e.stderr or e.stdout}") from e
+    except subprocess.TimeoutExpired as e:
+        raise SyscallsError(f"Falco dry run timed out after {DRY_RUN_TIMEOUT} seconds") from e
+
+    output = process.stderr + process.stdout
+    rules_match = RULES_SYSCALLS_PATTERN.search(output)
+    final_match = FINAL_SYSCALLS_PATTERN.search(output)
+    if not rules_match or not final_match:
+        raise SyscallsError("Falco did not report the syscalls it selects")
+    return SyscallSets(rules=_split(rules_match.group(1)), final=_split(final_match.group(1)))
+
+
+def repaired_config() -> str:
+    """Get the charm config options applying the repaired base syscalls.
+
+    Returns:
+        The base syscalls config options, as `juju config` arguments.
+    """
+    return (
+        f'base-syscalls-custom-set="{",".join(REPAIRED_CUSTOM_SET)}" '
+        f"base-syscalls-repair={json.dumps(REPAIRED_REPAIR)}"
+    )
+
+
+def syscall_counts(samples: list[MetricSample]) -> dict[str, int]:
+    """Extract the number of times each syscall ran from the libbpf stats.
+
+    Args:
+        samples: The metric samples.
+
+    Returns:
+        The number of enter and exit events, by syscall, empty without the libbpf stats.
+    """
+    counts: dict[str, int] = {}
+    for sample in samples:
+        match = PROGRAM_RUN_COUNT_PATTERN.fullmatch(sample.name)
+        if match:
+            counts[match.group(1)] = counts.get(match.group(1), 0) + int(sample.value)
+    return counts
+
+
+def compare(
+    current: SyscallSets,
+    repaired: SyscallSets,
+    before: Optional[dict[str, int]] = None,
+    after: Optional[dict[str, int]] = None,
+    seconds: float = 0,
+) -> BaseSyscallsComparison:
+    """Compare the traced syscalls with the ones traced with an empty, repaired custom set.
+
+    Falco always traces the syscalls the rules need, and repair adds the syscalls its state
+    engine needs for them, so an empty repaired custom set is the smallest set keeping every rule
+    working. The sampled rates are informational: they estimate the events no longer traced with
+    that set, and reveal the syscalls of the rules which do not occur on the host.
+
+    Args:
+        current: The syscalls Falco selects with the configured base syscalls.
+        repaired: The syscalls Falco selects with an empty, repaired custom set.
+        before: The syscall counters at the start of the sampling window, if sampled.
+        after: The syscall counters at the end of the sampling window, if sampled.
+        seconds: The sampling window, in seconds.
+
+    Returns:
+        The comparison of the syscall sets.
+    """
+    rates: dict[str, float] = {}
+    if before is not None and after and seconds > 0:
+        rates = {
+            syscall: max(count - before.get(syscall, 0), 0) / seconds
+            for syscall, count in after.items()
+        }
+
+    removed_rate = None
+    if rates:
+        removed = set(current.final) - set(repaired.final)
+        removed_rate = round(sum(rates.get(syscall, 0.0) for syscall in removed), 3)
+    return BaseSyscallsComparison(
+        rules=current.rules,
+        current=current.final,
+        repaired=repaired.final,
+        removed_rate=removed_rate,
+        unobserved=[syscall for syscall in current.rules if rates and not rates.get(syscall)],
+    )
+
+
+def _split(syscalls: str) -> list[str]:
+    """Split a comma separated list of syscalls reported by Falco.
+
+    Args:
+        syscalls: The comma separated syscalls.
+
+    Returns:
+        The sorted syscalls.
+    """
+    return sorted({syscall.strip() for syscall in syscalls.split(",") if syscall.strip()})
@@ -0,0 +1,133 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for autotune module."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from autotune import (
+    QUIET_SAMPLES_BEFORE_SHRINK,
+    AutotuneState,
+    RingBufferSample,
+    fetch_sample,
+    in_window,
+    ring_buffer_sample,
+)
+from metrics import MetricsError, parse_metrics
+
+METRICS = """\
+# HELP falcosecurity_scap_n_evts_total https://falco.org/docs/metrics/
+# TYPE falcosecurity_scap_n_evts_total counter
+falcosecurity_scap_n_evts_total{raw_name="n_evts"} 100000
+# TYPE falcosecurity_scap_n_drops_buffer_total counter
+falcosecurity_scap_n_drops_buffer_total{raw_name="n_drops_buffer_total"} 250
+falcosecurity_scap_n_drops_buffer_total{dir="enter",drop="clone_fork"} 10
+falcosecurity_falco_outputs_queue_num_drops_total 0
+"""
+
+
+class TestAutotuneState:
+    """Test AutotuneState class."""
+
+    def test_observe_first_sample(self):
+        """Test the first sample is only recorded."""
+        sample = RingBufferSample(events=100, drops=10)
+        autotune = AutotuneState().observe(sample, current=4, minimum=1, maximum=8)
+
+        assert autotune.sample == sample
+        assert autotune.pending_preset is None
+
+    def test_observe_drops_step_up(self):
+        """Test drops above the threshold schedule a larger preset."""
+        autotune = AutotuneState(sample=RingBufferSample(events=1000, drops=0))
+        autotune = autotune.observe(
+            RingBufferSample(events=2000, drops=100), current=4, minimum=1, maximum=8
+        )
+
+        assert autotune.pending_preset == 5
+        assert autotune.quiet_samples == 0
+
+    def test_observe_drops_at_maximum(self):
+        """Test drops do not schedule a preset above the maximum."""
+        autotune = AutotuneState(sample=RingBufferSample(events=1000, drops=0))
+        autotune = autotune.observe(
+            RingBufferSample(events=2000, drops=100), current=8, minimum=1, maximum=8
+        )
+
+        assert autotune.pending_preset is None
+
+    def test_observe_quiet_step_down(self):
+        """Test a long run of samples without drops schedules a smaller preset."""
+        autotune = AutotuneState(
+            sample=RingBufferSample(events=1000, drops=5),
+            quiet_samples=QUIET_SAMPLES_BEFORE_SHRINK - 1,
+        )
+        autotune = autotune.observe(
+            RingBufferSample(events=2000, drops=5), current=4, minimum=1, maximum=8
+        )
+
+        assert autotune.pending_preset == 3
+        assert autotune.quiet_samples == 0
+
+    def test_observe_counter_reset(self):
+        """Test a counter reset after a Falco restart is not taken as a drop rate."""
+        autotune = AutotuneState(sample=RingBufferSample(events=1000, drops=500))
+        sample = RingBufferSample(events=10, drops=0)
+        autotune = autotune.observe(sample, current=4, minimum=1, maximum=8)
+
+        assert autotune.sample == sample
+        assert autotune.pending_preset is None
+
+    def test_apply(self):
+        """Test applying the pending preset resets the samples."""
+        autotune = AutotuneState(
+            pending_preset=5, sample=RingBufferSample(events=1, drops=1), quiet_samples=3
+        )
+
+        assert autotune.apply() == AutotuneState(preset=5)
+
+
+class TestRingBufferSample:
+    """Test the kernel event counters sampling functions."""
+
+    def test_ring_buffer_sample(self):
+        """Test extracting the total kernel event counters."""
+        assert ring_buffer_sample(parse_metrics(METRICS)) == RingBufferSample(
+            events=100000, drops=250
+        )
+
+    def test_ring_buffer_sample_missing_counters(self):
+        """Test extracting the counters from metrics without kernel event counters."""
+        with pytest.raises(MetricsError):
+            ring_buffer_sample(
+                parse_metrics("falcosecurity_falco_outputs_queue_num_drops_total 0\n")
+            )
+
+    @patch("autotune.fetch_metrics")
+    def test_fetch_sample(self, mock_fetch_metrics):
+        """Test fetching the kernel event counters from the Falco webserver."""
+        mock_fetch_metrics.return_value = parse_metrics(METRICS)
+
+        assert fetch_sample(8765) == RingBufferSample(events=100000, drops=250)
+        mock_fetch_metrics.assert_called_once_with(8765)
+
+
+@pytest.mark.parametrize(
+    "window,hour,expected",
+    [
+        ("", 12, True),
+        ("02:00-04:00", 3, True),
+        ("02:00-04:00", 4, False),
+        ("22:00-02:00", 23, True),
+        ("22:00-02:00", 1, True),
+        ("22:00-02:00", 12, False),
+    ],
+)
+def test_in_window(window, hour, expected):
+    """Test maintenance window matching, including windows spanning midnight."""
+    now = datetime(2026, 1, 1, hour, 0, tzinfo=timezone.utc)
+
+    assert in_window(window, now) is expected
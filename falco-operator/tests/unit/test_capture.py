@@ -0,0 +1,130 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for capture module."""
+
+import json
+import os
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from capture import (
+    CaptureError,
+    _capture_options,
+    _read_kernel_counters,
+    _rotate_captures,
+    capture,
+)
+
+
+def _option(cmd, key):
+    """Get the value of a Falco -o option from a command."""
+    values = [arg.split("=", 1)[1] for arg in cmd if arg.startswith(f"{key}=")]
+    return values[-1]
+
+
+def _fake_falco(exit_code=None, record=b"scap" * 10):
+    """Build a fake Falco Popen recording a capture and kernel counters."""
+
+    def popen(cmd, **_):
+        path_prefix = Path(_option(cmd, "capture.path_prefix"))
+        if record:
+            Path(f"{path_prefix}_1.scap").write_bytes(record)
+        metrics = {"output_fields": {"scap.n_evts": 1000, "scap.n_drops": 3}}
+        Path(_option(cmd, "metrics.output_file")).write_text(json.dumps(metrics) + "\n")
+        process = MagicMock()
+        process.poll.return_value = exit_code
+        popen_cm = MagicMock()
+        popen_cm.__enter__.return_value = process
+        return popen_cm
+
+    return popen
+
+
+class TestCapture:
+    """Test capture function."""
+
+    @patch("capture.subprocess.Popen")
+    def test_capture_size_limit(self, mock_popen, mock_falco_layout):
+        """Test the capture stops once it reaches its size and reports the counters."""
+        mock_popen.side_effect = _fake_falco()
+
+        result = capture(mock_falco_layout, duration=60, max_bytes=10)
+
+        assert result.path.parent == mock_falco_layout.captures_dir
+        assert result.path.name.startswith("capture-")
+        assert result.size == 40
+        assert result.events == 1000
+        assert result.drops == 3
+        cmd = mock_popen.call_args.args[0]
+        assert cmd[:3] == [str(mock_falco_layout.cmd), "-c", str(mock_falco_layout.config_file)]
+        assert _option(cmd, "http_output.enabled") == "false"
+
+    @patch("capture.subprocess.Popen")
+    def test_capture_syscall_source_only(self, mock_popen, mock_falco_layout):
+        """Test the capture does not open the plugin sources held by the Falco service."""
+        mock_falco_layout.config_file.write_text(
+            "load_plugins: [container, json, k8saudit]\nplugins: []\n"
+        )
+        mock_popen.side_effect = _fake_falco()
+
+        capture(mock_falco_layout, duration=60, max_bytes=10)
+
+        cmd = mock_popen.call_args.args[0]
+        assert cmd[cmd.index("--enable-source") + 1] == "syscall"
+        assert cmd.count("--enable-source") == 1
+
+    @patch("capture.subprocess.Popen")
+    def test_capture_rules_disabled(self, mock_popen, mock_falco_layout):
+        """Test the capture rule is enabled when the managed selectors disable every rule."""
+        mock_falco_layout.config_file.write_text("rules:\n- disable:\n    rule: '*'\n")
+        mock_popen.side_effect = _fake_falco()
+
+        capture(mock_falco_layout, duration=60, max_bytes=10)
+
+        cmd = mock_popen.call_args.args[0]
+        assert json.loads(_option(cmd, "rules")) == [{"enable": {"rule": "Charm Capture"}}]
+
+    @patch("capture.subprocess.Popen")
+    def test_capture_falco_exits(self, mock_popen, mock_falco_layout):
+        """Test the capture fails when Falco exits before the end of the capture."""
+        mock_popen.side_effect = _fake_falco(exit_code=1)
+
+        with pytest.raises(CaptureError, match="exited"):
+            capture(mock_falco_layout, duration=60, max_bytes=10)
+
+    @patch("capture.time.monotonic", side_effect=[0.0, 5.0, 5.0])
+    @patch("capture.subprocess.Popen")
+    def test_capture_no_event(self, mock_popen, _, mock_falco_layout):
+        """Test the capture fails when Falco records nothing before the duration."""
+        mock_popen.side_effect = _fake_falco(record=b"")
+
+        with pytest.raises(CaptureError, match="did not record"):
+            capture(mock_falco_layout, duration=1, max_bytes=10)
+
+    def test_capture_options(self, tmp_path):
+        """Test the capture disables the outputs and records all events."""
+        options = _capture_options(tmp_path / "capture", 30, tmp_path / "metrics.json")
+
+        assert options[::2] == ["-o"] * (len(options) // 2)
+        assert _option(options, "capture.mode") == "all_rules"
+        assert _option(options, "capture.default_duration") == "30000"
+        assert _option(options, "stdout_output.enabled") == "false"
+        assert _option(options, "webserver.enabled") == "false"
+
+    def test_read_kernel_counters_missing(self, tmp_path):
+        """Test reading the kernel counters when Falco wrote no metrics."""
+        assert _read_kernel_counters(tmp_path / "metrics.json") == (None, None)
+
+    def test_rotate_captures(self, tmp_path):
+        """Test the oldest captures are removed first, except the kept one."""
+        for age, name in enumerate(["new", "middle", "old"]):
+            path = tmp_path / f"{name}.scap"
+            path.write_bytes(b"x" * 10)
+            os.utime(path, (1000 - age, 1000 - age))
+
+        _rotate_captures(tmp_path, 25, keep=tmp_path / "old.scap")
+
+        assert sorted(path.name for path in tmp_path.glob("*.scap")) == ["new.scap", "old.scap"]
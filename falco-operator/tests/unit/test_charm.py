@@ -3,16 +3,24 @@
 
 """Unit tests for Falco charm."""
 
+import dataclasses
 import shutil
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 
 import ops
 import ops.testing
 import pytest
 from pydantic import AnyUrl
 
+from autotune import RingBufferSample
+from capture import CaptureError, CaptureResult
 from charm import Falco
+from config import CONTAINER_ENGINES
+from metrics import MetricsError, parse_metrics
+from profiling import ProfilingError, RuleCost, RulesProfile
+from resources import ResourcesError, ServiceResources
 from service import FalcoConfigurationError
+from syscalls import SyscallsError, SyscallSets
 
 
 class TestCharm:
@@ -150,6 +158,7 @@ class TestCharmConfigHandling:
         """Test config_changed event with custom config repository configured."""
         mock_service = MagicMock()
         mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
         mock_service_class.return_value = mock_service
 
         context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
@@ -172,6 +181,7 @@ class TestCharmConfigHandling:
         """Test config_changed event with custom config repository and ref configured."""
         mock_service = MagicMock()
         mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
         mock_service_class.return_value = mock_service
 
         context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
@@ -196,6 +206,7 @@ class TestCharmConfigHandling:
         """Test config_changed event without custom config repository."""
         mock_service = MagicMock()
         mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
         mock_service_class.return_value = mock_service
 
         context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
@@ -279,12 +290,699 @@ class TestCharmConfigHandling:
         assert state_out.unit_status == ops.testing.BlockedStatus("Failed configuring Falco")
 
 
+class TestCharmReconcileFingerprint:
+    """Test the reconcile short-circuit on unchanged fingerprint."""
+
+    @patch("charm.FalcoService")
+    def test_reconcile_skipped_when_fingerprint_unchanged(
+        self, mock_service_class, mock_charm_dir, mock_falco_layout
+    ):
+        """Test reconcile does not configure Falco when nothing changed."""
+        mock_service = MagicMock()
+        mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
+        mock_service_class.return_value = mock_service
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.config_changed(), ops.testing.State())
+        mock_service.configure.assert_called_once()
+
+        mock_service.configure.reset_mock()
+        state_out = context.run(context.on.config_changed(), state_out)
+
+        mock_service.configure.assert_not_called()
+        assert state_out.unit_status == ops.testing.ActiveStatus()
+
+    @patch("charm.FalcoService")
+    def test_reconcile_when_service_not_running(
+        self, mock_service_class, mock_charm_dir, mock_falco_layout
+    ):
+        """Test reconcile configures Falco when it is not running despite no changes."""
+        mock_service = MagicMock()
+        mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
+        mock_service_class.return_value = mock_service
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.config_changed(), ops.testing.State())
+
+        mock_service.configure.reset_mock()
+        mock_service.check_active.side_effect = [False, True]
+        context.run(context.on.config_changed(), state_out)
+
+        mock_service.configure.assert_called_once()
+
+    @patch("charm.FalcoService")
+    def test_reconcile_without_fingerprint(
+        self, mock_service_class, mock_charm_dir, mock_falco_layout
+    ):
+        """Test reconcile always configures Falco when no fingerprint can be computed."""
+        mock_service = MagicMock()
+        mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = None
+        mock_service_class.return_value = mock_service
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.config_changed(), ops.testing.State())
+        state_out = context.run(context.on.config_changed(), state_out)
+
+        assert mock_service.configure.call_count == 2
+
+    @patch("charm.FalcoRelay")
+    @patch("charm.FalcoService")
+    def test_reconcile_restarts_once_after_upgrade(
+        self, mock_service_class, mock_relay_class, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the first reconcile after an upgrade restarts Falco and the relay."""
+        mock_relay = mock_relay_class.return_value
+        mock_relay.check_active.return_value = True
+        mock_service = MagicMock()
+        mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
+        mock_service_class.return_value = mock_service
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.config_changed(), ops.testing.State())
+        mock_service.configure.assert_called_once_with(ANY, restart=False)
+
+        mock_service.configure.reset_mock()
+        state_out = context.run(context.on.upgrade_charm(), state_out)
+        state_out = context.run(context.on.config_changed(), state_out)
+        mock_service.configure.assert_called_once_with(ANY, restart=True)
+        mock_relay.configure.assert_called_with(ANY, restart=True)
+
+        mock_service.configure.reset_mock()
+        context.run(context.on.config_changed(), state_out)
+        mock_service.configure.assert_not_called()
+
+
+class TestCharmAutotune:
+    """Test the ring buffer autotune on update-status."""
+
+    @patch("charm.fetch_sample")
+    @patch("charm.FalcoService")
+    def test_update_status_autotune_disabled(
+        self, mock_service_class, mock_fetch_sample, mock_charm_dir, mock_falco_layout
+    ):
+        """Test update-status does not sample Falco when autotune is disabled."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        context.run(context.on.update_status(), ops.testing.State())
+
+        mock_fetch_sample.assert_not_called()
+
+    @patch("charm.fetch_sample")
+    @patch("charm.FalcoService")
+    def test_update_status_autotune_applies_preset(
+        self, mock_service_class, mock_fetch_sample, mock_charm_dir, mock_falco_layout
+    ):
+        """Test update-status steps the preset up and reconciles when Falco drops events."""
+        mock_service = MagicMock()
+        mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = None
+        mock_service_class.return_value = mock_service
+        mock_fetch_sample.side_effect = [
+            RingBufferSample(events=1000, drops=0),
+            RingBufferSample(events=2000, drops=100),
+        ]
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_in = ops.testing.State(config={"engine-buf-size-autotune": True})
+        state_out = context.run(context.on.update_status(), state_in)
+        mock_service.configure.assert_not_called()
+
+        state_out = context.run(context.on.update_status(), state_out)
+
+        mock_service.configure.assert_called_once()
+        assert mock_service.configure.call_args.args[0].engine_buf_size_preset == 5
+        assert state_out.unit_status == ops.testing.ActiveStatus()
+
+        with context(context.on.config_changed(), state_out) as manager:
+            assert manager.charm.state.engine_buf_size_preset == 5
+
+    @patch("charm.in_window", return_value=False)
+    @patch("charm.fetch_sample")
+    @patch("charm.FalcoService")
+    def test_update_status_autotune_outside_window(
+        self, mock_service_class, mock_fetch_sample, _, mock_charm_dir, mock_falco_layout
+    ):
+        """Test update-status keeps the new preset pending outside the maintenance window."""
+        mock_service = MagicMock()
+        mock_service.fingerprint.return_value = None
+        mock_service_class.return_value = mock_service
+        mock_fetch_sample.side_effect = [
+            RingBufferSample(events=1000, drops=0),
+            RingBufferSample(events=2000, drops=100),
+        ]
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_in = ops.testing.State(config={"engine-buf-size-autotune": True})
+        state_out = context.run(context.on.update_status(), state_in)
+        state_out = context.run(context.on.update_status(), state_out)
+
+        mock_service.configure.assert_not_called()
+        with context(context.on.config_changed(), state_out) as manager:
+            assert manager.charm.autotune_state.pending_preset == 5
+            assert manager.charm.state.engine_buf_size_preset == 4
+
+    @patch("charm.fetch_sample")
+    @patch("charm.FalcoService")
+    def test_update_status_autotune_metrics_error(
+        self, mock_service_class, mock_fetch_sample, mock_charm_dir, mock_falco_layout
+    ):
+        """Test update-status skips the autotune when Falco metrics are unavailable."""
+        mock_service = MagicMock()
+        mock_service_class.return_value = mock_service
+        mock_fetch_sample.side_effect = MetricsError("Connection refused")
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_in = ops.testing.State(config={"engine-buf-size-autotune": True})
+        context.run(context.on.update_status(), state_in)
+
+        mock_service.configure.assert_not_called()
+
+
+class TestCharmOutputsQueueStatus:
+    """Test the outputs queue drops reported on update-status."""
+
+    @patch("charm.fetch_metrics")
+    @patch("charm.FalcoService")
+    def test_update_status_reports_outputs_queue_drops(
+        self, mock_service_class, mock_fetch_metrics, mock_charm_dir, mock_falco_layout
+    ):
+        """Test update-status reports the alerts dropped since the previous update."""
+        metric = "falcosecurity_falco_outputs_queue_num_drops_total"
+        mock_fetch_metrics.side_effect = [
+            parse_metrics(f"{metric} 0\n"),
+            parse_metrics(f"{metric} 40\n"),
+            parse_metrics(f"{metric} 40\n"),
+        ]
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_in = ops.testing.State(
+            config={"outputs-queue-capacity": 1000}, unit_status=ops.testing.ActiveStatus()
+        )
+        state_out = context.run(context.on.update_status(), state_in)
+        assert state_out.unit_status == ops.testing.ActiveStatus()
+
+        state_out = context.run(context.on.update_status(), state_out)
+        assert state_out.unit_status == ops.testing.ActiveStatus(
+            "Outputs queue dropped 40 alerts (capacity 1000)"
+        )
+
+        state_out = context.run(context.on.update_status(), state_out)
+        assert state_out.unit_status == ops.testing.ActiveStatus()
+
+    @patch("charm.fetch_metrics")
+    @patch("charm.FalcoService")
+    def test_update_status_keeps_blocked_status(
+        self, mock_service_class, mock_fetch_metrics, mock_charm_dir, mock_falco_layout
+    ):
+        """Test update-status does not report the outputs queue over a blocked status."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_in = ops.testing.State(unit_status=ops.testing.BlockedStatus("Failed"))
+        state_out = context.run(context.on.update_status(), state_in)
+
+        mock_fetch_metrics.assert_not_called()
+        assert state_out.unit_status == ops.testing.BlockedStatus("Failed")
+
+    @patch("charm.fetch_metrics")
+    @patch("charm.FalcoService")
+    def test_update_status_outputs_queue_metrics_error(
+        self, mock_service_class, mock_fetch_metrics, mock_charm_dir, mock_falco_layout
+    ):
+        """Test update-status keeps the status when Falco metrics are unavailable."""
+        mock_fetch_metrics.side_effect = MetricsError("Connection refused")
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_in = ops.testing.State(unit_status=ops.testing.ActiveStatus("Outputs queue"))
+        state_out = context.run(context.on.update_status(), state_in)
+
+        assert state_out.unit_status == ops.testing.ActiveStatus("Outputs queue")
+
+
+class TestCharmProfileRulesAction:
+    """Test the profile-rules action."""
+
+    @patch("charm.profile_rules")
+    @patch("charm.FalcoService")
+    def test_profile_rules(
+        self, mock_service_class, mock_profile_rules, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the action reports the most expensive rules."""
+        capture_file = mock_charm_dir / "capture.scap"
+        capture_file.touch()
+        mock_profile_rules.return_value = RulesProfile(
+            events=5000,
+            seconds=2.0,
+            events_per_second=2500.0,
+            rules=[
+                RuleCost(rule="Netcat Spawned", matches=0, seconds=0.75),
+                RuleCost(rule="Shell Spawned", matches=2, seconds=0.25),
+            ],
+        )
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        context.run(
+            context.on.action(
+                "profile-rules", params={"capture-file": str(capture_file), "top": 1}
+            ),
+            ops.testing.State(),
+        )
+
+        assert context.action_results == {
+            "events": 5000,
+            "seconds": 2.0,
+            "events-per-second": 2500.0,
+            "rules": '[{"rule": "Netcat Spawned", "matches": 0, "seconds": 0.75}]',
+        }
+        assert mock_profile_rules.call_args.args[2] == mock_falco_layout.rules_dir
+
+    @patch("charm.FalcoService")
+    def test_profile_rules_missing_capture(
+        self, mock_service_class, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the action fails when the capture file does not exist."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with pytest.raises(ops.testing.ActionFailed, match="does not exist"):
+            context.run(
+                context.on.action("profile-rules", params={"capture-file": "/nonexistent"}),
+                ops.testing.State(),
+            )
+
+    @patch("charm.CLONE_OUTPUT_DIR")
+    @patch("charm.FalcoService")
+    def test_profile_rules_repository_not_synced(
+        self, mock_service_class, mock_clone_dir, mock_charm_dir, mock_falco_layout, tmp_path
+    ):
+        """Test the action fails when no repository was synced."""
+        capture_file = mock_charm_dir / "capture.scap"
+        capture_file.touch()
+        mock_clone_dir.__truediv__.return_value = tmp_path / "missing"
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with pytest.raises(ops.testing.ActionFailed, match="No rules synced"):
+            context.run(
+                context.on.action(
+                    "profile-rules",
+                    params={"capture-file": str(capture_file), "rules-source": "repository"},
+                ),
+                ops.testing.State(),
+            )
+
+    @patch("charm.profile_rules")
+    @patch("charm.FalcoService")
+    def test_profile_rules_error(
+        self, mock_service_class, mock_profile_rules, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the action fails when Falco cannot replay the capture file."""
+        capture_file = mock_charm_dir / "capture.scap"
+        capture_file.touch()
+        mock_profile_rules.side_effect = ProfilingError("Falco failed to replay the capture")
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with pytest.raises(ops.testing.ActionFailed, match="failed to replay"):
+            context.run(
+                context.on.action("profile-rules", params={"capture-file": str(capture_file)}),
+                ops.testing.State(),
+            )
+
+
+class TestCharmCaptureAction:
+    """Test the capture action."""
+
+    @patch("charm.capture")
+    @patch("charm.FalcoService")
+    def test_capture(self, mock_service_class, mock_capture, mock_charm_dir, mock_falco_layout):
+        """Test the action reports the capture path and statistics."""
+        path = mock_falco_layout.captures_dir / "capture-20260101T000000Z_1.scap"
+        mock_capture.return_value = CaptureResult(
+            path=path, seconds=10.0, size=4096, events=1000, drops=3
+        )
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        context.run(context.on.action("capture", params={"size": 1}), ops.testing.State())
+
+        assert mock_capture.call_args.args[1:] == (10, 1024 * 1024)
+        assert context.action_results == {
+            "path": str(path),
+            "seconds": 10.0,
+            "size-bytes": 4096,
+            "events": 1000,
+            "drops": 3,
+        }
+
+    @patch("charm.capture")
+    @patch("charm.FalcoService")
+    def test_capture_error(
+        self, mock_service_class, mock_capture, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the action fails when Falco cannot record the capture."""
+        mock_capture.side_effect = CaptureError("Falco did not record any event")
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with pytest.raises(ops.testing.ActionFailed, match="did not record"):
+            context.run(context.on.action("capture"), ops.testing.State())
+
+
+class TestCharmRuleStatsAction:
+    """Test the rule-stats action."""
+
+    @patch("charm.time.monotonic", side_effect=[100.0, 130.0])
+    @patch("charm.time.sleep")
+    @patch("charm.fetch_metrics")
+    @patch("charm.FalcoService")
+    def test_rule_stats(
+        self,
+        mock_service_class,
+        mock_fetch_metrics,
+        mock_sleep,
+        _,
+        mock_charm_dir,
+        mock_falco_layout,
+    ):
+        """Test the action samples the rule counters over the window."""
+        metric = 'falcosecurity_falco_rules_matches_total{{priority="4",rule_name="Shell"}} {}\n'
+        mock_fetch_metrics.side_effect = [
+            parse_metrics(metric.format(10)),
+            parse_metrics(metric.format(70)),
+        ]
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        context.run(context.on.action("rule-stats", params={"window": 30}), ops.testing.State())
+
+        mock_sleep.assert_called_once_with(30)
+        assert context.action_results == {
+            "seconds": 30.0,
+            "matches": 60,
+            "rate": 2.0,
+            "priorities": '{"warning": 2.0}',
+            "rules": '[{"rule": "Shell", "priority": "warning", "matches": 60, "rate": 2.0}]',
+        }
+
+    @patch("charm.fetch_metrics")
+    @patch("charm.FalcoService")
+    def test_rule_stats_metrics_error(
+        self, mock_service_class, mock_fetch_metrics, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the action fails when the Falco metrics are unavailable."""
+        mock_fetch_metrics.side_effect = MetricsError("Connection refused")
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with pytest.raises(ops.testing.ActionFailed, match="Connection refused"):
+            context.run(context.on.action("rule-stats"), ops.testing.State())
+
+
+class TestCharmCompareBaseSyscallsAction:
+    """Test the compare-base-syscalls action."""
+
+    current = SyscallSets(rules=["execve"], final=["close", "execve", "read"])
+    repaired = SyscallSets(rules=["execve"], final=["close", "execve"])
+
+    @patch("charm.time.monotonic", side_effect=[100.0, 110.0])
+    @patch("charm.time.sleep")
+    @patch("charm.fetch_metrics")
+    @patch("charm.syscall_sets")
+    @patch("charm.FalcoService")
+    def test_compare_base_syscalls(
+        self,
+        mock_service_class,
+        mock_syscall_sets,
+        mock_fetch_metrics,
+        mock_sleep,
+        _,
+        mock_charm_dir,
+        mock_falco_layout,
+    ):
+        """Test the action compares the repaired empty custom set, with the removed rate."""
+        mock_syscall_sets.side_effect = [self.current, self.repaired]
+        metric = "falcosecurity_scap_libbpf_read_x_run_cnt_total {}\n"
+        mock_fetch_metrics.side_effect = [
+            parse_metrics(metric.format(100)),
+            parse_metrics(metric.format(600)),
+        ]
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        context.run(
+            context.on.action("compare-base-syscalls", params={"window": 10}),
+            ops.testing.State(),
+        )
+
+        mock_syscall_sets.assert_called_with(ANY, {"custom_set": [], "repair": True})
+        mock_sleep.assert_called_once_with(10)
+        assert context.action_results == {
+            "rules-syscalls": '["execve"]',
+            "current-syscalls": '["close", "execve", "read"]',
+            "repaired-syscalls": '["close", "execve"]',
+            "repaired-config": 'base-syscalls-custom-set="" base-syscalls-repair=true',
+            "removed-events-per-second": 50.0,
+            "unobserved-rules-syscalls": '["execve"]',
+        }
+
+    @patch("charm.fetch_metrics")
+    @patch("charm.syscall_sets")
+    @patch("charm.FalcoService")
+    def test_compare_base_syscalls_metrics_error(
+        self,
+        mock_service_class,
+        mock_syscall_sets,
+        mock_fetch_metrics,
+        mock_charm_dir,
+        mock_falco_layout,
+    ):
+        """Test the action still compares the syscall sets without the syscall rates."""
+        mock_syscall_sets.side_effect = [self.current, self.repaired]
+        mock_fetch_metrics.side_effect = MetricsError("Connection refused")
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        context.run(context.on.action("compare-base-syscalls"), ops.testing.State())
+
+        assert context.action_results == {
+            "rules-syscalls": '["execve"]',
+            "current-syscalls": '["close", "execve", "read"]',
+            "repaired-syscalls": '["close", "execve"]',
+            "repaired-config": 'base-syscalls-custom-set="" base-syscalls-repair=true',
+        }
+
+    @patch("charm.syscall_sets")
+    @patch("charm.FalcoService")
+    def test_compare_base_syscalls_error(
+        self, mock_service_class, mock_syscall_sets, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the action fails when Falco does not report its syscalls."""
+        mock_syscall_sets.side_effect = SyscallsError("Falco did not report the syscalls")
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with pytest.raises(ops.testing.ActionFailed, match="did not report"):
+            context.run(
+                context.on.action("compare-base-syscalls", params={"window": 0}),
+                ops.testing.State(),
+            )
+
+
+class TestCharmResourceUsageAction:
+    """Test the resource-usage action."""
+
+    @patch("charm.service_resources")
+    @patch("charm.FalcoService")
+    def test_resource_usage(
+        self, mock_service_class, mock_service_resources, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the action reports the Falco service limits and usage."""
+        mock_service_resources.return_value = ServiceResources(
+            limits={"cpu-quota-per-sec": "500ms"}, usage={"cpu-throttled-periods": 3}
+        )
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        context.run(context.on.action("resource-usage"), ops.testing.State())
+
+        mock_service_resources.assert_called_once_with("falco")
+        assert context.action_results == {
+            "limits": '{"cpu-quota-per-sec": "500ms"}',
+            "usage": '{"cpu-throttled-periods": 3}',
+        }
+
+    @patch("charm.service_resources")
+    @patch("charm.FalcoService")
+    def test_resource_usage_error(
+        self, mock_service_class, mock_service_resources, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the action fails when systemd does not report the service resources."""
+        mock_service_resources.side_effect = ResourcesError("Failed to show falco")
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with pytest.raises(ops.testing.ActionFailed, match="Failed to show"):
+            context.run(context.on.action("resource-usage"), ops.testing.State())
+
+
+class TestCharmPlugins:
+    """Test the plugins selection."""
+
+    @patch("charm.detect_plugins", return_value=["container"])
+    @patch("charm.FalcoService")
+    def test_auto_plugins_detected_at_install(
+        self, mock_service_class, mock_detect_plugins, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the plugins detected at install are loaded when plugins is auto."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.install(), ops.testing.State())
+
+        mock_detect_plugins.return_value = ["json", "k8saudit", "container"]
+        with context(context.on.update_status(), state_out) as manager:
+            assert manager.charm.state.plugins == ["container"]
+
+    @patch("charm.detect_plugins", return_value=["container"])
+    @patch("charm.FalcoService")
+    def test_auto_plugins_kept_at_upgrade(
+        self, mock_service_class, mock_detect_plugins, mock_charm_dir, mock_falco_layout
+    ):
+        """Test upgrades keep the loaded plugins and add the newly detected ones."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.install(), ops.testing.State())
+
+        mock_detect_plugins.return_value = ["json", "k8saudit"]
+        state_out = context.run(context.on.upgrade_charm(), state_out)
+        mock_detect_plugins.return_value = []
+        with context(context.on.upgrade_charm(), state_out) as manager:
+            manager.run()
+            assert manager.charm.state.plugins == ["json", "k8saudit", "container"]
+
+    @patch("charm.detect_plugins", return_value=["container"])
+    @patch("charm.FalcoService")
+    def test_auto_plugins_upgrade_from_all_plugins(
+        self, mock_service_class, mock_detect_plugins, mock_charm_dir, mock_falco_layout
+    ):
+        """Test upgrading a unit deployed before the detection keeps loading all the plugins."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with context(context.on.upgrade_charm(), ops.testing.State()) as manager:
+            manager.run()
+            assert manager.charm.state.plugins == ["json", "k8saudit", "container"]
+
+    @patch("charm.detect_plugins", return_value=[])
+    @patch("charm.FalcoService")
+    def test_listed_plugins(
+        self, mock_service_class, mock_detect_plugins, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the listed plugins are loaded regardless of the detection."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.install(), ops.testing.State())
+
+        state_in = dataclasses.replace(state_out, config={"plugins": "json,container"})
+        with context(context.on.update_status(), state_in) as manager:
+            assert manager.charm.state.plugins == ["json", "container"]
+
+    @patch("charm.detect_plugins", return_value=[])
+    @patch("charm.FalcoService")
+    def test_ruleset_plugins(
+        self, mock_service_class, mock_detect_plugins, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the plugins the selected default rulesets need are loaded with them."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.install(), ops.testing.State())
+
+        state_in = dataclasses.replace(state_out, config={"rulesets": "stable,k8saudit"})
+        with context(context.on.update_status(), state_in) as manager:
+            assert manager.charm.state.plugins == ["container", "json", "k8saudit"]
+
+    @patch("charm.detect_container_engines", return_value={"docker": ["/run/docker.sock"]})
+    @patch("charm.detect_plugins", return_value=["container"])
+    @patch("charm.FalcoService")
+    def test_container_engines(
+        self,
+        mock_service_class,
+        mock_detect_plugins,
+        mock_detect_container_engines,
+        mock_charm_dir,
+        mock_falco_layout,
+    ):
+        """Test the container engines are detected at install unless they are listed."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.install(), ops.testing.State())
+
+        with context(context.on.update_status(), state_out) as manager:
+            assert manager.charm.state.container_engines == {"docker": ["/run/docker.sock"]}
+
+        state_in = dataclasses.replace(
+            state_out,
+            config={
+                "container-engines": "containerd,lxc",
+                "container-sockets": "containerd=/run/k3s/containerd/containerd.sock",
+            },
+        )
+        with context(context.on.update_status(), state_in) as manager:
+            assert manager.charm.state.container_engines == {
+                "containerd": ["/run/k3s/containerd/containerd.sock"],
+                "lxc": [],
+            }
+
+    @patch("charm.detect_container_engines", return_value={"docker": ["/run/docker.sock"]})
+    @patch("charm.detect_plugins", return_value=["container"])
+    @patch("charm.FalcoService")
+    def test_container_engines_kept_at_upgrade(
+        self,
+        mock_service_class,
+        mock_detect_plugins,
+        mock_detect_container_engines,
+        mock_charm_dir,
+        mock_falco_layout,
+    ):
+        """Test upgrades keep the enabled container engines and add the newly detected ones."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_out = context.run(context.on.install(), ops.testing.State())
+
+        # The docker socket is briefly missing while containerd and lxc are detected
+        mock_detect_container_engines.return_value = {
+            "containerd": ["/run/containerd/containerd.sock"],
+            "lxc": [],
+        }
+        with context(context.on.upgrade_charm(), state_out) as manager:
+            manager.run()
+            assert manager.charm.state.container_engines == {
+                "docker": ["/run/docker.sock"],
+                "containerd": ["/run/containerd/containerd.sock"],
+                "lxc": [],
+            }
+
+    @patch("charm.detect_container_engines", return_value={})
+    @patch("charm.detect_plugins", return_value=["container"])
+    @patch("charm.FalcoService")
+    def test_container_engines_upgrade_from_all_engines(
+        self,
+        mock_service_class,
+        mock_detect_plugins,
+        mock_detect_container_engines,
+        mock_charm_dir,
+        mock_falco_layout,
+    ):
+        """Test upgrading a unit deployed before the detection keeps all the container engines."""
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+
+        with context(context.on.upgrade_charm(), ops.testing.State()) as manager:
+            manager.run()
+            assert manager.charm.state.container_engines == {
+                engine: list(sockets) for engine, sockets in CONTAINER_ENGINES.items()
+            }
+
+
 class TestCharmWithHttpEndpointRelation:
     """Test Charm behavior with HTTP endpoint relation."""
 
+    @patch("charm.FalcoRelay")
     @patch("charm.FalcoService")
     def test_charm_with_http_endpoint_relation(
-        self, mock_service_class, mock_charm_dir, mock_falco_layout, http_endpoint_relation
+        self,
+        mock_service_class,
+        mock_relay_class,
+        mock_charm_dir,
+        mock_falco_layout,
+        http_endpoint_relation,
     ):
         """Test charm behavior when HTTP endpoint relation is present.
 
@@ -294,6 +992,7 @@ class TestCharmWithHttpEndpointRelation:
         """
         mock_service = MagicMock()
         mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
         mock_service_class.return_value = mock_service
 
         context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
@@ -306,11 +1005,83 @@ class TestCharmWithHttpEndpointRelation:
             # Verify charm retrieved http endpoint data from relation
             assert charm_state.http_output is not None
             assert charm_state.http_output["url"] == "http://127.0.0.1:8080/"
+            assert charm_state.http_output_keep_alive is True
+            # The endpoint does not advertise it accepts compressed bodies
+            assert charm_state.http_output_compress_uploads is False
+            assert charm_state.http_output_ca_cert is None
             assert state_out.unit_status == ops.testing.ActiveStatus()
+            mock_relay_class.return_value.configure.assert_called_once_with(
+                charm_state, restart=False
+            )
+            mock_relay_class.needed.return_value = True
+            assert mgr.charm._relay_scrape_configs() == [
+                {"metrics_path": "/metrics", "static_configs": [{"targets": ["localhost:8766"]}]}
+            ]
+
+    @patch("charm.FalcoRelay")
+    @patch("charm.FalcoService")
+    def test_charm_relay_token(
+        self, mock_service_class, mock_relay_class, mock_charm_dir, mock_falco_layout
+    ):
+        """Test the secret URL path of the relay is generated once and kept across hooks."""
+        mock_service_class.return_value.fingerprint.return_value = "fingerprint"
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
 
+        with context(context.on.config_changed(), ops.testing.State()) as mgr:
+            state_out = mgr.run()
+            relay_token = mgr.charm.state.relay_token
+        with context(context.on.config_changed(), state_out) as mgr:
+            mgr.run()
+            assert mgr.charm.state.relay_token == relay_token
+
+        assert len(relay_token) >= 32
+        assert relay_token not in repr(mgr.charm.state)
+
+    @pytest.mark.parametrize(
+        "compress_uploads,expected",
+        [(True, True), (False, False)],
+    )
+    @patch("charm.FalcoRelay")
+    @patch("charm.FalcoService")
+    def test_charm_with_compressing_http_endpoint_relation(
+        self,
+        mock_service_class,
+        mock_relay_class,
+        mock_charm_dir,
+        mock_falco_layout,
+        http_endpoint_relation,
+        compress_uploads,
+        expected,
+    ):
+        """Test the uploads are compressed when the HTTP endpoint accepts compressed bodies.
+
+        Arrange: Set up an HTTP endpoint relation advertising compression and a CA certificate.
+        Act: Run config changed event.
+        Assert: Uploads are compressed unless disabled, and the CA certificate is retrieved.
+        """
+        mock_service = MagicMock()
+        mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
+        mock_service_class.return_value = mock_service
+        http_endpoint_relation.remote_app_data.update({"compression": "true", "ca_cert": '"PEM"'})
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_in = ops.testing.State(
+            relations=[http_endpoint_relation],
+            config={"http-output-compress-uploads": compress_uploads},
+        )
+
+        with context(context.on.config_changed(), state_in) as mgr:
+            mgr.run()
+            charm_state = mgr.charm.state
+
+            assert charm_state.http_output_compress_uploads is expected
+            assert charm_state.http_output_ca_cert == "PEM"
+
+    @patch("charm.FalcoRelay")
     @patch("charm.FalcoService")
     def test_charm_without_http_endpoint_relation(
-        self, mock_service_class, mock_charm_dir, mock_falco_layout
+        self, mock_service_class, mock_relay_class, mock_charm_dir, mock_falco_layout
     ):
         """Test charm behavior when HTTP endpoint relation is present.
 
@@ -320,6 +1091,7 @@ class TestCharmWithHttpEndpointRelation:
         """
         mock_service = MagicMock()
         mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
         mock_service_class.return_value = mock_service
 
         context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
@@ -332,3 +1104,38 @@ class TestCharmWithHttpEndpointRelation:
             # Verify charm does notretrieved http endpoint data from relation
             assert charm_state.http_output == {}
             assert state_out.unit_status == ops.testing.ActiveStatus()
+            mock_relay_class.needed.return_value = False
+            assert mgr.charm._relay_scrape_configs() == []
+
+    @patch("charm.FalcoRelay")
+    @patch("charm.FalcoService")
+    def test_charm_with_http_output_not_selected(
+        self,
+        mock_service_class,
+        mock_relay_class,
+        mock_charm_dir,
+        mock_falco_layout,
+        http_endpoint_relation,
+    ):
+        """Test the HTTP endpoint relation is ignored when the http output is not selected.
+
+        Arrange: Set up an HTTP endpoint relation and only select the file output.
+        Act: Run config changed event.
+        Assert: The charm state has no HTTP output.
+        """
+        mock_service = MagicMock()
+        mock_service.check_active.return_value = True
+        mock_service.fingerprint.return_value = "fingerprint"
+        mock_service_class.return_value = mock_service
+
+        context = ops.testing.Context(charm_type=Falco, charm_root=mock_charm_dir)
+        state_in = ops.testing.State(
+            relations=[http_endpoint_relation], config={"outputs": "file"}
+        )
+
+        with context(context.on.config_changed(), state_in) as mgr:
+            mgr.run()
+            charm_state = mgr.charm.state
+
+            assert charm_state.outputs == ["file"]
+            assert charm_state.http_output == {}
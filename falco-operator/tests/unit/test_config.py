@@ -17,6 +17,22 @@ class TestCharmConfig:
         config = CharmConfig()
         assert config.custom_config_repository is None
         assert config.custom_config_repo_ssh_key is None
+        assert config.engine_buf_size_preset == 4
+        assert config.engine_cpus_for_each_buffer == 2
+        assert config.engine_drop_failed_exit is False
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {"engine_buf_size_preset": -1},
+            {"engine_buf_size_preset": 11},
+            {"engine_cpus_for_each_buffer": -1},
+        ],
+    )
+    def test_init_with_invalid_engine(self, options):
+        """Test initialization with out of range ring buffer sizing."""
+        with pytest.raises(ValidationError):
+            CharmConfig(**options)
 
     def test_init_with_values(self):
         """Test initialization with values."""
@@ -50,3 +66,158 @@ class TestCharmConfig:
         """Test initialization with invalid URL."""
         with pytest.raises(InvalidCharmConfigError):
             CharmConfig(custom_config_repository="git+ssh://github.com/owner/repo.git")
+
+    @pytest.mark.parametrize("window", ["", "02:00-04:00", "22:30-01:00"])
+    def test_init_with_valid_autotune_window(self, window):
+        """Test initialization with valid autotune maintenance windows."""
+        config = CharmConfig(engine_buf_size_autotune_window=window)
+        assert config.engine_buf_size_autotune_window == window
+
+    @pytest.mark.parametrize("window", ["02:00", "2:00-4:00", "02:00-25:00", "night"])
+    def test_init_with_invalid_autotune_window(self, window):
+        """Test initialization with malformed autotune maintenance windows."""
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(engine_buf_size_autotune_window=window)
+
+    def test_init_with_inverted_autotune_bounds(self):
+        """Test initialization with the autotune lower bound above the upper bound."""
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(engine_buf_size_preset_min=6, engine_buf_size_preset_max=5)
+
+    def test_init_with_metrics_counters(self):
+        """Test initialization with a comma separated list of metrics counters."""
+        config = CharmConfig(metrics_counters="rules_counters, jemalloc_stats,")
+        assert config.metrics_counters == ["rules_counters", "jemalloc_stats"]
+
+    def test_init_with_unknown_metrics_counters(self):
+        """Test initialization with an unknown metrics counter."""
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(metrics_counters="rules_counters,syscall_counters")
+
+    @pytest.mark.parametrize("interval", ["1h", "15m", "1h30m", "500ms"])
+    def test_init_with_valid_metrics_interval(self, interval):
+        """Test initialization with valid metrics intervals."""
+        assert CharmConfig(metrics_interval=interval).metrics_interval == interval
+
+    @pytest.mark.parametrize("interval", ["", "1", "hourly", "1 h"])
+    def test_init_with_invalid_metrics_interval(self, interval):
+        """Test initialization with malformed metrics intervals."""
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(metrics_interval=interval)
+
+    @pytest.mark.parametrize(
+        "plugins,expected",
+        [
+            ("auto", "auto"),
+            ("container", ["container"]),
+            ("json, k8saudit", ["json", "k8saudit"]),
+            ("", []),
+        ],
+    )
+    def test_init_with_plugins(self, plugins, expected):
+        """Test initialization with auto detected or listed plugins."""
+        assert CharmConfig(plugins=plugins).plugins == expected
+
+    def test_init_with_unknown_plugins(self):
+        """Test initialization with an unknown plugin."""
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(plugins="container,gvisor")
+
+    @pytest.mark.parametrize(
+        "engines,expected",
+        [
+            ("auto", "auto"),
+            ("containerd", ["containerd"]),
+            ("docker, lxc", ["docker", "lxc"]),
+        ],
+    )
+    def test_init_with_container_engines(self, engines, expected):
+        """Test initialization with auto detected or listed container engines."""
+        assert CharmConfig(container_engines=engines).container_engines == expected
+
+    def test_init_with_unknown_container_engines(self):
+        """Test initialization with an unknown container engine."""
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(container_engines="containerd,rkt")
+
+    def test_init_with_container_sockets(self):
+        """Test initialization with container engine sockets overrides."""
+        charm_config = CharmConfig(
+            container_sockets="containerd=/run/a.sock, containerd=/run/b.sock,docker=/run/d.sock"
+        )
+        assert charm_config.container_sockets == {
+            "containerd": ["/run/a.sock", "/run/b.sock"],
+            "docker": ["/run/d.sock"],
+        }
+        assert CharmConfig(container_sockets="").container_sockets == {}
+
+    @pytest.mark.parametrize(
+        "sockets", ["containerd", "containerd=run/a.sock", "lxc=/run/a.sock", "rkt=/run/a.sock"]
+    )
+    def test_init_with_invalid_container_sockets(self, sockets):
+        """Test initialization with malformed container engine sockets."""
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(container_sockets=sockets)
+
+    def test_init_with_container_hooks(self):
+        """Test initialization with listed and unknown container hooks."""
+        assert CharmConfig(container_hooks="create, start").container_hooks == ["create", "start"]
+        assert CharmConfig(container_hooks="").container_hooks == []
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(container_hooks="create,stop")
+
+    def test_init_with_outputs(self):
+        """Test initialization with listed, missing and unknown output channels."""
+        assert CharmConfig().outputs == ["http"]
+        assert CharmConfig(outputs="http, file").outputs == ["http", "file"]
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(outputs="")
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(outputs="http,kafka")
+
+    def test_init_with_rules(self):
+        """Test initialization with rulesets, rule selectors and priority."""
+        config = CharmConfig(
+            rulesets="stable, sandbox",
+            rules_disable="tag:network,Terminal shell in container",
+            priority="warning",
+        )
+        assert config.rulesets == ["stable", "sandbox"]
+        assert config.rules_disable == ["tag:network", "Terminal shell in container"]
+        assert config.rules_enable == []
+        assert config.priority == "warning"
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(rulesets="stable,experimental")
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(rules_enable="tag:")
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(priority="info")
+
+    def test_init_with_base_syscalls(self):
+        """Test initialization with a base syscalls custom set."""
+        config = CharmConfig(base_syscalls_custom_set="clone3, !read", base_syscalls_repair=True)
+        assert config.base_syscalls_custom_set == ["clone3", "!read"]
+        assert config.base_syscalls_repair
+        assert CharmConfig().base_syscalls_custom_set == []
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(base_syscalls_custom_set="open at")
+
+    def test_init_with_resource_controls(self):
+        """Test initialization with the Falco service resource controls."""
+        config = CharmConfig(cpu_quota=150, memory_max=512, cpu_affinity="0-3, 8", nice=-5)
+        assert config.cpu_quota == 150
+        assert config.memory_max == 512
+        assert config.cpu_affinity == ["0-3", "8"]
+        assert config.nice == -5
+        assert CharmConfig().cpu_affinity == []
+        with pytest.raises(InvalidCharmConfigError):
+            CharmConfig(cpu_affinity="0-3,all")
+
+    @pytest.mark.parametrize(
+        "options",
+        [{"cpu_quota": -1}, {"nice": 20}, {"cpu_weight": 10001}, {"io_weight": -1}],
+    )
+    def test_init_with_invalid_resource_controls(self, options):
+        """Test initialization with out of range resource controls."""
+        with pytest.raises(ValidationError):
+            CharmConfig(**options)
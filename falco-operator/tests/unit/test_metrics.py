@@ -0,0 +1,114 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for metrics module."""
+
+import urllib.error
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from metrics import (
+    MetricSample,
+    MetricsError,
+    RuleRate,
+    fetch_metrics,
+    outputs_queue_drops,
+    parse_metrics,
+    rule_stats,
+)
+
+RULE_METRICS = """\
+# HELP falcosecurity_falco_rules_matches_total https://falco.org/docs/metrics/
+# TYPE falcosecurity_falco_rules_matches_total counter
+falcosecurity_falco_rules_matches_total{{priority="4",rule_name="Shell Spawned",source="syscall"}} {shell}
+falcosecurity_falco_rules_matches_total{{priority="6",rule_name="Read Sensitive File",source="syscall"}} {read}
+falcosecurity_falco_rules_matches_total{{priority="4",rule_name="Netcat Spawned",source="syscall"}} {netcat}
+"""
+
+
+class TestParseMetrics:
+    """Test the Prometheus metrics parsing."""
+
+    def test_parse_metrics(self):
+        """Test parsing samples with and without labels."""
+        text = '# TYPE m counter\nm_total{a="1",b="x y"} 3\nup 1\nbroken line\n'
+
+        assert parse_metrics(text) == [
+            MetricSample(name="m_total", labels={"a": "1", "b": "x y"}, value=3.0),
+            MetricSample(name="up", labels={}, value=1.0),
+        ]
+
+    @patch("metrics.urllib.request.urlopen")
+    def test_fetch_metrics(self, mock_urlopen):
+        """Test fetching the metrics from the Falco webserver."""
+        response = MagicMock()
+        response.read.return_value = b"up 1\n"
+        mock_urlopen.return_value.__enter__.return_value = response
+
+        assert fetch_metrics(8765) == [MetricSample(name="up", labels={}, value=1.0)]
+        assert mock_urlopen.call_args.args[0] == "http://127.0.0.1:8765/metrics"
+
+    @patch("metrics.urllib.request.urlopen")
+    def test_fetch_metrics_error(self, mock_urlopen):
+        """Test fetching the metrics when Falco is not listening."""
+        mock_urlopen.side_effect = urllib.error.URLError("Connection refused")
+
+        with pytest.raises(MetricsError):
+            fetch_metrics(8765)
+
+
+class TestRuleStats:
+    """Test rule_stats function."""
+
+    def test_rule_stats(self):
+        """Test rules and priorities are ranked by match rate over the window."""
+        before = parse_metrics(RULE_METRICS.format(shell=10, read=100, netcat=5))
+        after = parse_metrics(RULE_METRICS.format(shell=30, read=400, netcat=5))
+
+        stats = rule_stats(before, after, 10.0)
+
+        assert stats.matches == 320
+        assert stats.rate == 32.0
+        assert stats.rules == [
+            RuleRate(rule="Read Sensitive File", priority="informational", matches=300, rate=30.0),
+            RuleRate(rule="Shell Spawned", priority="warning", matches=20, rate=2.0),
+        ]
+        assert list(stats.priorities.items()) == [("informational", 30.0), ("warning", 2.0)]
+
+    def test_rule_stats_new_rule_and_restart(self):
+        """Test rules first matched in the window and counters reset by a restart."""
+        before = parse_metrics(
+            RULE_METRICS.format(shell=50, read=0, netcat=0)[:-1].rsplit("\n", 2)[0]
+        )
+        after = parse_metrics(RULE_METRICS.format(shell=5, read=7, netcat=0))
+
+        stats = rule_stats(before, after, 1.0)
+
+        assert [(rule.rule, rule.matches) for rule in stats.rules] == [
+            ("Read Sensitive File", 7),
+            ("Shell Spawned", 5),
+        ]
+
+    def test_rule_stats_without_counters(self):
+        """Test the stats are empty when Falco reports no rule counters."""
+        stats = rule_stats([], [], 60.0)
+
+        assert stats.matches == 0
+        assert stats.rules == []
+        assert stats.priorities == {}
+
+
+class TestOutputsQueueDrops:
+    """Test the outputs queue drops extraction."""
+
+    def test_outputs_queue_drops(self):
+        """Test the outputs queue drops counter is read from the metrics."""
+        samples = parse_metrics("falcosecurity_falco_outputs_queue_num_drops_total 12\nup 1\n")
+
+        assert outputs_queue_drops(samples) == 12
+
+    def test_outputs_queue_drops_missing(self):
+        """Test an error is raised when Falco does not report the counter."""
+        with pytest.raises(MetricsError):
+            outputs_queue_drops(parse_metrics("up 1\n"))
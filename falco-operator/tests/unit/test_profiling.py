@@ -0,0 +1,175 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for profiling module."""
+
+import json
+import subprocess
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+import yaml
+
+from profiling import ProfilingError, RuleCost, _list_rules, profile_rules
+
+RULES = """\
+- macro: spawned_process
+  condition: evt.type = execve
+- rule: Shell Spawned
+  desc: A shell was spawned
+  condition: spawned_process and proc.name = bash
+  output: Shell spawned
+  priority: WARNING
+- rule: Netcat Spawned
+  desc: Netcat was spawned
+  condition: spawned_process and proc.name = nc
+  output: Netcat spawned
+  priority: WARNING
+- rule: Shell Spawned
+  override:
+    condition: append
+  condition: and user.name = root
+"""
+
+
+def _alert(rule):
+    """Build a Falco JSON alert line."""
+    return json.dumps({"rule": rule, "priority": "Warning", "output": rule})
+
+
+@pytest.fixture
+def rules_dirs(mock_falco_layout):
+    """Write a rules file and a managed config file for the replays."""
+    (mock_falco_layout.rules_dir / "custom.yaml").write_text(RULES)
+    mock_falco_layout.config_file.write_text(yaml.safe_dump({"engine": {"kind": "modern_ebpf"}}))
+    return mock_falco_layout.rules_dir, mock_falco_layout.configs_dir
+
+
+class TestProfileRules:
+    """Test profile_rules function."""
+
+    def test_list_rules(self, rules_dirs):
+        """Test listing the rule definitions, ignoring macros and overrides."""
+        rules_dir, _ = rules_dirs
+
+        assert _list_rules([rules_dir]) == ["Shell Spawned", "Netcat Spawned"]
+
+    def test_list_rules_invalid_yaml(self, tmp_path):
+        """Test listing the rules of an invalid rules file."""
+        (tmp_path / "broken.yaml").write_text("- rule: [")
+
+        with pytest.raises(ProfilingError):
+            _list_rules([tmp_path])
+
+    @patch("profiling.time.monotonic")
+    @patch("profiling.subprocess.run")
+    def test_profile_rules(self, mock_run, mock_monotonic, mock_falco_layout, rules_dirs):
+        """Test the rules are ranked by the replay time they add over the empty ruleset."""
+        rules_dir, configs_dir = rules_dirs
+        capture_file = mock_falco_layout.home / "capture.scap"
+        replay_configs = []
+
+        def run(cmd, **_):
+            replay_configs.append(yaml.safe_load(Path(cmd[2]).read_text()))
+            stdout = "\n".join([_alert("Shell Spawned"), _alert("Shell Spawned"), "done"])
+            return MagicMock(stdout=stdout, stderr="Captured Events: 5000\n")
+
+        mock_run.side_effect = run
+        # Full replay, empty ruleset, Shell Spawned alone, Netcat Spawned alone
+        mock_monotonic.side_effect = [0.0, 2.0, 0.0, 1.0, 0.0, 1.25, 0.0, 1.75]
+
+        profile = profile_rules(mock_falco_layout, capture_file, rules_dir, configs_dir)
+
+        assert profile.events == 5000
+        assert profile.seconds == 2.0
+        assert profile.events_per_second == 2500.0
+        assert profile.rules == [
+            RuleCost(rule="Netcat Spawned", matches=0, seconds=0.75),
+            RuleCost(rule="Shell Spawned", matches=2, seconds=0.25),
+        ]
+        assert "rules" not in replay_configs[0]
+        assert replay_configs[1]["rules"] == [{"disable": {"rule": "*"}}]
+        assert replay_configs[2]["rules"] == [
+            {"disable": {"rule": "*"}},
+            {"enable": {"rule": "Shell Spawned"}},
+        ]
+
+    @patch("profiling.subprocess.run")
+    def test_profile_rules_conflicting_override(self, mock_run, mock_falco_layout, rules_dirs):
+        """Test the replay settings take precedence over conflicting config overrides."""
+        rules_dir, configs_dir = rules_dirs
+        (configs_dir / "override.yaml").write_text(
+            yaml.safe_dump(
+                {
+                    "engine": {"kind": "modern_ebpf"},
+                    "http_output": {"enabled": True, "url": "http://10.0.0.1:2801/"},
+                }
+            )
+        )
+        capture_file = mock_falco_layout.home / "capture.scap"
+        replays = []
+
+        def run(cmd, **_):
+            options = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-o"]
+            replays.append((yaml.safe_load(Path(cmd[2]).read_text()), options))
+            return MagicMock(stdout="", stderr="")
+
+        mock_run.side_effect = run
+
+        profile_rules(mock_falco_layout, capture_file, rules_dir, configs_dir)
+
+        assert replays
+        for replay_config, options in replays:
+            assert replay_config["config_files"] == [str(configs_dir)]
+            assert "engine.kind=replay" in options
+            assert f"engine.replay.capture_file={capture_file}" in options
+            assert "http_output.enabled=false" in options
+            assert "program_output.enabled=false" in options
+
+    @patch("profiling.subprocess.run")
+    def test_profile_rules_deployed_rulesets(self, mock_run, mock_falco_layout, rules_dirs):
+        """Test the selected default rulesets and rule selectors are replayed and profiled."""
+        _, configs_dir = rules_dirs
+        default_rules = mock_falco_layout.default_rules_dir / "falco_rules.yaml"
+        default_rules.write_text(
+            "- rule: Default Rule\n  condition: evt.type = open\n  output: x\n  priority: INFO\n"
+        )
+        selectors = [{"disable": {"tag": "network"}}]
+        mock_falco_layout.config_file.write_text(
+            yaml.safe_dump(
+                {
+                    "rules_files": [str(default_rules), str(mock_falco_layout.rules_dir)],
+                    "rules": selectors,
+                }
+            )
+        )
+        repository_rules_dir = mock_falco_layout.home / "repository"
+        repository_rules_dir.mkdir()
+        replay_configs = []
+
+        def run(cmd, **_):
+            replay_configs.append(yaml.safe_load(Path(cmd[2]).read_text()))
+            return MagicMock(stdout="", stderr="")
+
+        mock_run.side_effect = run
+
+        profile = profile_rules(
+            mock_falco_layout, mock_falco_layout.home, repository_rules_dir, configs_dir
+        )
+
+        assert [cost.rule for cost in profile.rules] == ["Default Rule"]
+        assert replay_configs[0]["rules_files"] == [str(default_rules), str(repository_rules_dir)]
+        assert replay_configs[0]["rules"] == selectors
+        assert replay_configs[0]["config_files"] == [str(configs_dir)]
+
+    @patch("profiling.subprocess.run")
+    def test_profile_rules_replay_error(self, mock_run, mock_falco_layout, rules_dirs):
+        """Test a failing replay raises a ProfilingError."""
+        rules_dir, configs_dir = rules_dirs
+        mock_run.side_effect = subprocess.CalledProcessError(
+            1, "falco", stderr="Could not open capture"
+        )
+
+        with pytest.raises(ProfilingError, match="Could not open capture"):
+            profile_rules(mock_falco_layout, mock_falco_layout.home, rules_dir, configs_dir)
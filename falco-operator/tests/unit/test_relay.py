@@ -0,0 +1,177 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for relay module."""
+
+from unittest.mock import MagicMock, patch
+
+from relay import RELAY_SERVICE_NAME, FalcoRelay, FalcoRelayServiceFile
+from state import CharmState
+
+
+def _mock_service_file(token_file, installed=True, exists=True):
+    """Create a mock relay service file."""
+    service_file = MagicMock()
+    service_file.token_file = token_file
+    service_file.service_name = RELAY_SERVICE_NAME
+    service_file.context = {}
+    service_file.install.return_value = installed
+    service_file.destination.exists.return_value = exists
+    return service_file
+
+
+class TestFalcoRelayServiceFile:
+    """Test the relay service file."""
+
+    def test_render(self, mock_charm_dir, mock_falco_layout, tmp_path):
+        """Test the relay service file runs the relay script with the relay settings."""
+        charm = MagicMock()
+        charm.charm_dir = mock_charm_dir
+        with patch.object(FalcoRelayServiceFile, "service_file", tmp_path / "falco-relay.service"):
+            service_file = FalcoRelayServiceFile(mock_falco_layout, charm)
+        service_file.context.update(
+            {
+                "upstream": "https://10.0.0.1:2801/",
+                "spool_max_bytes": 1024,
+                "with_ca_cert": True,
+                "compress": True,
+            }
+        )
+
+        assert service_file.install()
+
+        content = service_file.destination.read_text()
+        assert f'{mock_charm_dir}/src/relay_server.py" --listen-port 8766' in content
+        assert '--upstream "https://10.0.0.1:2801/"' in content
+        assert f'--spool-dir "{mock_falco_layout.relay_spool_dir}"' in content
+        assert f'--token-file "{mock_falco_layout.relay_token_file}"' in content
+        assert f'--ca-cert "{mock_falco_layout.http_output_ca_cert}" --compress' in content
+
+    def test_render_quoted(self, mock_charm_dir, mock_falco_layout, tmp_path):
+        """Test the relay arguments are quoted for systemd and not HTML escaped."""
+        charm = MagicMock()
+        charm.charm_dir = mock_charm_dir
+        with patch.object(FalcoRelayServiceFile, "service_file", tmp_path / "falco-relay.service"):
+            service_file = FalcoRelayServiceFile(mock_falco_layout, charm)
+        service_file.context.update(
+            {
+                "upstream": 'https://10.0.0.1:2801/?a=1&b=%41"$c',
+                "spool_max_bytes": 1024,
+                "with_ca_cert": False,
+                "compress": False,
+            }
+        )
+
+        assert service_file.install()
+
+        content = service_file.destination.read_text()
+        assert '--upstream "https://10.0.0.1:2801/?a=1&b=%%41\\"$$c" --spool-dir' in content
+
+
+class TestFalcoRelay:
+    """Test the relay manager."""
+
+    @patch("relay.systemd")
+    def test_configure(self, mock_systemd, tmp_path):
+        """Test the relay is installed and restarted towards the HTTP endpoint."""
+        service_file = _mock_service_file(tmp_path / "relay.token")
+        relay = FalcoRelay(service_file)
+
+        relay.configure(
+            CharmState(
+                http_output={"url": "https://10.0.0.1:2801/"},
+                http_output_ca_cert="PEM",
+                relay_spool_max_size=2,
+                relay_token="secret",
+            )
+        )
+
+        assert service_file.context == {
+            "upstream": "https://10.0.0.1:2801/",
+            "spool_max_bytes": 2 * 1024 * 1024,
+            "with_ca_cert": True,
+            "compress": False,
+        }
+        mock_systemd.daemon_reload.assert_called_once()
+        mock_systemd.service_enable.assert_called_once_with(RELAY_SERVICE_NAME)
+        mock_systemd.service_restart.assert_called_once_with(RELAY_SERVICE_NAME)
+        assert (tmp_path / "relay.token").read_text() == "secret"
+        assert (tmp_path / "relay.token").stat().st_mode & 0o777 == 0o600
+
+    @patch("relay.systemd")
+    def test_configure_unchanged(self, mock_systemd, tmp_path):
+        """Test the relay is only restarted when it stopped."""
+        (tmp_path / "relay.token").write_text("secret")
+        mock_systemd.service_running.side_effect = [True, False]
+        relay = FalcoRelay(_mock_service_file(tmp_path / "relay.token", installed=False))
+        charm_state = CharmState(
+            http_output={"url": "http://10.0.0.1:2801/"}, relay_token="secret"
+        )
+
+        relay.configure(charm_state)
+        mock_systemd.service_restart.assert_not_called()
+
+        relay.configure(charm_state)
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_restart.assert_called_once_with(RELAY_SERVICE_NAME)
+
+    @patch("relay.systemd")
+    def test_configure_token_changed(self, mock_systemd, tmp_path):
+        """Test the running relay is restarted when its secret URL path changes."""
+        (tmp_path / "relay.token").write_text("old")
+        mock_systemd.service_running.return_value = True
+        relay = FalcoRelay(_mock_service_file(tmp_path / "relay.token", installed=False))
+
+        relay.configure(
+            CharmState(http_output={"url": "http://10.0.0.1:2801/"}, relay_token="new")
+        )
+
+        mock_systemd.service_restart.assert_called_once_with(RELAY_SERVICE_NAME)
+        assert (tmp_path / "relay.token").read_text() == "new"
+
+    @patch("relay.systemd")
+    def test_configure_restart(self, mock_systemd, tmp_path):
+        """Test the running relay is restarted when requested even though nothing changed."""
+        mock_systemd.service_running.return_value = True
+        (tmp_path / "relay.token").write_text("secret")
+        relay = FalcoRelay(_mock_service_file(tmp_path / "relay.token", installed=False))
+        charm_state = CharmState(
+            http_output={"url": "http://10.0.0.1:2801/"}, relay_token="secret"
+        )
+
+        relay.configure(charm_state, restart=True)
+
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_restart.assert_called_once_with(RELAY_SERVICE_NAME)
+
+    @patch("relay.systemd")
+    def test_configure_not_needed(self, mock_systemd, tmp_path):
+        """Test the relay is removed when disabled."""
+        service_file = _mock_service_file(tmp_path / "relay.token")
+        relay = FalcoRelay(service_file)
+
+        relay.configure(CharmState(http_output={"url": "http://10.0.0.1:2801/"}, relay=False))
+
+        service_file.install.assert_not_called()
+        mock_systemd.service_stop.assert_called_once_with(RELAY_SERVICE_NAME)
+        mock_systemd.service_disable.assert_called_once_with(RELAY_SERVICE_NAME)
+        service_file.remove.assert_called_once()
+
+    @patch("relay.systemd")
+    def test_remove_not_installed(self, mock_systemd, tmp_path):
+        """Test removing a relay which was never installed does nothing."""
+        service_file = _mock_service_file(tmp_path / "relay.token", exists=False)
+
+        FalcoRelay(service_file).remove()
+
+        mock_systemd.service_stop.assert_not_called()
+        service_file.remove.assert_not_called()
+
+    @patch("relay.systemd")
+    def test_check_active(self, mock_systemd, tmp_path):
+        """Test the relay is only checked when needed."""
+        mock_systemd.service_running.return_value = False
+        relay = FalcoRelay(_mock_service_file(tmp_path / "relay.token"))
+
+        assert relay.check_active(CharmState())
+        assert not relay.check_active(CharmState(http_output={"url": "http://10.0.0.1:2801/"}))
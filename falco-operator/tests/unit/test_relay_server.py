@@ -0,0 +1,260 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for relay_server module."""
+
+import gzip
+import http.client
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from metrics import parse_metrics
+from relay_server import Forwarder, Metrics, RelayServer, Spool, UpstreamError
+
+
+@pytest.fixture
+def spool(tmp_path):
+    """Create an empty spool."""
+    return Spool(tmp_path / "spool", 1024, Metrics())
+
+
+def _mock_response(status, will_close=False):
+    """Create a mock upstream answer."""
+    response = MagicMock()
+    response.status = status
+    response.will_close = will_close
+    return response
+
+
+class TestSpool:
+    """Test the on-disk alert spool."""
+
+    def test_put_peek_remove(self, spool):
+        """Test alerts are spooled and removed in order."""
+        spool.put(b'{"rule": "a"}')
+        spool.put(b'{"rule": "b"}')
+
+        first, second = spool.peek(10, timeout=0)
+        assert first.read_bytes() == b'{"rule": "a"}'
+        assert second.read_bytes() == b'{"rule": "b"}'
+        assert spool.depth == 2
+        assert spool.size == 26
+
+        spool.remove(first)
+        assert not first.exists()
+        assert spool.peek(10, timeout=0) == [second]
+        assert spool.size == 13
+
+    def test_remove_dropped_alert(self, spool):
+        """Test removing an alert which is not at the head of the spool is ignored."""
+        spool.put(b"a")
+        spool.put(b"b")
+        _, second = spool.peek(10, timeout=0)
+
+        spool.remove(second)
+
+        assert spool.depth == 2
+        assert second.exists()
+
+    def test_put_over_capacity(self, tmp_path):
+        """Test the oldest alerts are dropped once the spool is full."""
+        metrics = Metrics()
+        spool = Spool(tmp_path, 10, metrics)
+
+        for payload in (b"aaaa", b"bbbb", b"cccc"):
+            spool.put(payload)
+
+        (alert,) = [path.read_bytes() for path in spool.peek(10, timeout=0)][1:]
+        assert alert == b"cccc"
+        assert spool.depth == 2
+        assert spool.size == 8
+        assert metrics.get("dropped") == 1
+        assert len(list(tmp_path.glob("*.json"))) == 2
+
+    def test_reload(self, tmp_path):
+        """Test the alerts left by a previous run are loaded and staging files discarded."""
+        spool = Spool(tmp_path, 1024, Metrics())
+        spool.put(b"a")
+        (tmp_path / "00000000000000000000-000000001.tmp").write_bytes(b"partial")
+
+        reloaded = Spool(tmp_path, 1024, Metrics())
+
+        assert [path.read_bytes() for path in reloaded.peek(10, timeout=0)] == [b"a"]
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_peek_empty(self, spool):
+        """Test peeking an empty spool returns no alert after the timeout."""
+        assert spool.peek(10, timeout=0.01) == []
+
+
+class TestForwarder:
+    """Test the forwarding of the spooled alerts."""
+
+    @patch("relay_server.http.client.HTTPConnection")
+    def test_forward_spooled(self, mock_connection_class, spool):
+        """Test the alerts are forwarded over a single connection and removed from the spool."""
+        mock_connection = mock_connection_class.return_value
+        mock_connection.getresponse.return_value = _mock_response(200)
+        spool.put(b"a")
+        spool.put(b"b")
+        metrics = Metrics()
+        forwarder = Forwarder(spool, metrics, "http://10.0.0.1:2801/?token=1")
+
+        forwarder.forward_spooled()
+
+        mock_connection_class.assert_called_once_with("10.0.0.1", 2801, timeout=10)
+        assert mock_connection.request.call_count == 2
+        mock_connection.request.assert_called_with(
+            "POST", "/?token=1", body=b"b", headers={"Content-Type": "application/json"}
+        )
+        assert spool.depth == 0
+        assert metrics.get("forwarded") == 2
+
+    @patch("relay_server.http.client.HTTPConnection")
+    def test_forward_spooled_compressed(self, mock_connection_class, spool):
+        """Test the alerts are gzipped when compression is enabled."""
+        mock_connection = mock_connection_class.return_value
+        mock_connection.getresponse.return_value = _mock_response(200, will_close=True)
+        spool.put(b"a")
+        forwarder = Forwarder(spool, Metrics(), "http://10.0.0.1:2801/", compress=True)
+
+        forwarder.forward_spooled()
+
+        kwargs = mock_connection.request.call_args.kwargs
+        assert gzip.decompress(kwargs["body"]) == b"a"
+        assert kwargs["headers"]["Content-Encoding"] == "gzip"
+        mock_connection.close.assert_called_once()
+
+    @pytest.mark.parametrize("status", [408, 429, 500, 503])
+    @patch("relay_server.http.client.HTTPConnection")
+    def test_forward_spooled_retry(self, mock_connection_class, spool, status):
+        """Test the alerts are kept in the spool when the upstream endpoint is unavailable."""
+        mock_connection_class.return_value.getresponse.return_value = _mock_response(status)
+        spool.put(b"a")
+        forwarder = Forwarder(spool, Metrics(), "http://10.0.0.1:2801/")
+
+        with pytest.raises(UpstreamError):
+            forwarder.forward_spooled()
+
+        assert spool.depth == 1
+
+    @patch("relay_server.http.client.HTTPConnection")
+    def test_forward_spooled_rejected(self, mock_connection_class, spool):
+        """Test the alerts rejected by the upstream endpoint are not retried."""
+        mock_connection_class.return_value.getresponse.return_value = _mock_response(400)
+        spool.put(b"a")
+        metrics = Metrics()
+        forwarder = Forwarder(spool, metrics, "http://10.0.0.1:2801/")
+
+        forwarder.forward_spooled()
+
+        assert spool.depth == 0
+        assert metrics.get("rejected") == 1
+        assert metrics.get("forwarded") == 0
+
+    @patch("relay_server.ssl.create_default_context")
+    @patch("relay_server.http.client.HTTPSConnection")
+    def test_forward_spooled_tls(self, mock_connection_class, mock_context, spool, tmp_path):
+        """Test the upstream endpoint certificate is verified against the CA certificate."""
+        mock_connection_class.return_value.getresponse.return_value = _mock_response(200)
+        ca_cert = tmp_path / "ca.crt"
+        ca_cert.write_text("PEM")
+        spool.put(b"a")
+        forwarder = Forwarder(spool, Metrics(), "https://10.0.0.1:2801/", ca_cert=ca_cert)
+
+        forwarder.forward_spooled()
+
+        mock_context.assert_called_once_with(cafile=str(ca_cert))
+        mock_connection_class.assert_called_once_with(
+            "10.0.0.1", 2801, timeout=10, context=mock_context.return_value
+        )
+
+    @patch("relay_server.http.client.HTTPConnection")
+    def test_run_backoff(self, mock_connection_class, spool):
+        """Test the forwarder backs off and reconnects while the upstream endpoint fails."""
+        mock_connection = mock_connection_class.return_value
+        mock_connection.request.side_effect = ConnectionRefusedError()
+        spool.put(b"a")
+        metrics = Metrics()
+        forwarder = Forwarder(spool, metrics, "http://10.0.0.1:2801/")
+        stop = MagicMock()
+        stop.is_set.side_effect = [False, False, True]
+
+        forwarder.run(stop)
+
+        assert [call.args[0] for call in stop.wait.call_args_list] == [1.0, 2.0]
+        assert mock_connection.close.call_count == 2
+        assert metrics.get("retries") == 2
+        assert spool.depth == 1
+
+
+class TestRelayServer:
+    """Test the relay HTTP server."""
+
+    @pytest.fixture
+    def server(self, spool):
+        """Run a relay server on an ephemeral port."""
+        server = RelayServer(("127.0.0.1", 0), spool, Metrics(), "token")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    def test_post_alert(self, server, spool):
+        """Test the alerts posted by Falco are spooled over a persistent connection."""
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+
+        for payload in (b'{"rule": "a"}', b'{"rule": "b"}'):
+            connection.request("POST", "/token", body=payload)
+            response = connection.getresponse()
+            response.read()
+            assert response.status == 200
+        connection.close()
+
+        assert [path.read_bytes() for path in spool.peek(10, timeout=0)] == [
+            b'{"rule": "a"}',
+            b'{"rule": "b"}',
+        ]
+        assert server.metrics.get("received") == 2
+
+    def test_post_empty_alert(self, server, spool):
+        """Test an alert without body is refused."""
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        connection.request("POST", "/token", body=b"")
+        response = connection.getresponse()
+        connection.close()
+
+        assert response.status == 411
+        assert spool.depth == 0
+
+    @pytest.mark.parametrize("path", ["/", "/other", "/token/", "/tokens"])
+    def test_post_alert_forbidden(self, server, spool, path):
+        """Test alerts posted without the secret URL path are refused."""
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        connection.request("POST", path, body=b'{"rule": "forged"}')
+        response = connection.getresponse()
+        connection.close()
+
+        assert response.status == 403
+        assert spool.depth == 0
+        assert server.metrics.get("received") == 0
+
+    def test_get_metrics(self, server, spool):
+        """Test the relay metrics are served in the Prometheus text format."""
+        spool.put(b"a")
+        server.metrics.inc("forwarded", 3)
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        connection.request("GET", "/metrics")
+        response = connection.getresponse()
+        text = response.read().decode()
+        connection.close()
+
+        values = {sample.name: sample.value for sample in parse_metrics(text)}
+        assert response.status == 200
+        assert values["falco_relay_alerts_forwarded_total"] == 3
+        assert values["falco_relay_spool_alerts"] == 1
+        assert values["falco_relay_spool_bytes"] == 1
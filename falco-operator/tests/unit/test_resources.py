@@ -0,0 +1,84 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for resources module."""
+
+import subprocess
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from resources import SYSTEMCTL, ResourcesError, service_resources
+
+SYSTEMCTL_SHOW = """CPUQuotaPerSecUSec=1.500000s
+MemoryMax=536870912
+CPUAffinity=0-1 6
+Nice=10
+CPUWeight=[not set]
+IOWeight=[not set]
+CPUUsageNSec=42000000000
+MemoryCurrent=104857600
+MemoryPeak=[not set]
+TasksCurrent=12
+IOReadBytes=18446744073709551615
+IOWriteBytes=4096
+ControlGroup=/system.slice/falco.service
+"""
+
+
+class TestServiceResources:
+    """Test the service resource controls and usage."""
+
+    @patch("resources.subprocess.run")
+    def test_service_resources(self, mock_run, tmp_path):
+        """Test the limits, the accounting and the cgroup counters are reported."""
+        mock_run.return_value = MagicMock(stdout=SYSTEMCTL_SHOW)
+        cgroup_dir = tmp_path / "system.slice/falco.service"
+        cgroup_dir.mkdir(parents=True)
+        (cgroup_dir / "cpu.stat").write_text(
+            "usage_usec 42000000\nnr_periods 600\nnr_throttled 25\nthrottled_usec 1200000\n"
+        )
+        (cgroup_dir / "memory.events").write_text("low 0\nhigh 0\nmax 3\noom 0\noom_kill 0\n")
+
+        with patch("resources.CGROUP_ROOT", tmp_path):
+            resources = service_resources("falco")
+
+        assert mock_run.call_args.args[0][:3] == [SYSTEMCTL, "show", "falco.service"]
+        assert resources.limits == {
+            "cpu-quota-per-sec": "1.500000s",
+            "memory-max": "536870912",
+            "cpu-affinity": "0-1 6",
+            "nice": "10",
+            "cpu-weight": "default",
+            "io-weight": "default",
+        }
+        assert resources.usage == {
+            "cpu-usage-ns": 42000000000,
+            "memory-current-bytes": 104857600,
+            "tasks": 12,
+            "io-write-bytes": 4096,
+            "cpu-throttled-periods": 25,
+            "cpu-throttled-us": 1200000,
+            "memory-high-events": 0,
+            "memory-max-events": 3,
+            "memory-oom-kills": 0,
+        }
+
+    @patch("resources.subprocess.run")
+    def test_service_resources_cgroup_v1(self, mock_run, tmp_path):
+        """Test the cgroup counters are skipped when the cgroup v2 files are missing."""
+        mock_run.return_value = MagicMock(stdout=SYSTEMCTL_SHOW)
+
+        with patch("resources.CGROUP_ROOT", tmp_path):
+            resources = service_resources("falco")
+
+        assert "cpu-throttled-periods" not in resources.usage
+        assert resources.usage["tasks"] == 12
+
+    @patch("resources.subprocess.run")
+    def test_service_resources_error(self, mock_run):
+        """Test an error is raised when systemd fails to show the service."""
+        mock_run.side_effect = subprocess.CalledProcessError(1, "systemctl", stderr="no bus")
+
+        with pytest.raises(ResourcesError, match="no bus"):
+            service_resources("falco")
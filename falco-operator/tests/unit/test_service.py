@@ -4,42 +4,58 @@
 """Unit tests for Falco service module."""
 
 import os
+import socket
 import subprocess
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
+import yaml
 from pydantic import AnyUrl
 
 import service
 from service import (
-    CLONE_OUTPUT_DIR,
     FALCO_CUSTOM_CONFIGS_KEY,
     FALCO_CUSTOM_RULES_KEY,
     FALCO_SERVICE_NAME,
+    FalcoChange,
+    FalcoConfigFile,
     FalcoConfigurationError,
     FalcoCustomSetting,
+    FalcoLogrotateFile,
     FalcoService,
+    FalcoServiceFile,
+    FalcoValidationError,
+    FileSyncError,
     GitCloneError,
-    RsyncError,
     SshKeyScanError,
     SshKeyWriteError,
+    SyncManifest,
     Template,
     TemplateRenderError,
 )
 from state import CharmState
 
+JUJU_TOPOLOGY = {
+    "unit": "falco/0",
+    "charm_name": "falco",
+    "model": "test",
+    "model_uuid": "00000000-0000-4000-8000-000000000000",
+    "application": "falco",
+}
+
 
 class TestTemplate:
     """Test Template class."""
 
-    @patch("service.Environment")
-    def test_install(self, mock_env_class, tmp_path):
+    @patch("service._get_template_environment")
+    def test_install(self, mock_get_env, tmp_path):
         """Test template installation."""
         mock_env = MagicMock()
         mock_template = MagicMock()
         mock_template.render.return_value = "rendered content"
         mock_env.get_template.return_value = mock_template
-        mock_env_class.return_value = mock_env
+        mock_get_env.return_value = mock_env
 
         dest = tmp_path / "subdir" / "output.txt"
         context = {"key": "value"}
@@ -51,11 +67,32 @@ class TestTemplate:
         assert dest.read_text() == "rendered content"
         mock_template.render.assert_called_once_with(context)
 
-    @patch("service.Environment")
-    def test_remove(self, mock_env_class, tmp_path):
+    @patch("service._get_template_environment")
+    def test_install_unchanged(self, mock_get_env, tmp_path):
+        """Test template installation is skipped when content is unchanged."""
+        mock_env = MagicMock()
+        mock_template = MagicMock()
+        mock_template.render.return_value = "rendered content"
+        mock_env.get_template.return_value = mock_template
+        mock_get_env.return_value = mock_env
+
+        dest = tmp_path / "output.txt"
+        template = Template("test.j2", dest, {})
+
+        assert template.install() is True
+        mtime = dest.stat().st_mtime_ns
+        assert template.install() is False
+        assert dest.stat().st_mtime_ns == mtime
+
+        mock_template.render.return_value = "new content"
+        assert template.install() is True
+        assert dest.read_text() == "new content"
+
+    @patch("service._get_template_environment")
+    def test_remove(self, mock_get_env, tmp_path):
         """Test template removal."""
         mock_env = MagicMock()
-        mock_env_class.return_value = mock_env
+        mock_get_env.return_value = mock_env
 
         dest = tmp_path / "output.txt"
         dest.touch()
@@ -65,24 +102,24 @@ class TestTemplate:
 
         assert not dest.exists()
 
-    @patch("service.Environment")
-    def test_remove_nonexistent(self, mock_env_class, tmp_path):
+    @patch("service._get_template_environment")
+    def test_remove_nonexistent(self, mock_get_env, tmp_path):
         """Test removing nonexistent template file."""
         mock_env = MagicMock()
-        mock_env_class.return_value = mock_env
+        mock_get_env.return_value = mock_env
 
         dest = tmp_path / "nonexistent.txt"
         template = Template("test.j2", dest, {})
         template.remove()
 
-    @patch("service.Environment")
-    def test_render_write_error(self, mock_env_class, tmp_path):
+    @patch("service._get_template_environment")
+    def test_render_write_error(self, mock_get_env, tmp_path):
         """Test render error handling."""
         mock_env = MagicMock()
         mock_template = MagicMock()
         mock_template.render.return_value = "content"
         mock_env.get_template.return_value = mock_template
-        mock_env_class.return_value = mock_env
+        mock_get_env.return_value = mock_env
 
         # Use a path that will cause write error
         dest = tmp_path / "readonly" / "output.txt"
@@ -95,6 +132,207 @@ class TestTemplate:
             template.install()
 
 
+def test_get_template_environment():
+    """Test the template environment is shared and caches compiled templates."""
+    env = service._get_template_environment()
+
+    assert service._get_template_environment() is env
+    assert env.bytecode_cache is not None
+
+
+class TestFalcoConfigFile:
+    """Test FalcoConfigFile class."""
+
+    @patch("service.JujuTopology")
+    def test_update(self, mock_topology, mock_falco_layout):
+        """Test config file update renders the http output and classifies the change."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["http_output"] == {"enabled": False}
+        assert config["watch_config_files"] is False
+        # The config file holds the secret URL path of the relay
+        assert mock_falco_layout.config_file.stat().st_mode & 0o777 == 0o600
+        assert config["rules_files"] == [str(mock_falco_layout.rules_dir)]
+        assert config["config_files"] == [str(mock_falco_layout.configs_dir)]
+
+        http_output = {
+            "url": "http://10.0.0.1:2801/",
+            "keep_alive": True,
+            "compress_uploads": False,
+            "ca_cert": False,
+        }
+        assert config_file.update({"http_output": http_output}) == FalcoChange.RELOAD
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["http_output"] == {
+            "enabled": True,
+            "url": "http://10.0.0.1:2801/",
+            "keep_alive": True,
+            "compress_uploads": False,
+            "ca_path": "/etc/ssl/certs/",
+        }
+
+        assert config_file.update({"http_output": http_output}) == FalcoChange.NONE
+
+    @patch("service.JujuTopology")
+    def test_update_http_output_url_query(self, mock_topology, mock_falco_layout):
+        """Test the http output URL is rendered verbatim, without HTML escaping."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        url = "https://10.0.0.1:2801/events?token=a&b=<c>#d: e"
+
+        http_output = {"url": url, "keep_alive": True, "compress_uploads": False, "ca_cert": False}
+
+        config_file.update({"http_output": http_output})
+
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["http_output"]["url"] == url
+
+    @patch("service.JujuTopology")
+    def test_install_juju_topology(self, mock_topology, mock_falco_layout):
+        """Test the Juju topology fields of the alerts are always rendered as strings."""
+        mock_topology.from_charm.return_value.as_dict.return_value = {
+            "unit": "true/0",
+            "charm_name": "falco",
+            "model": "123",
+            "model_uuid": "null",
+            "application": "true",
+        }
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["append_output"][1]["extra_fields"] == [
+            {"juju_unit": "true/0"},
+            {"juju_charm": "falco"},
+            {"juju_model": "123"},
+            {"juju_model_uuid": "null"},
+            {"juju_application": "true"},
+        ]
+
+    @patch("service.JujuTopology")
+    def test_update_ca_cert(self, mock_topology, mock_falco_layout):
+        """Test the CA certificate of the HTTP output endpoint is written and referenced."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        ca_cert_file = mock_falco_layout.http_output_ca_cert
+
+        assert config_file.update_ca_cert("PEM") == FalcoChange.RELOAD
+        assert ca_cert_file.read_text() == "PEM"
+        assert config_file.update_ca_cert("PEM") == FalcoChange.NONE
+
+        charm_state = CharmState(
+            http_output={"url": "https://10.0.0.1:2801/"},
+            http_output_ca_cert="PEM",
+            relay=False,
+        )
+        config_file.update(service._config_file_context(charm_state))
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["http_output"]["ca_cert"] == str(ca_cert_file)
+
+        assert config_file.update_ca_cert(None) == FalcoChange.RELOAD
+        assert not ca_cert_file.exists()
+        assert config_file.update_ca_cert(None) == FalcoChange.NONE
+
+    @patch("service.JujuTopology")
+    def test_update_engine(self, mock_topology, mock_falco_layout):
+        """Test config file update renders the ring buffer sizing and requires a restart."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+
+        engine = {"buf_size_preset": 6, "cpus_for_each_buffer": 1, "drop_failed_exit": True}
+        assert config_file.update({"engine": engine}) == FalcoChange.RESTART
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["engine"] == {"kind": "modern_ebpf", "modern_ebpf": engine}
+
+    @patch("service.JujuTopology")
+    def test_update_metrics(self, mock_topology, mock_falco_layout):
+        """Test config file update renders the metrics settings and hot reloads them."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["metrics"]["interval"] == "1h"
+        assert config["metrics"]["output_rule"] is True
+        assert config["metrics"]["kernel_event_counters_enabled"] is True
+        assert config["metrics"]["jemalloc_stats_enabled"] is False
+
+        charm_state = CharmState(
+            metrics_interval="15m", metrics_output_rule=False, metrics_counters=["rules_counters"]
+        )
+        context = service._config_file_context(charm_state)
+        assert config_file.update(context) == FalcoChange.RELOAD
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["metrics"]["interval"] == "15m"
+        assert config["metrics"]["output_rule"] is False
+        assert config["metrics"]["rules_counters_enabled"] is True
+        assert config["metrics"]["kernel_event_counters_enabled"] is False
+
+
+class TestFalcoServiceFile:
+    """Test FalcoServiceFile class."""
+
+    def test_render_resource_controls(self, mock_falco_layout, tmp_path):
+        """Test only the configured resource controls are rendered into the unit file."""
+        with patch.object(FalcoServiceFile, "service_file", tmp_path / "falco.service"):
+            service_file = FalcoServiceFile(mock_falco_layout, MagicMock())
+        service_file.install()
+        content = service_file.destination.read_text()
+        for directive in ("CPUQuota", "MemoryMax", "CPUAffinity", "Nice", "Weight"):
+            assert directive not in content
+
+        service_file.context.update(
+            service._service_file_context(
+                CharmState(
+                    cpu_quota=150,
+                    memory_max=512,
+                    cpu_affinity=["0-1", "6"],
+                    nice=10,
+                    cpu_weight=50,
+                    io_weight=20,
+                )
+            )
+        )
+        assert service_file.install()
+        content = service_file.destination.read_text()
+        assert "CPUQuota=150%\n" in content
+        assert "MemoryMax=512M\n" in content
+        assert "CPUAffinity=0-1 6\n" in content
+        assert "Nice=10\n" in content
+        assert "CPUWeight=50\n" in content
+        assert "IOWeight=20\n" in content
+
+
+class TestFalcoLogrotateFile:
+    """Test FalcoLogrotateFile class."""
+
+    def test_configure(self, tmp_path):
+        """Test the alerts file is rotated only when the file output channel is selected."""
+        events_file = tmp_path / "log/falco/events.log"
+        with (
+            patch.object(FalcoLogrotateFile, "logrotate_file", tmp_path / "logrotate.d/falco"),
+            patch.object(FalcoLogrotateFile, "events_file", events_file),
+        ):
+            logrotate_file = FalcoLogrotateFile()
+
+        logrotate_file.configure(
+            CharmState(outputs=["file"], file_output_max_size=50, file_output_rotate=3)
+        )
+        content = logrotate_file.destination.read_text()
+        assert f"{events_file} {{" in content
+        assert "size 50M" in content
+        assert "rotate 3" in content
+        assert "systemctl kill --signal=USR1 falco.service" in content
+        assert events_file.parent.is_dir()
+
+        logrotate_file.configure(CharmState(outputs=["http"]))
+        assert not logrotate_file.destination.exists()
+
+
 class TestFalcoCustomSetting:
     """Test FalcoCustomSetting class."""
 
@@ -146,45 +384,295 @@ class TestFalcoCustomSetting:
         rule_file.write_text("test")
 
         charm_state = CharmState(custom_config_repo=None)
-        custom_setting.configure(charm_state)
+        assert custom_setting.configure(charm_state) == FalcoChange.RELOAD
 
         # File should be removed when no repo is configured
         assert not rule_file.exists()
 
+        # Nothing left to remove
+        assert custom_setting.configure(charm_state) == FalcoChange.NONE
+
+    def test_manifest(self, mock_falco_layout):
+        """Test manifest tracks rules files and top-level keys of config files."""
+        custom_setting = FalcoCustomSetting(mock_falco_layout)
+        assert custom_setting.manifest() == {}
+
+        (mock_falco_layout.rules_dir / "a.yaml").write_text("- rule: a")
+        (mock_falco_layout.configs_dir / "b.yaml").write_text("engine:\n  kind: ebpf\nfoo: 1")
+        (mock_falco_layout.configs_dir / "c.yaml").write_text("not: valid: yaml")
+
+        assert set(custom_setting.manifest()) == {
+            f"{FALCO_CUSTOM_RULES_KEY}/a.yaml",
+            f"{FALCO_CUSTOM_CONFIGS_KEY}/b.yaml:engine",
+            f"{FALCO_CUSTOM_CONFIGS_KEY}/b.yaml:foo",
+            f"{FALCO_CUSTOM_CONFIGS_KEY}/c.yaml",
+        }
+
+    @patch("service._validate_custom_setting")
+    @patch("service._git_fetched_tag")
+    @patch("service._git_sync")
     @patch("service.subprocess")
-    def test_configure_with_repo(self, mock_subprocess, mock_falco_layout):
+    def test_configure_with_repo(
+        self,
+        mock_subprocess,
+        mock_git_sync,
+        mock_git_fetched_tag,
+        mock_validate,
+        mock_falco_layout,
+        tmp_path,
+    ):
         """Test configure with custom config repo."""
         custom_setting = FalcoCustomSetting(mock_falco_layout)
+        mock_git_sync.return_value = "abc123"
+        mock_git_fetched_tag.return_value = True
+        sync_manifest_file = tmp_path / "sync.json"
+
+        # Create test files in clone directory
+        clone_dir = tmp_path / "clone"
+        (clone_dir / FALCO_CUSTOM_RULES_KEY).mkdir(parents=True)
+        (clone_dir / FALCO_CUSTOM_CONFIGS_KEY).mkdir(parents=True)
+        (clone_dir / FALCO_CUSTOM_RULES_KEY / "custom.yaml").write_text("custom rule")
+        (clone_dir / FALCO_CUSTOM_CONFIGS_KEY / "custom.yaml").write_text("custom: config")
+
+        charm_state = CharmState(
+            custom_config_repo=AnyUrl("git+ssh://git@github.com/user/repo.git"),
+            custom_config_repo_ref="v1.0",
+        )
+
+        with (
+            patch("service.SYNC_MANIFEST_FILE", sync_manifest_file),
+            patch("service.CLONE_OUTPUT_DIR", clone_dir),
+        ):
+            assert custom_setting.configure(charm_state) == FalcoChange.RELOAD
+
+            # Verify the files were synced and the sync manifest recorded
+            assert (mock_falco_layout.rules_dir / "custom.yaml").read_text() == "custom rule"
+            sync_manifest = SyncManifest.load(sync_manifest_file)
+            assert sync_manifest is not None
+            assert sync_manifest.url == "git+ssh://git@github.com/user/repo.git"
+            assert sync_manifest.ref == "v1.0"
+            assert sync_manifest.commit == "abc123"
+            assert sync_manifest.immutable
+
+            # Tags are not synced again
+            mock_git_sync.reset_mock()
+            mock_subprocess.reset_mock()
+            assert custom_setting.configure(charm_state) == FalcoChange.NONE
+            mock_git_sync.assert_not_called()
+            mock_subprocess.check_output.assert_not_called()
+
+            # The deployed files are validated again against a changed managed config
+            mock_validate.reset_mock()
+            assert custom_setting.configure(charm_state, b"priority: error") == FalcoChange.NONE
+            mock_validate.assert_called_once()
+            staged_rules = mock_validate.call_args.args[1] / FALCO_CUSTOM_RULES_KEY
+            assert mock_validate.call_args.args[2] == b"priority: error"
+            assert not staged_rules.exists()
+            mock_git_sync.assert_not_called()
+
+            mock_validate.reset_mock()
+            custom_setting.configure(charm_state, b"priority: error")
+            mock_validate.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "remote_commit, synced",
+        [
+            pytest.param("abc123", True, id="branch unchanged"),
+            pytest.param("def456", False, id="branch moved"),
+        ],
+    )
+    @patch("service._validate_custom_setting")
+    @patch("service._add_known_hosts")
+    @patch("service._git_ls_remote")
+    @patch("service._git_sync")
+    @patch("service.subprocess")
+    def test_configure_with_branch(
+        self,
+        mock_subprocess,
+        mock_git_sync,
+        mock_git_ls_remote,
+        mock_add_known_hosts,
+        mock_validate,
+        remote_commit,
+        synced,
+        mock_falco_layout,
+        tmp_path,
+    ):
+        """Test configure only syncs a branch when the remote branch moved."""
+        custom_setting = FalcoCustomSetting(mock_falco_layout)
+        mock_git_ls_remote.return_value = remote_commit
+        mock_git_sync.return_value = remote_commit
+        sync_manifest_file = tmp_path / "sync.json"
+        SyncManifest(
+            url="git+ssh://git@github.com/user/repo.git",
+            ref="main",
+            commit="abc123",
+            immutable=False,
+            files=custom_setting.manifest(),
+            synced_at=0,
+        ).save(sync_manifest_file)
 
-        # Setup mock for git commands to simulate repo already cloned
-        def check_output_side_effect(cmd, *args, **kwargs):
-            if "config" in cmd and "--get" in cmd:
-                return b"git+ssh://git@github.com/user/repo.git\n"
-            elif "describe" in cmd:
-                return b"v1.0\n"
-            return b""
+        charm_state = CharmState(
+            custom_config_repo=AnyUrl("git+ssh://git@github.com/user/repo.git"),
+            custom_config_repo_ref="main",
+        )
 
-        mock_subprocess.check_output.side_effect = check_output_side_effect
+        with (
+            patch("service.SYNC_MANIFEST_FILE", sync_manifest_file),
+            patch("service.CLONE_OUTPUT_DIR", tmp_path / "clone"),
+        ):
+            custom_setting.configure(charm_state)
 
-        # Create mock directories for rsync
-        clone_rules_dir = CLONE_OUTPUT_DIR / FALCO_CUSTOM_RULES_KEY
-        clone_configs_dir = CLONE_OUTPUT_DIR / FALCO_CUSTOM_CONFIGS_KEY
-        clone_rules_dir.mkdir(parents=True, exist_ok=True)
-        clone_configs_dir.mkdir(parents=True, exist_ok=True)
+        mock_git_ls_remote.assert_called_once_with(
+            "git+ssh://git@github.com/user/repo.git", "main"
+        )
+        assert mock_git_sync.called is not synced
 
-        # Create test files in clone directory
-        (clone_rules_dir / "custom.yaml").write_text("custom rule")
-        (clone_configs_dir / "custom.yaml").write_text("custom config")
+    @patch("service._validate_custom_setting")
+    @patch("service._git_sync")
+    @patch("service.subprocess")
+    def test_configure_with_modified_files(
+        self, mock_subprocess, mock_git_sync, mock_validate, mock_falco_layout, tmp_path
+    ):
+        """Test configure syncs again when the deployed files were modified."""
+        custom_setting = FalcoCustomSetting(mock_falco_layout)
+        mock_git_sync.return_value = "abc123"
+        sync_manifest_file = tmp_path / "sync.json"
+        SyncManifest(
+            url="git+ssh://git@github.com/user/repo.git",
+            ref="v1.0",
+            commit="abc123",
+            immutable=True,
+            files=custom_setting.manifest(),
+            synced_at=0,
+        ).save(sync_manifest_file)
+        (mock_falco_layout.rules_dir / "local.yaml").write_text("local rule")
 
         charm_state = CharmState(
             custom_config_repo=AnyUrl("git+ssh://git@github.com/user/repo.git"),
             custom_config_repo_ref="v1.0",
         )
 
-        custom_setting.configure(charm_state)
+        with (
+            patch("service.SYNC_MANIFEST_FILE", sync_manifest_file),
+            patch("service.CLONE_OUTPUT_DIR", tmp_path / "clone"),
+        ):
+            custom_setting.configure(charm_state)
+
+        mock_git_sync.assert_called_once()
+
+    @patch("service._validate_custom_setting")
+    @patch("service._git_sync")
+    def test_configure_with_invalid_files(
+        self, mock_git_sync, mock_validate, mock_falco_layout, tmp_path
+    ):
+        """Test configure does not deploy files that fail validation."""
+        custom_setting = FalcoCustomSetting(mock_falco_layout)
+        mock_git_sync.return_value = "abc123"
+        mock_validate.side_effect = FalcoValidationError("invalid")
+        clone_dir = tmp_path / "clone"
+        (clone_dir / FALCO_CUSTOM_RULES_KEY).mkdir(parents=True)
+        (clone_dir / FALCO_CUSTOM_RULES_KEY / "custom.yaml").write_text("invalid rule")
+        (mock_falco_layout.rules_dir / "custom.yaml").write_text("valid rule")
+
+        charm_state = CharmState(
+            custom_config_repo=AnyUrl("git+ssh://git@github.com/user/repo.git"),
+            custom_config_repo_ref="v1.0",
+        )
+
+        with (
+            patch("service.SYNC_MANIFEST_FILE", tmp_path / "sync.json"),
+            patch("service.CLONE_OUTPUT_DIR", clone_dir),
+            pytest.raises(FalcoValidationError),
+        ):
+            custom_setting.configure(charm_state)
+
+        assert (mock_falco_layout.rules_dir / "custom.yaml").read_text() == "valid rule"
+        assert not (tmp_path / "sync.json").exists()
+
+
+class TestValidateCustomSetting:
+    """Test validation of the staged custom settings."""
+
+    @pytest.fixture
+    def staging_dir(self, tmp_path):
+        """Create a staging directory with custom rules and configs."""
+        staging_dir = tmp_path / "staging"
+        (staging_dir / FALCO_CUSTOM_RULES_KEY).mkdir(parents=True)
+        (staging_dir / FALCO_CUSTOM_CONFIGS_KEY).mkdir(parents=True)
+        (staging_dir / FALCO_CUSTOM_RULES_KEY / "a.yaml").write_text("- rule: a")
+        return staging_dir
+
+    @patch("service.subprocess.run")
+    def test_validate(self, mock_run, mock_falco_layout, staging_dir, tmp_path):
+        """Test validation runs Falco once per bundle, keeping the default rulesets."""
+        default_rules = str(mock_falco_layout.default_rules_dir / "falco_rules.yaml")
+        managed_config = yaml.safe_dump(
+            {"rules_files": [default_rules, str(mock_falco_layout.rules_dir)]}
+        ).encode()
+
+        with patch("service.VALIDATION_CACHE_FILE", tmp_path / "cache.json"):
+            service._validate_custom_setting(mock_falco_layout, staging_dir, managed_config)
+            mock_run.assert_called_once()
+            cmd = mock_run.call_args[0][0]
+            assert cmd[0] == str(mock_falco_layout.cmd)
+            assert "--dry-run" in cmd
+            staged_config = yaml.safe_load((staging_dir / "falco.yaml").read_text())
+            assert staged_config["rules_files"] == [
+                default_rules,
+                str(staging_dir / FALCO_CUSTOM_RULES_KEY),
+            ]
+            assert staged_config["config_files"] == [str(staging_dir / FALCO_CUSTOM_CONFIGS_KEY)]
+
+            # The same bundle is not validated again
+            service._validate_custom_setting(mock_falco_layout, staging_dir, managed_config)
+            mock_run.assert_called_once()
+
+            # A different bundle is validated
+            (staging_dir / FALCO_CUSTOM_RULES_KEY / "b.yaml").write_text("- rule: b")
+            service._validate_custom_setting(mock_falco_layout, staging_dir, managed_config)
+            assert mock_run.call_count == 2
+
+            # The same files are validated again with a different managed config
+            service._validate_custom_setting(mock_falco_layout, staging_dir, b"priority: error")
+            assert mock_run.call_count == 3
+
+    @patch("service.subprocess.run")
+    def test_validate_error(self, mock_run, mock_falco_layout, staging_dir, tmp_path):
+        """Test validation failures are raised and cached."""
+        mock_run.side_effect = subprocess.CalledProcessError(1, "falco", stderr="bad rule")
+
+        with patch("service.VALIDATION_CACHE_FILE", tmp_path / "cache.json"):
+            with pytest.raises(FalcoValidationError):
+                service._validate_custom_setting(mock_falco_layout, staging_dir, b"{}")
+            with pytest.raises(FalcoValidationError):
+                service._validate_custom_setting(mock_falco_layout, staging_dir, b"{}")
+
+        mock_run.assert_called_once()
+
+    @patch("service.subprocess.run")
+    def test_validate_timeout(self, mock_run, mock_falco_layout, staging_dir, tmp_path):
+        """Test a dry run that times out is raised but not cached."""
+        mock_run.side_effect = subprocess.TimeoutExpired("falco", 300)
+
+        with patch("service.VALIDATION_CACHE_FILE", tmp_path / "cache.json"):
+            with pytest.raises(FalcoValidationError, match="timed out"):
+                service._validate_custom_setting(mock_falco_layout, staging_dir, b"{}")
+
+            mock_run.side_effect = None
+            service._validate_custom_setting(mock_falco_layout, staging_dir, b"{}")
 
-        # Verify rsync was called
-        mock_subprocess.run.assert_called()
+        assert mock_run.call_count == 2
+
+    @patch("service.subprocess.run")
+    def test_validate_falco_upgrade(self, mock_run, mock_falco_layout, staging_dir, tmp_path):
+        """Test the bundle is validated again when the Falco binary content changes."""
+        with patch("service.VALIDATION_CACHE_FILE", tmp_path / "cache.json"):
+            service._validate_custom_setting(mock_falco_layout, staging_dir, b"{}")
+            mock_falco_layout.cmd.write_bytes(b"new falco")
+            service._validate_custom_setting(mock_falco_layout, staging_dir, b"{}")
+
+        assert mock_run.call_count == 2
 
 
 class TestFalcoServiceEdgeCases:
@@ -197,7 +685,9 @@ class TestFalcoServiceEdgeCases:
         mock_service_file = MagicMock()
         mock_custom_setting = MagicMock()
 
-        falco_service = FalcoService(mock_config, mock_service_file, mock_custom_setting)
+        falco_service = FalcoService(
+            mock_config, mock_service_file, mock_custom_setting, MagicMock()
+        )
 
         # Mock custom_setting.configure to raise GitCloneError
         mock_custom_setting.configure.side_effect = GitCloneError("Test error")
@@ -215,15 +705,56 @@ class TestFalcoService:
     def test_install(self, mock_systemd):
         """Test Falco service installation."""
         mock_config = MagicMock()
+        mock_config.destination.exists.return_value = False
         mock_service_file = MagicMock()
         mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.destination.exists.return_value = False
         mock_custom_setting = MagicMock()
 
-        service = FalcoService(mock_config, mock_service_file, mock_custom_setting)
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
         service.install()
 
         mock_config.install.assert_called_once()
         mock_service_file.install.assert_called_once()
+        mock_custom_setting.install.assert_called_once()
+        mock_systemd.service_enable.assert_called_once_with(FALCO_SERVICE_NAME)
+
+    @patch("service.systemd")
+    def test_install_fresh(self, mock_systemd):
+        """Test Falco service installation does not start the service."""
+        mock_systemd.service_running.return_value = False
+        mock_config = MagicMock()
+        mock_config.destination.exists.return_value = False
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.destination.exists.return_value = False
+        mock_service_file.install.return_value = True
+        mock_custom_setting = MagicMock()
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.install()
+
+        mock_systemd.daemon_reload.assert_called_once()
+        mock_systemd.service_restart.assert_not_called()
+
+    @patch("service.systemd")
+    def test_install_upgrade(self, mock_systemd):
+        """Test Falco service installation keeps the files and the running service on upgrade."""
+        mock_systemd.service_running.return_value = True
+        mock_config = MagicMock()
+        mock_config.destination.exists.return_value = True
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.destination.exists.return_value = True
+        mock_custom_setting = MagicMock()
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.install()
+
+        mock_config.install.assert_not_called()
+        mock_service_file.install.assert_not_called()
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_restart.assert_not_called()
         mock_systemd.service_enable.assert_called_once_with(FALCO_SERVICE_NAME)
 
     @patch("service.systemd")
@@ -234,7 +765,7 @@ class TestFalcoService:
         mock_service_file.service_name = FALCO_SERVICE_NAME
         mock_custom_setting = MagicMock()
 
-        service = FalcoService(mock_config, mock_service_file, mock_custom_setting)
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
         service.remove()
 
         mock_systemd.service_stop.assert_called_once_with(FALCO_SERVICE_NAME)
@@ -249,19 +780,249 @@ class TestFalcoService:
         mock_config = MagicMock()
         mock_service_file = MagicMock()
         mock_service_file.service_name = FALCO_SERVICE_NAME
-        mock_service_file.context = {}
+        mock_service_file.install.return_value = True
+        mock_config.update.return_value = FalcoChange.NONE
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
         mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.NONE
 
-        service = FalcoService(mock_config, mock_service_file, mock_custom_setting)
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
         charm_state = CharmState()
         service.configure(charm_state)
 
-        mock_custom_setting.configure.assert_called_once_with(charm_state)
-        mock_service_file.install.assert_not_called()
-        mock_service_file.update.assert_called_once()
+        mock_custom_setting.configure.assert_called_once_with(
+            charm_state, mock_config.render.return_value
+        )
+        mock_config.update.assert_called_once()
+        context = mock_config.update.call_args.kwargs["context"]
+        assert context["http_output"] is None
+        assert context["engine"]["buf_size_preset"] == 4
+        assert context["metrics"]["counters"]["kernel_event_counters"] is True
+        mock_service_file.install.assert_called_once()
+        mock_systemd.daemon_reload.assert_called_once()
+        mock_systemd.service_restart.assert_called_once_with(FALCO_SERVICE_NAME)
+
+    @patch("service.systemd")
+    def test_configure_unchanged(self, mock_systemd):
+        """Test Falco service is not restarted when nothing changed."""
+        mock_systemd.service_running.return_value = True
+        mock_config = MagicMock()
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.install.return_value = False
+        mock_config.update.return_value = FalcoChange.NONE
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.NONE
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.configure(CharmState())
+
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_restart.assert_not_called()
+
+    @patch("service.systemd")
+    def test_configure_unchanged_not_running(self, mock_systemd):
+        """Test Falco service is started when nothing changed but it is not running."""
+        mock_systemd.service_running.return_value = False
+        mock_config = MagicMock()
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.install.return_value = False
+        mock_config.update.return_value = FalcoChange.NONE
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.NONE
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.configure(CharmState())
+
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_restart.assert_called_once_with(FALCO_SERVICE_NAME)
+
+    @patch("service.systemd")
+    def test_configure_restart(self, mock_systemd):
+        """Test Falco service is restarted when requested even though nothing changed."""
+        mock_systemd.service_running.return_value = True
+        mock_config = MagicMock()
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.install.return_value = False
+        mock_config.update.return_value = FalcoChange.NONE
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.NONE
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.configure(CharmState(), restart=True)
+
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_restart.assert_called_once_with(FALCO_SERVICE_NAME)
+
+    @patch("service.systemd")
+    def test_configure_custom_setting_reload(self, mock_systemd):
+        """Test Falco service is reloaded on hot reloadable custom setting changes."""
+        mock_systemd.service_running.return_value = True
+        mock_config = MagicMock()
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.install.return_value = False
+        mock_config.update.return_value = FalcoChange.NONE
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.RELOAD
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.configure(CharmState())
+
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_restart.assert_not_called()
+        mock_systemd.service_reload.assert_called_once_with(FALCO_SERVICE_NAME)
+
+    @patch("service.systemd")
+    def test_configure_custom_setting_restart(self, mock_systemd):
+        """Test Falco service is restarted without daemon reload on engine or plugin changes."""
+        mock_systemd.service_running.return_value = True
+        mock_config = MagicMock()
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.install.return_value = False
+        mock_config.update.return_value = FalcoChange.NONE
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.RESTART
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.configure(CharmState())
+
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_reload.assert_not_called()
+        mock_systemd.service_restart.assert_called_once_with(FALCO_SERVICE_NAME)
+
+    @patch("service.systemd")
+    def test_configure_service_file_changed(self, mock_systemd):
+        """Test Falco service is restarted when the service file changed."""
+        mock_systemd.service_running.return_value = True
+        mock_config = MagicMock()
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.install.return_value = True
+        mock_config.update.return_value = FalcoChange.NONE
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.RELOAD
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.configure(CharmState())
+
         mock_systemd.daemon_reload.assert_called_once()
+        mock_systemd.service_reload.assert_not_called()
+        mock_systemd.service_restart.assert_called_once_with(FALCO_SERVICE_NAME)
+
+    @patch("service.systemd")
+    def test_configure_config_file_changed(self, mock_systemd):
+        """Test Falco service is reloaded when only the managed config file changed."""
+        mock_systemd.service_running.return_value = True
+        mock_config = MagicMock()
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.install.return_value = False
+        mock_config.update.return_value = FalcoChange.RELOAD
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.NONE
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        service.configure(CharmState(http_output={"url": "http://10.0.0.1:2801/"}, relay=False))
+
+        mock_config.update.assert_called_once()
+        context = mock_config.update.call_args.kwargs["context"]
+        assert context["http_output"] == {
+            "url": "http://10.0.0.1:2801/",
+            "keep_alive": True,
+            "compress_uploads": False,
+            "ca_cert": False,
+        }
+        assert context["engine"]["buf_size_preset"] == 4
+        assert context["metrics"]["counters"]["kernel_event_counters"] is True
+        mock_systemd.daemon_reload.assert_not_called()
+        mock_systemd.service_restart.assert_not_called()
+        mock_systemd.service_reload.assert_called_once_with(FALCO_SERVICE_NAME)
+
+    @patch("service.systemd")
+    def test_configure_outputs(self, mock_systemd):
+        """Test the service file and alerts file rotation follow the selected output channels."""
+        mock_config = MagicMock()
+        mock_config.update.return_value = FalcoChange.NONE
+        mock_config.update_ca_cert.return_value = FalcoChange.NONE
+        mock_service_file = MagicMock()
+        mock_service_file.service_name = FALCO_SERVICE_NAME
+        mock_service_file.context = {}
+        mock_service_file.install.return_value = True
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.configure.return_value = FalcoChange.NONE
+        mock_logrotate_file = MagicMock()
+        charm_state = CharmState(outputs=["stdout", "file"])
+
+        service = FalcoService(
+            mock_config, mock_service_file, mock_custom_setting, mock_logrotate_file
+        )
+        service.configure(charm_state)
+
+        assert mock_service_file.context["stdout_output"]
+        mock_logrotate_file.configure.assert_called_once_with(charm_state)
         mock_systemd.service_restart.assert_called_once_with(FALCO_SERVICE_NAME)
 
+    def test_fingerprint(self, tmp_path):
+        """Test the fingerprint changes with the charm state and the installed files."""
+        mock_config = MagicMock()
+        mock_config.destination = tmp_path / "falco.yaml"
+        mock_service_file = MagicMock()
+        mock_service_file.destination = tmp_path / "falco.service"
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.manifest.return_value = {}
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        fingerprint = service.fingerprint(CharmState())
+        assert fingerprint == service.fingerprint(CharmState())
+        assert fingerprint != service.fingerprint(CharmState(http_output={"url": "http://a/"}))
+
+        mock_config.destination.write_text("changed")
+        assert fingerprint != service.fingerprint(CharmState())
+
+    def test_fingerprint_custom_config_repo(self, tmp_path):
+        """Test the fingerprint is only computed for immutable custom config repository refs."""
+        mock_config = MagicMock()
+        mock_config.destination = tmp_path / "falco.yaml"
+        mock_service_file = MagicMock()
+        mock_service_file.destination = tmp_path / "falco.service"
+        mock_custom_setting = MagicMock()
+        mock_custom_setting.manifest.return_value = {}
+        sync_manifest_file = tmp_path / "sync.json"
+        charm_state = CharmState(
+            custom_config_repo=AnyUrl("git+ssh://git@github.com/user/repo.git"),
+            custom_config_repo_ref="main",
+        )
+
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
+        with patch("service.SYNC_MANIFEST_FILE", sync_manifest_file):
+            assert service.fingerprint(charm_state) is None
+
+            sync_manifest = SyncManifest(
+                url="git+ssh://git@github.com/user/repo.git",
+                ref="main",
+                commit="abc123",
+                immutable=False,
+                files={},
+                synced_at=0,
+            )
+            sync_manifest.save(sync_manifest_file)
+            assert service.fingerprint(charm_state) is None
+
+            sync_manifest.immutable = True
+            sync_manifest.save(sync_manifest_file)
+            assert service.fingerprint(charm_state) is not None
+
     @patch("service.systemd")
     def test_check_active_running(self, mock_systemd):
         """Test check_active when service is running."""
@@ -272,7 +1033,7 @@ class TestFalcoService:
         mock_service_file.service_name = FALCO_SERVICE_NAME
         mock_custom_setting = MagicMock()
 
-        service = FalcoService(mock_config, mock_service_file, mock_custom_setting)
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
         assert service.check_active() is True
         mock_systemd.service_running.assert_called_once_with(FALCO_SERVICE_NAME)
 
@@ -286,55 +1047,395 @@ class TestFalcoService:
         mock_service_file.service_name = FALCO_SERVICE_NAME
         mock_custom_setting = MagicMock()
 
-        service = FalcoService(mock_config, mock_service_file, mock_custom_setting)
+        service = FalcoService(mock_config, mock_service_file, mock_custom_setting, MagicMock())
         assert service.check_active() is False
         mock_systemd.service_running.assert_called_once_with(FALCO_SERVICE_NAME)
 
 
+class TestDetectPlugins:
+    """Test detect_plugins function."""
+
+    @pytest.fixture
+    def runtime_socket(self, tmp_path):
+        """Create a unix socket standing for a container runtime socket."""
+        path = tmp_path / "containerd.sock"
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.bind(str(path))
+            yield path
+
+    def test_detect_plugins_container_runtime(self, runtime_socket, tmp_path):
+        """Test the container plugin is detected from a container runtime socket."""
+        with (
+            patch.dict(
+                "config.CONTAINER_ENGINES",
+                {"containerd": (str(tmp_path / "none.sock"), str(runtime_socket))},
+                clear=True,
+            ),
+            patch("service.K8S_APISERVER_PATHS", ()),
+            patch("service._is_k8s_apiserver", return_value=False),
+        ):
+            assert service.detect_plugins() == ["container"]
+
+    def test_detect_plugins_k8s_apiserver(self, tmp_path):
+        """Test the k8saudit and json plugins are detected on a Kubernetes API server."""
+        manifest = tmp_path / "kube-apiserver.yaml"
+        manifest.touch()
+        with (
+            patch.dict("config.CONTAINER_ENGINES", {"docker": (str(manifest),)}, clear=True),
+            patch("service.K8S_APISERVER_PATHS", (manifest,)),
+        ):
+            assert service.detect_plugins() == ["json", "k8saudit"]
+
+    def test_detect_plugins_none(self, tmp_path):
+        """Test no plugin is detected on a plain host."""
+        with (
+            patch.dict(
+                "config.CONTAINER_ENGINES", {"docker": (str(tmp_path / "none.sock"),)}, clear=True
+            ),
+            patch("service._is_k8s_apiserver", return_value=False),
+        ):
+            assert service.detect_plugins() == []
+
+    def test_detect_container_engines(self, runtime_socket, tmp_path):
+        """Test only the container engines present are detected, with their existing sockets."""
+        lxc_dir = tmp_path / "lxc"
+        lxc_dir.mkdir()
+        with (
+            patch.dict(
+                "config.CONTAINER_ENGINES",
+                {
+                    "docker": (str(tmp_path / "docker.sock"),),
+                    "containerd": (str(tmp_path / "none.sock"), str(runtime_socket)),
+                    "lxc": (),
+                    "bpm": (),
+                },
+                clear=True,
+            ),
+            patch.dict("service.CONTAINER_ENGINE_PATHS", {"lxc": (lxc_dir,)}, clear=True),
+        ):
+            assert service.detect_container_engines() == {
+                "containerd": [str(runtime_socket)],
+                "lxc": [],
+            }
+
+    @patch("service.JujuTopology")
+    def test_config_file_load_plugins(self, mock_topology, mock_falco_layout):
+        """Test only the selected plugins are loaded."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["load_plugins"] == ["json", "k8saudit", "container"]
+
+        assert config_file.update({"plugins": ["container"]}) == FalcoChange.RESTART
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["load_plugins"] == ["container"]
+
+        config_file.update({"plugins": []})
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["load_plugins"] == []
+
+    @patch("service.JujuTopology")
+    def test_config_file_outputs_queue(self, mock_topology, mock_falco_layout):
+        """Test the outputs queue and timeout settings are rendered and reloaded."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["outputs_queue"] == {"capacity": 0}
+        assert config["buffered_outputs"] is False
+        assert config["output_timeout"] == 2000
+
+        charm_state = CharmState(
+            outputs_queue_capacity=1000, buffered_outputs=True, output_timeout=500
+        )
+        change = config_file.update(service._config_file_context(charm_state))
+        assert change == FalcoChange.RELOAD
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["outputs_queue"] == {"capacity": 1000}
+        assert config["buffered_outputs"] is True
+        assert config["output_timeout"] == 500
+
+    def test_config_file_context_relay(self):
+        """Test the HTTP output points to the local relay when it is enabled."""
+        http_output = {"url": "https://10.0.0.1:2801/"}
+        context = service._config_file_context(
+            CharmState(http_output=http_output, http_output_ca_cert="PEM", relay_token="secret")
+        )
+        assert context["http_output"] == {
+            "url": f"http://127.0.0.1:{service.RELAY_PORT}/secret",
+            "keep_alive": True,
+            "compress_uploads": False,
+            "ca_cert": False,
+        }
+
+        context = service._config_file_context(CharmState(http_output=http_output, relay=False))
+        assert context["http_output"]["url"] == "https://10.0.0.1:2801/"
+
+    @patch("service.JujuTopology")
+    def test_config_file_rules(self, mock_topology, mock_falco_layout):
+        """Test the selected default rulesets, rule selectors and priority are rendered."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["rules_files"] == [str(mock_falco_layout.rules_dir)]
+        assert config["rules"] == []
+        assert config["priority"] == "debug"
+
+        charm_state = CharmState(
+            rulesets=["stable", "incubating"],
+            rules_disable=["tag:network", "Terminal shell in container"],
+            rules_enable=["Outbound Connection to C2 Servers"],
+            priority="notice",
+        )
+        change = config_file.update(service._config_file_context(charm_state))
+        assert change == FalcoChange.RELOAD
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["rules_files"] == [
+            str(mock_falco_layout.default_rules_dir / "falco_rules.yaml"),
+            str(mock_falco_layout.default_rules_dir / "falco-incubating_rules.yaml"),
+            str(mock_falco_layout.rules_dir),
+        ]
+        assert config["rules"] == [
+            {"disable": {"tag": "network"}},
+            {"disable": {"rule": "Terminal shell in container"}},
+            {"enable": {"rule": "Outbound Connection to C2 Servers"}},
+        ]
+        assert config["priority"] == "notice"
+
+    @patch("service.JujuTopology")
+    def test_config_file_render(self, mock_topology, mock_falco_layout):
+        """Test rendering the config file with new context does not install it."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        installed = mock_falco_layout.config_file.read_bytes()
+
+        rendered = config_file.render({"priority": "error"})
+
+        assert yaml.safe_load(rendered)["priority"] == "error"
+        assert mock_falco_layout.config_file.read_bytes() == installed
+        assert config_file.context["priority"] == "debug"
+
+    @patch("service.JujuTopology")
+    def test_config_file_base_syscalls(self, mock_topology, mock_falco_layout):
+        """Test the base syscalls are rendered and require a restart."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["base_syscalls"] == {"custom_set": [], "repair": False}
+
+        charm_state = CharmState(base_syscalls_custom_set=["!read"], base_syscalls_repair=True)
+        change = config_file.update(service._config_file_context(charm_state))
+        assert change == FalcoChange.RESTART
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["base_syscalls"] == {"custom_set": ["!read"], "repair": True}
+
+    @patch("service.JujuTopology")
+    def test_config_file_outputs(self, mock_topology, mock_falco_layout):
+        """Test only the selected output channels are enabled."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        # Without the http-endpoint relation, the alerts fall back to syslog
+        assert config["stdout_output"] == {"enabled": False}
+        assert config["syslog_output"] == {"enabled": True}
+        assert config["file_output"]["enabled"] is False
+
+        charm_state = CharmState(
+            http_output={"url": "http://10.0.0.1:2801/"}, outputs=["http", "file"]
+        )
+        change = config_file.update(service._config_file_context(charm_state))
+        assert change == FalcoChange.RELOAD
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        assert config["http_output"]["enabled"] is True
+        assert config["stdout_output"] == {"enabled": False}
+        assert config["syslog_output"] == {"enabled": False}
+        assert config["file_output"] == {
+            "enabled": True,
+            "keep_alive": True,
+            "filename": str(service.FALCO_EVENTS_FILE),
+        }
+
+    @patch("service.JujuTopology")
+    def test_config_file_container_plugin(self, mock_topology, mock_falco_layout):
+        """Test the container plugin only queries the selected container engines."""
+        mock_topology.from_charm.return_value.as_dict.return_value = JUJU_TOPOLOGY
+        config_file = FalcoConfigFile(mock_falco_layout, MagicMock())
+        config_file.install()
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        (container,) = (plugin for plugin in config["plugins"] if plugin["name"] == "container")
+        assert container["init_config"]["label_max_len"] == 100
+        assert container["init_config"]["with_size"] is False
+        assert all(engine["enabled"] for engine in container["init_config"]["engines"].values())
+
+        charm_state = CharmState(
+            container_engines={"containerd": ["/run/k3s/containerd/containerd.sock"]},
+            container_label_max_len=64,
+            container_hooks=[],
+        )
+        change = config_file.update(service._config_file_context(charm_state))
+        assert change == FalcoChange.RESTART
+        config = yaml.safe_load(mock_falco_layout.config_file.read_text())
+        (container,) = (plugin for plugin in config["plugins"] if plugin["name"] == "container")
+        init_config = container["init_config"]
+        assert init_config["label_max_len"] == 64
+        assert init_config["hooks"] == []
+        assert init_config["engines"]["containerd"] == {
+            "enabled": True,
+            "sockets": ["/run/k3s/containerd/containerd.sock"],
+        }
+        assert init_config["engines"]["docker"]["enabled"] is False
+        assert init_config["engines"]["lxc"] == {"enabled": False}
+
+
 class TestUtilityFunctions:
     """Test utility functions in service module."""
 
-    @patch("service.subprocess.run")
-    def test_pull_falco_rule_files_rsync_error(self, mock_run):
-        """Test _pull_falco_rule_files handles rsync error."""
-        mock_run.side_effect = subprocess.CalledProcessError(1, "rsync")
+    def test_sync_files(self, tmp_path):
+        """Test _sync_files only writes changed files and deletes stale ones."""
+        source = tmp_path / "source"
+        destination = tmp_path / "destination"
+        source.mkdir()
+        destination.mkdir()
+        (source / "a.yaml").write_text("a")
+        (source / "b.yaml").write_text("b")
+        (source / "README.md").write_text("readme")
+        (destination / "b.yaml").write_text("b")
+        (destination / "stale.yaml").write_text("stale")
+        (destination / "other.txt").write_text("other")
+        mtime = (destination / "b.yaml").stat().st_mtime_ns
+
+        assert service._sync_files(source, destination) == {"a.yaml", "stale.yaml"}
+
+        assert sorted(p.name for p in destination.iterdir()) == ["a.yaml", "b.yaml", "other.txt"]
+        assert (destination / "a.yaml").read_text() == "a"
+        assert (destination / "b.yaml").stat().st_mtime_ns == mtime
+
+        assert service._sync_files(source, destination) == set()
+
+    def test_write_file_atomic(self, tmp_path):
+        """Test _write_file_atomic keeps the file mode and writes outside of the destination."""
+        destination = tmp_path / "destination"
+        destination.mkdir()
+        tmp_dir = tmp_path / "tmp"
+
+        service._write_file_atomic(destination / "a.yaml", b"a", tmp_dir)
+        assert (destination / "a.yaml").stat().st_mode & 0o777 == 0o644
+
+        (destination / "a.yaml").chmod(0o640)
+        with patch("service.os.replace", wraps=os.replace) as mock_replace:
+            service._write_file_atomic(destination / "a.yaml", b"b", tmp_dir)
+
+        assert Path(mock_replace.call_args.args[0]).parent == tmp_dir
+        assert (destination / "a.yaml").read_bytes() == b"b"
+        assert (destination / "a.yaml").stat().st_mode & 0o777 == 0o640
+        assert [p.name for p in destination.iterdir()] == ["a.yaml"]
+        assert not any(tmp_dir.iterdir())
+
+    def test_sync_files_missing_source(self, tmp_path):
+        """Test _sync_files treats a missing source directory as empty."""
+        destination = tmp_path / "destination"
+        destination.mkdir()
+        (destination / "a.yaml").write_text("a")
+
+        assert service._sync_files(tmp_path / "missing", destination) == {"a.yaml"}
+        assert not (destination / "a.yaml").exists()
+
+    def test_sync_files_error(self, tmp_path):
+        """Test _sync_files handles write error."""
+        source = tmp_path / "source"
+        source.mkdir()
+        (source / "a.yaml").write_text("a")
+
+        with pytest.raises(FileSyncError):
+            service._sync_files(source, tmp_path / "missing")
+
+    def test_git_fetch(self, tmp_path, monkeypatch):
+        """Test _git_fetch fetches into a persistent clone and only checks out new commits."""
+        for var in ("AUTHOR", "COMMITTER"):
+            monkeypatch.setenv(f"GIT_{var}_NAME", "test")
+            monkeypatch.setenv(f"GIT_{var}_EMAIL", "test@example.com")
+        upstream = tmp_path / "upstream"
+        subprocess.run(["git", "init", "--quiet", "-b", "main", str(upstream)], check=True)
+        (upstream / "rules.d").mkdir()
+        (upstream / "rules.d" / "a.yaml").write_text("rule a")
+        subprocess.run(["git", "-C", str(upstream), "add", "."], check=True)
+        subprocess.run(["git", "-C", str(upstream), "commit", "--quiet", "-m", "a"], check=True)
+        clone_dir = tmp_path / "clone"
+
+        with patch("service.CLONE_OUTPUT_DIR", clone_dir):
+            first = service._git_fetch(f"file://{upstream}", ref="main")
+            assert (clone_dir / "rules.d" / "a.yaml").read_text() == "rule a"
+
+            with patch("service._git", wraps=service._git) as mock_git:
+                assert service._git_fetch(f"file://{upstream}", ref="main") == first
+                assert not any(c.args[0] == "checkout" for c in mock_git.call_args_list)
+
+            (upstream / "rules.d" / "a.yaml").unlink()
+            (upstream / "rules.d" / "b.yaml").write_text("rule b")
+            subprocess.run(["git", "-C", str(upstream), "add", "-A"], check=True)
+            subprocess.run(
+                ["git", "-C", str(upstream), "commit", "--quiet", "-m", "b"], check=True
+            )
 
-        with pytest.raises(RsyncError):
-            service._pull_falco_rule_files("/dummy/destination")
+            second = service._git_fetch(f"file://{upstream}", ref="main")
+            assert second != first
+            assert not (clone_dir / "rules.d" / "a.yaml").exists()
+            assert (clone_dir / "rules.d" / "b.yaml").read_text() == "rule b"
+
+    @pytest.mark.parametrize(
+        "fetch_head, expected",
+        [
+            pytest.param("abc\t\ttag 'v1.0' of git@github.com:user/repo\n", True, id="tag"),
+            pytest.param("abc\t\tbranch 'main' of git@github.com:user/repo\n", False, id="branch"),
+            pytest.param("abc\t\tgit@github.com:user/repo\n", False, id="head"),
+            pytest.param(None, False, id="not fetched"),
+        ],
+    )
+    def test_git_fetched_tag(self, fetch_head, expected, tmp_path):
+        """Test _git_fetched_tag detects whether a tag was fetched."""
+        (tmp_path / ".git").mkdir()
+        if fetch_head is not None:
+            (tmp_path / ".git" / "FETCH_HEAD").write_text(fetch_head)
+
+        with patch("service.CLONE_OUTPUT_DIR", tmp_path):
+            assert service._git_fetched_tag() is expected
+
+    @pytest.mark.parametrize(
+        "ref, expected",
+        [
+            pytest.param("main", "aaa", id="branch"),
+            pytest.param("", "ccc", id="head"),
+            pytest.param("missing", "", id="missing"),
+        ],
+    )
+    @patch("service.subprocess.check_output")
+    def test_git_ls_remote(self, mock_check_output, ref, expected):
+        """Test _git_ls_remote resolves branches."""
+        mock_check_output.return_value = (
+            b"aaa\trefs/heads/main\nbbb\trefs/heads/feature/main\nccc\tHEAD\n"
+        )
 
-    @patch("service.subprocess.run")
-    def test_pull_falco_config_files_rsync_error(self, mock_run):
-        """Test _pull_falco_config_files handles rsync error."""
-        mock_run.side_effect = subprocess.CalledProcessError(1, "rsync")
+        assert service._git_ls_remote("git+ssh://git@github.com/user/repo.git", ref) == expected
 
-        with pytest.raises(RsyncError):
-            service._pull_falco_config_files("/dummy/destination")
+    @patch("service.subprocess.check_output")
+    def test_git_ls_remote_error(self, mock_check_output):
+        """Test _git_ls_remote handles git errors."""
+        mock_check_output.side_effect = subprocess.CalledProcessError(1, "git")
 
-    @patch("service.subprocess")
-    @patch("service.shutil")
-    def test_git_clone_success(self, mock_shutil, mock_subprocess):
-        """Test _git_clone with successful clone."""
-        service._git_clone("git+ssh://git@github.com/user/repo.git", ref="main")
-
-        mock_shutil.rmtree.assert_called_once()
-        mock_subprocess.run.assert_called_once()
-
-        # Verify git clone command
-        call_args = mock_subprocess.run.call_args[0][0]
-        assert "clone" in call_args
-        assert "--depth" in call_args
-        assert "1" in call_args
-        assert "-b" in call_args
-        assert "main" in call_args
+        assert service._git_ls_remote("git+ssh://git@github.com/user/repo.git", "main") == ""
 
-    @patch("service.subprocess.run")
-    @patch("service.shutil")
-    def test_git_clone_error(self, mock_shutil, mock_run):
-        """Test _git_clone handles clone error."""
-        mock_run.side_effect = subprocess.CalledProcessError(1, "git")
+    @patch("service.subprocess.check_output")
+    def test_git_fetch_error(self, mock_check_output, tmp_path):
+        """Test _git_fetch handles fetch error."""
+        mock_check_output.side_effect = subprocess.CalledProcessError(1, "git")
 
-        with pytest.raises(GitCloneError):
-            service._git_clone("git+ssh://git@github.com/user/repo.git")
+        with patch("service.CLONE_OUTPUT_DIR", tmp_path / "clone"), pytest.raises(GitCloneError):
+            service._git_fetch("git+ssh://git@github.com/user/repo.git")
 
     @patch("service.subprocess")
     def test_setup_ssh_key_success(self, mock_subprocess, tmp_path):
@@ -378,6 +1479,17 @@ class TestUtilityFunctions:
             assert test_known_hosts.exists()
             assert "github.com ssh-rsa AAAA..." in test_known_hosts.read_text()
 
+    @patch("service.subprocess.check_output")
+    def test_add_known_hosts_already_known(self, mock_check_output, tmp_path):
+        """Test _add_known_hosts skips the keyscan for known hosts."""
+        test_known_hosts = tmp_path / "known_hosts"
+        test_known_hosts.write_text("github.com ssh-rsa AAAA...\n")
+
+        with patch("service.KNOWN_HOSTS_FILE", test_known_hosts):
+            service._add_known_hosts("github.com")
+
+        mock_check_output.assert_not_called()
+
     @patch("service.subprocess.check_output")
     def test_add_known_hosts_keyscan_error(self, mock_check_output):
         """Test _add_known_hosts handles keyscan error."""
@@ -403,100 +1515,38 @@ class TestUtilityFunctions:
         # Cleanup
         readonly_dir.chmod(0o755)
 
-    @patch("service.subprocess")
-    def test_get_cloned_repo_url_success(self, mock_subprocess):
-        """Test _get_cloned_repo_url returns URL."""
-        mock_subprocess.check_output.return_value = b"git+ssh://git@github.com/user/repo.git\n"
-
-        url = service._get_cloned_repo_url()
-        assert url == "git+ssh://git@github.com/user/repo.git"
-
-    @patch("service.subprocess.check_output")
-    def test_get_cloned_repo_url_not_cloned(self, mock_check_output):
-        """Test _get_cloned_repo_url when repo not cloned."""
-        mock_check_output.side_effect = subprocess.CalledProcessError(1, "git")
-
-        url = service._get_cloned_repo_url()
-        assert url == ""
-
-    @patch("service.subprocess")
-    def test_get_cloned_repo_tag_success(self, mock_subprocess):
-        """Test _get_cloned_repo_tag returns tag."""
-        mock_subprocess.check_output.return_value = b"v1.0.0\n"
-
-        tag = service._get_cloned_repo_tag()
-        assert tag == "v1.0.0"
-
+    @patch("service._git_fetch")
     @patch("service.subprocess.check_output")
-    def test_get_cloned_repo_tag_no_tag(self, mock_check_output):
-        """Test _get_cloned_repo_tag when no tag exists."""
-        mock_check_output.side_effect = subprocess.CalledProcessError(1, "git")
-
-        tag = service._get_cloned_repo_tag()
-        assert tag == ""
-
-    @patch("service.subprocess")
-    def test_git_sync_already_synced(self, mock_subprocess):
-        """Test _git_sync returns early if repo already synced."""
-
-        # Mock that repo is already cloned with same URL and tag
-        def check_output_side_effect(cmd, *args, **kwargs):
-            if "config" in cmd:
-                return b"git+ssh://git@github.com/user/repo.git\n"
-            elif "describe" in cmd:
-                return b"v1.0\n"
-            return b""
-
-        mock_subprocess.check_output.side_effect = check_output_side_effect
-
-        service._git_sync("git+ssh://git@github.com/user/repo.git", "github.com", ref="v1.0")
-
-        # Should not call run (git clone) if already synced
-        mock_subprocess.run.assert_not_called()
-
-    @patch("service.subprocess.check_output")
-    @patch("service.subprocess.run")
-    def test_git_sync_with_ssh_key(self, mock_run, mock_check_output, tmp_path):
+    def test_git_sync_with_ssh_key(self, mock_check_output, mock_git_fetch, tmp_path):
         """Test _git_sync sets up SSH key when provided."""
         test_ssh_key_file = tmp_path / "id_rsa"
         test_known_hosts = tmp_path / "known_hosts"
+        mock_check_output.return_value = b"github.com ssh-rsa AAAA...\n"
+        mock_git_fetch.return_value = "abc123"
 
         with (
             patch("service.SSH_KEY_FILE", test_ssh_key_file),
             patch("service.KNOWN_HOSTS_FILE", test_known_hosts),
         ):
-            # Mock check_output calls: repo URL check, tag check, and keyscan
-            # _git_sync calls _get_cloned_repo_url, _get_cloned_repo_tag, and _add_known_hosts
-            mock_check_output.side_effect = [
-                subprocess.CalledProcessError(1, "git"),  # get_cloned_repo_url
-                subprocess.CalledProcessError(1, "git"),  # get_cloned_repo_tag
-                b"github.com ssh-rsa AAAA...\n",  # add_known_hosts
-            ]
-
-            service._git_sync(
+            commit = service._git_sync(
                 "git+ssh://git@github.com/user/repo.git", "github.com", ssh_private_key="test-key"
             )
 
             # Verify SSH key was written
             assert test_ssh_key_file.exists()
             assert test_ssh_key_file.read_text() == "test-key"
+            assert commit == "abc123"
 
+    @patch("service._git_fetch")
     @patch("service.subprocess.check_output")
-    @patch("service.subprocess.run")
-    def test_git_sync_without_ssh_key(self, mock_run, mock_check_output, tmp_path):
+    def test_git_sync_without_ssh_key(self, mock_check_output, mock_git_fetch, tmp_path):
         """Test _git_sync without SSH key (e.g., public repo)."""
         test_known_hosts = tmp_path / "known_hosts"
+        mock_check_output.return_value = b"github.com ssh-rsa AAAA...\n"
 
         with patch("service.KNOWN_HOSTS_FILE", test_known_hosts):
-            # Mock check_output calls
-            mock_check_output.side_effect = [
-                subprocess.CalledProcessError(1, "git"),  # get_cloned_repo_url
-                subprocess.CalledProcessError(1, "git"),  # get_cloned_repo_tag
-                b"github.com ssh-rsa AAAA...\n",  # add_known_hosts
-            ]
-
             # Call without ssh_private_key parameter
             service._git_sync("https://github.com/user/repo.git", "github.com")
 
-            # Verify git clone was called
-            mock_run.assert_called_once()
+            # Verify git fetch was called
+            mock_git_fetch.assert_called_once_with("https://github.com/user/repo.git", ref="")
@@ -0,0 +1,136 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for syscalls module."""
+
+import subprocess
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from metrics import parse_metrics
+from syscalls import (
+    SyscallsError,
+    SyscallSets,
+    compare,
+    repaired_config,
+    syscall_counts,
+    syscall_sets,
+)
+
+DRY_RUN_STDERR = (
+    "Fri Oct 17 10:00:00 2026: (2) syscalls in rules: execve, openat, connect\n"
+    "Fri Oct 17 10:00:00 2026: +(4) syscalls (Falco's state engine set of syscalls): close\n"
+    "Fri Oct 17 10:00:00 2026: (5) syscalls selected in total (final set): "
+    "close, connect, execve, openat, socket\n"
+)
+
+
+class TestSyscallSets:
+    """Test the syscalls Falco selects."""
+
+    @patch("syscalls.subprocess.run")
+    def test_syscall_sets(self, mock_run, mock_falco_layout):
+        """Test the syscalls are parsed from a dry run with the replaced base syscalls."""
+        mock_falco_layout.config_file.write_text("engine:\n  kind: modern_ebpf\n")
+        mock_run.return_value = MagicMock(stdout="", stderr=DRY_RUN_STDERR)
+
+        sets = syscall_sets(mock_falco_layout, {"custom_set": [], "repair": True})
+
+        assert sets == SyscallSets(
+            rules=["connect", "execve", "openat"],
+            final=["close", "connect", "execve", "openat", "socket"],
+        )
+        cmd = mock_run.call_args.args[0]
+        assert cmd[:4] == [
+            str(mock_falco_layout.cmd),
+            "-c",
+            str(mock_falco_layout.config_file),
+            "--dry-run",
+        ]
+        # Command line options take precedence over the custom config overrides
+        options = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-o"]
+        assert "log_level=debug" in options
+        assert "log_stderr=true" in options
+        assert "base_syscalls.custom_set=[]" in options
+        assert "base_syscalls.repair=true" in options
+
+    @patch("syscalls.subprocess.run")
+    def test_syscall_sets_configured(self, mock_run, mock_falco_layout):
+        """Test the configured base syscalls, including the overrides, are kept by default."""
+        mock_falco_layout.config_file.write_text("{}")
+        mock_run.return_value = MagicMock(stdout="", stderr=DRY_RUN_STDERR)
+
+        syscall_sets(mock_falco_layout)
+
+        assert not any(arg.startswith("base_syscalls") for arg in mock_run.call_args.args[0])
+
+    def test_repaired_config(self):
+        """Test the charm config options match the repaired base syscalls of the comparison."""
+        assert repaired_config() == 'base-syscalls-custom-set="" base-syscalls-repair=true'
+
+    @patch("syscalls.subprocess.run")
+    def test_syscall_sets_not_reported(self, mock_run, mock_falco_layout):
+        """Test an error is raised when Falco does not report its syscalls."""
+        mock_falco_layout.config_file.write_text("{}")
+        mock_run.return_value = MagicMock(stdout="", stderr="Loading rules\n")
+
+        with pytest.raises(SyscallsError, match="did not report"):
+            syscall_sets(mock_falco_layout)
+
+    @patch("syscalls.subprocess.run")
+    def test_syscall_sets_dry_run_error(self, mock_run, mock_falco_layout):
+        """Test an error is raised when Falco fails to load its config."""
+        mock_falco_layout.config_file.write_text("{}")
+        mock_run.side_effect = subprocess.CalledProcessError(1, "falco", stderr="bad rules")
+
+        with pytest.raises(SyscallsError, match="bad rules"):
+            syscall_sets(mock_falco_layout)
+
+    def test_syscall_sets_missing_config(self, mock_falco_layout):
+        """Test an error is raised when the Falco config file is missing."""
+        with pytest.raises(SyscallsError, match="Failed to load"):
+            syscall_sets(mock_falco_layout)
+
+
+def test_syscall_counts():
+    """Test the enter and exit program run counts are summed by syscall."""
+    samples = parse_metrics(
+        "falcosecurity_scap_libbpf_openat_e_run_cnt_total 10\n"
+        "falcosecurity_scap_libbpf_openat_x_run_cnt_total 12\n"
+        "falcosecurity_scap_libbpf_close_x_run_cnt_total 5\n"
+        "falcosecurity_scap_libbpf_close_x_run_time_ns_total 500\n"
+        "falcosecurity_scap_n_evts_total 100\n"
+    )
+
+    assert syscall_counts(samples) == {"openat": 22, "close": 5}
+
+
+class TestCompare:
+    """Test the base syscalls comparison."""
+
+    current = SyscallSets(rules=["execve", "openat"], final=["close", "execve", "openat", "read"])
+    repaired = SyscallSets(rules=["execve", "openat"], final=["close", "execve", "openat"])
+
+    def test_compare(self):
+        """Test the rate of the syscalls no longer traced and the unobserved rules syscalls."""
+        comparison = compare(
+            self.current,
+            self.repaired,
+            before={"read": 100, "openat": 10},
+            after={"read": 700, "openat": 40, "execve": 0},
+            seconds=30,
+        )
+
+        assert comparison.current == ["close", "execve", "openat", "read"]
+        assert comparison.repaired == ["close", "execve", "openat"]
+        assert comparison.removed_rate == 20.0
+        assert comparison.unobserved == ["execve"]
+
+    def test_compare_not_sampled(self):
+        """Test the rates are not reported without samples."""
+        comparison = compare(self.current, self.repaired)
+
+        assert comparison.repaired == ["close", "execve", "openat"]
+        assert comparison.removed_rate is None
+        assert comparison.unobserved == []
@@ -80,6 +80,17 @@ class TlsCertificateRequirer:
 
         return update_required
 
+    def get_ca_cert(self) -> Optional[str]:
+        """Get the CA certificate of the currently assigned certificate.
+
+        Returns:
+            The PEM encoded CA certificate, or None if no certificate is assigned.
+        """
+        cert, _ = self._get_assigned_cert_and_key()
+        if not cert:
+            return None
+        return str(cert.ca)
+
     def _get_assigned_cert_and_key(
         self,
     ) -> tuple[Optional[ProviderCertificate], Optional[PrivateKey]]:
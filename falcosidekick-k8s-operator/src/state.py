@@ -96,6 +96,8 @@ class CharmState(BaseModel):
             "set_ports": True,
             "hostname": None,
             "listen_port": charm_config.port,
+            # Clients need the CA of the certificates relation, unlike the ingress one
+            "ca_cert": tls_certificate_requirer.get_ca_cert() if tls_relation else None,
         }
         if ingress_requirer.is_ready():
             ingress_url = HttpUrl(ingress_requirer.url)
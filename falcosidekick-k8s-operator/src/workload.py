@@ -3,12 +3,13 @@
 
 """Charm workload module."""
 
+import functools
 import logging
 from pathlib import Path
 
 import ops
 from charms.prometheus_k8s.v0.prometheus_scrape import MetricsEndpointProvider
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from pfe.interfaces.falcosidekick_http_endpoint import HttpEndpointProvider
 
 import state
@@ -28,6 +29,24 @@ class WorkloadNotStartingError(Exception):
     """Exception raised when the workload is not starting."""
 
 
+@functools.cache
+def _get_template_environment() -> Environment:
+    """Get the Jinja environment shared by all templates.
+
+    Compiled templates are cached on disk, so that templates are not parsed and compiled again
+    on every hook.
+
+    Returns:
+        The Jinja environment.
+    """
+    return Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=True,
+        auto_reload=False,
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+
+
 class Template:
     """Template file manager.
 
@@ -47,8 +66,7 @@ class Template:
         self.destination = destination
         self.container = container
 
-        self._env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True)
-        self._template = self._env.get_template(self.name)
+        self._template = _get_template_environment().get_template(self.name)
 
     def install(self, context: dict) -> bool:
         """Render and install template file.
@@ -82,6 +82,33 @@ class TestTlsCertificateRequirer:
             assert result is False
             mock_container.push.assert_not_called()
 
+    @pytest.mark.parametrize(
+        "cert,expected_ca",
+        [
+            (MagicMock(spec=ProviderCertificate, ca="mock ca"), "mock ca"),  # Assigned
+            (None, None),  # Not assigned
+        ],
+    )
+    def test_get_ca_cert(self, mock_get_assigned_certificate, cert, expected_ca):
+        """Test get_ca_cert returns the CA of the assigned certificate.
+
+        Arrange: Set up mock charm with TLS relation and optional certificate.
+        Act: Get the CA certificate.
+        Assert: Returns the CA only when a certificate is assigned.
+        """
+        # Arrange
+        mock_charm = MagicMock()
+        mock_charm.model.relations.get.return_value = [Mock()]
+        mock_get_assigned_certificate.return_value = (cert, MagicMock(spec=PrivateKey))
+
+        tls_requirer = TlsCertificateRequirer(mock_charm, "certificates")
+
+        # Act
+        result = tls_requirer.get_ca_cert()
+
+        # Assert
+        assert result == expected_ca
+
     def test_configure_update(self, mock_get_assigned_certificate):
         """Test configure with certificate update.
 
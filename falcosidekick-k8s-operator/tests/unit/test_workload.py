@@ -15,12 +15,27 @@ from workload import (
     Falcosidekick,
     FalcosidekickConfigFile,
     Template,
+    _get_template_environment,
 )
 
 
 class TestTemplate:
     """Test Template class."""
 
+    def test_templates_share_environment(self):
+        """Test templates share a single Jinja environment with a bytecode cache.
+
+        Arrange: Get the shared Jinja environment.
+        Act: Create a template.
+        Assert: The template is loaded from the shared environment.
+        """
+        env = _get_template_environment()
+
+        template = Template("falcosidekick.yaml.j2", Path("/etc/test.yaml"), Mock())
+
+        assert template._template.environment is env
+        assert env.bytecode_cache is not None
+
     def test_install_template_ok_with_changes(self):
         """Test template installation succeeds when configuration changes.
 
@@ -1,7 +1,7 @@
 # Copyright 2026 Canonical Ltd.
 # See LICENSE file for licensing details.
 
-"""Source code of `pfe.interfaces.falcosidekick_http_endpoint` v1.0.0."""
+"""Source code of `pfe.interfaces.falcosidekick_http_endpoint` v1.1.0."""
 
 import logging
 
@@ -12,9 +12,17 @@ logger = logging.getLogger(__name__)
 
 
 class _HttpEndpointDataModel(BaseModel):
-    """Data model for falcosidekick_http_endpoint interface."""
+    """Data model for falcosidekick_http_endpoint interface.
+
+    Attributes:
+        url: The URL of the HTTP endpoint.
+        compression: Whether the endpoint accepts gzip compressed request bodies.
+        ca_cert: The PEM encoded CA certificate of the endpoint, if not publicly trusted.
+    """
 
     url: HttpUrl
+    compression: bool = False
+    ca_cert: str | None = None
 
 
 class HttpEndpointInvalidDataError(Exception):
@@ -33,6 +41,8 @@ class HttpEndpointProvider(Object):
         listen_port: int = 80,
         set_ports: bool = False,
         hostname: str | None = None,
+        compression: bool = False,
+        ca_cert: str | None = None,
     ) -> None:
         """Initialize an instance of HttpEndpointProvider class.
 
@@ -48,6 +58,10 @@ class HttpEndpointProvider(Object):
         author is responsible for ensuring that the related unit is able communicate over that
         port.
 
+        The provider may advertise that the endpoint accepts gzip compressed request bodies, and
+        publish the CA certificate of the endpoint when it is signed by a private CA, so that the
+        requirers can compress their uploads and verify the endpoint.
+
         Args:
             charm: The charm instance.
             relation_name: The name of relation.
@@ -56,6 +70,8 @@ class HttpEndpointProvider(Object):
             listen_port: The listen port to open [1, 65535].
             set_ports: Whether to set the unit port on the charm.
             hostname: Use hostname instead of ingress address if available.
+            compression: Whether the endpoint accepts gzip compressed request bodies.
+            ca_cert: The PEM encoded CA certificate of the endpoint.
         """
         super().__init__(charm, relation_name)
 
@@ -66,6 +82,8 @@ class HttpEndpointProvider(Object):
         self.listen_port = listen_port
         self.set_ports = set_ports
         self.hostname = hostname
+        self.compression = compression
+        self.ca_cert = ca_cert
 
         self.framework.observe(charm.on[relation_name].relation_changed, self._configure)
         self.framework.observe(charm.on.config_changed, self._configure)
@@ -110,7 +128,9 @@ class HttpEndpointProvider(Object):
         hostname = self.hostname or hostname
         url = f"{self.scheme}://{hostname}:{self.listen_port}/{self.path.lstrip('/')}"
         try:
-            falcosidekick_http_endpoint = _HttpEndpointDataModel(url=HttpUrl(url))
+            falcosidekick_http_endpoint = _HttpEndpointDataModel(
+                url=HttpUrl(url), compression=self.compression, ca_cert=self.ca_cert
+            )
             for relation in relations:
                 relation.save(falcosidekick_http_endpoint, self.charm.app)
                 logger.info(
@@ -133,6 +153,8 @@ class HttpEndpointProvider(Object):
         listen_port: int,
         set_ports: bool = False,
         hostname: str | None = None,
+        compression: bool = False,
+        ca_cert: str | None = None,
     ) -> None:
         """Update http endpoint configuration.
 
@@ -142,6 +164,8 @@ class HttpEndpointProvider(Object):
             listen_port: The listen port to open [1, 65535].
             set_ports: Whether to set the unit ports on the charm.
             hostname: Use hostname instead of ingress address if available.
+            compression: Whether the endpoint accepts gzip compressed request bodies.
+            ca_cert: The PEM encoded CA certificate of the endpoint.
 
         Raises:
             HttpEndpointInvalidDataError if not valid scheme.
@@ -151,6 +175,8 @@ class HttpEndpointProvider(Object):
         self.listen_port = listen_port
         self.set_ports = set_ports
         self.hostname = hostname
+        self.compression = compression
+        self.ca_cert = ca_cert
         self._update_config()
 
 
@@ -179,20 +205,46 @@ class HttpEndpointRequirer(Object):
             A dictionary of app names to URLs from the HTTP endpoints of all leader units if
             available.
         """
+        return {app: str(data.url) for app, data in self._get_app_data().items()}
+
+    def get_app_compression(self) -> dict[str, bool]:
+        """Get whether the HTTP endpoints of all related applications accept compressed bodies.
+
+        Returns:
+            A dictionary of app names to whether their HTTP endpoint accepts gzip compressed
+            request bodies.
+        """
+        return {app: data.compression for app, data in self._get_app_data().items()}
+
+    def get_app_ca_certs(self) -> dict[str, str]:
+        """Get the CA certificates of the HTTP endpoints of all related applications.
+
+        Returns:
+            A dictionary of app names to the PEM encoded CA certificates of their HTTP endpoint,
+            for the applications publishing one.
+        """
+        return {app: data.ca_cert for app, data in self._get_app_data().items() if data.ca_cert}
+
+    def _get_app_data(self) -> dict[str, _HttpEndpointDataModel]:
+        """Get the HTTP endpoint data from all related applications.
+
+        Returns:
+            A dictionary of app names to the valid HTTP endpoint data of their leader unit.
+        """
         relations = self.charm.model.relations[self.relation_name]
         if not relations:
             logger.debug("No %s relations found", self.relation_name)
             return {}
 
-        falcosidekick_http_endpoints: dict[str, str] = {}
+        falcosidekick_http_endpoints: dict[str, _HttpEndpointDataModel] = {}
         for relation in relations:
             if relation.app not in relation.data and not relation.data.get(relation.app):
                 logger.warning("Relation data (%s) is not ready", self.relation_name)
                 continue
             try:
                 data = relation.load(_HttpEndpointDataModel, relation.app)
-                falcosidekick_http_endpoints[relation.app.name] = str(data.url)
-                logger.info("Retrieved URL from relation %s: %s", relation.id, data)
+                falcosidekick_http_endpoints[relation.app.name] = data
+                logger.info("Retrieved URL from relation %s: %s", relation.id, data.url)
             except ValidationError as e:
                 logger.error("Invalid URL endpoint data in relation %s: %s", relation.id, e)
         return falcosidekick_http_endpoints
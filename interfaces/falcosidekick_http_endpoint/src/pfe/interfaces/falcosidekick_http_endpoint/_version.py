@@ -1,4 +1,4 @@
 # Copyright 2026 Canonical Ltd.
 # See LICENSE file for licensing details.
 
-__version__ = "1.0.0"
+__version__ = "1.1.0"
@@ -105,6 +105,37 @@ class TestFalcosidekickHttpEndpointProvider:
                 assert data.url.path == "/new"  # New path
                 assert data.url.scheme == "https"  # New scheme
 
+    def test_update_config_publishes_compression_and_ca_cert(
+        self,
+        provider_charm_meta: dict[str, Any],
+        provider_charm_relation_1: ops.testing.Relation,
+    ):
+        """Test that update_config publishes the compression support and the CA certificate."""
+        ctx = ops.testing.Context(
+            ProviderCharm,
+            meta=provider_charm_meta,
+        )
+
+        state_in = ops.testing.State(
+            leader=True,
+            relations=[provider_charm_relation_1],
+        )
+
+        with ctx(ctx.on.relation_changed(provider_charm_relation_1), state_in) as manager:
+            manager.run()
+
+            (relation,) = manager.charm.model.relations["falcosidekick-http-endpoint"]
+            data = relation.load(_HttpEndpointDataModel, manager.charm.app)
+            assert data.compression is False  # Default from provider init
+            assert data.ca_cert is None  # Default from provider init
+
+            manager.charm.provider.update_config(
+                path="/", scheme="https", listen_port=443, compression=True, ca_cert="PEM"
+            )
+            data = relation.load(_HttpEndpointDataModel, manager.charm.app)
+            assert data.compression is True
+            assert data.ca_cert == "PEM"
+
     @pytest.mark.parametrize(
         "path,scheme,listen_port",
         [
@@ -222,6 +253,35 @@ class TestFalcosidekickHttpEndpointRequirer:
             assert leader_urls["remote_1"] == "http://10.0.0.1:8080/"
             assert leader_urls["remote_2"] == "https://10.0.1.1:8443/"
 
+    def test_relation_changed_receives_compression_and_ca_cert(
+        self,
+        requirer_charm_meta: dict[str, Any],
+        requirer_charm_relation_1: ops.testing.Relation,
+        requirer_charm_relation_2: ops.testing.Relation,
+    ):
+        """Test that the requirer receives the compression support and the CA certificates."""
+        ctx = ops.testing.Context(
+            RequirerCharm,
+            meta=requirer_charm_meta,
+        )
+
+        relation_2 = requirer_charm_relation_2
+        relation_2.remote_app_data.update({"compression": "true", "ca_cert": '"PEM"'})
+
+        state_in = ops.testing.State(
+            relations=[requirer_charm_relation_1, relation_2],
+        )
+
+        with ctx(ctx.on.relation_changed(relation_2), state_in) as manager:
+            manager.run()
+
+            # Providers predating compression and CA certificates default to neither
+            assert manager.charm.requirer.get_app_compression() == {
+                "remote_1": False,
+                "remote_2": True,
+            }
+            assert manager.charm.requirer.get_app_ca_certs() == {"remote_2": "PEM"}
+
     def test_handle_invalid_relation_data(
         self,
         requirer_charm_meta: dict[str, Any],